@@ -0,0 +1,160 @@
+"""Wire formats shared by the items API client and the mock API.
+
+Result sets can be sent as an Arrow IPC stream, Parquet or the original JSON
+list of rows. The client lists the formats it accepts in order of preference
+and decodes whichever one the server picked straight into a DataFrame.
+
+Bulk edit payloads can be sent in a compact columnar JSON layout (column
+names once, then one array per row), compressed with gzip or zstd. Queries
+with long filter lists are sent the same way, as a compressed JSON body.
+"""
+
+import gzip
+import io
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+JSON = "application/json"
+
+COLUMNAR_JSON = "application/vnd.rtg.columnar+json"
+
+SUPPORTED_FORMATS = [ARROW_STREAM, PARQUET, JSON]
+DEFAULT_ACCEPT = f"{ARROW_STREAM}, {PARQUET};q=0.9, {JSON};q=0.5"
+
+
+def parse_accept(accept_header: str) -> List[str]:
+    """Media types from an Accept header, most preferred first."""
+    weighted = []
+    for position, part in enumerate(accept_header.split(",")):
+        media_type, *parameters = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            if parameter.startswith("q="):
+                quality = float(parameter[2:])
+        if media_type and quality > 0:
+            weighted.append((-quality, position, media_type))
+    return [media_type for _, _, media_type in sorted(weighted)]
+
+
+def negotiate(accept_header: str) -> str:
+    for media_type in parse_accept(accept_header or JSON):
+        if media_type in SUPPORTED_FORMATS:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON
+    return JSON
+
+
+def encode_frame(df: pd.DataFrame, content_type: str) -> bytes:
+    if content_type == JSON:
+        return df.to_json(orient="records").encode("utf-8")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    if content_type == ARROW_STREAM:
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    elif content_type == PARQUET:
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        raise ValueError(f"Unsupported content type: {content_type}")
+    return sink.getvalue()
+
+
+def decode_frame(body: bytes, content_type: str) -> pd.DataFrame:
+    media_type = content_type.split(";")[0].strip()
+    if media_type == ARROW_STREAM:
+        return pa.ipc.open_stream(body).read_all().to_pandas()
+    if media_type == PARQUET:
+        return pq.read_table(pa.BufferReader(body)).to_pandas()
+    return pd.DataFrame(json.loads(body))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd payloads need the zstandard package")
+        return zstandard.ZstdCompressor().compress(data)
+    if encoding == "identity":
+        return data
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd payloads need the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding in (None, "", "identity"):
+        return data
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def encode_payload(
+    df: pd.DataFrame,
+    key_columns: Optional[List[str]] = None,
+    encoding: str = "gzip",
+) -> Tuple[bytes, Dict[str, str]]:
+    """Encode edit rows as compressed columnar JSON, returning body and headers.
+
+    ``key_columns`` restricts the payload to those columns, e.g. the key of a
+    delete request.
+    """
+    if key_columns:
+        df = df[key_columns]
+    # Built by hand so the rows are serialized once, by pandas
+    body = (
+        '{"columns":'
+        + json.dumps(list(df.columns))
+        + ',"rows":'
+        + df.to_json(orient="values")
+        + "}"
+    ).encode("utf-8")
+    headers = {"Content-Type": COLUMNAR_JSON, "Content-Encoding": encoding}
+    return compress(body, encoding), headers
+
+
+def decode_payload(
+    body: bytes, content_type: str, content_encoding: Optional[str] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Decode an edit payload into the ``{"items": [row, ...]}`` JSON shape."""
+    data = decompress(body, content_encoding)
+    if content_type.split(";")[0].strip() != COLUMNAR_JSON:
+        return json.loads(data)
+    document = json.loads(data)
+    columns = document["columns"]
+    return {"items": [dict(zip(columns, row)) for row in document["rows"]]}
+
+
+def encode_query(
+    table_name: str,
+    filters: Dict[str, List[Any]],
+    limit: int,
+    encoding: str = "gzip",
+) -> Tuple[bytes, Dict[str, str]]:
+    """Encode a query with long filter lists as a compressed JSON body."""
+    body = json.dumps(
+        {"table_name": table_name, "filters": filters, "limit": limit}
+    ).encode("utf-8")
+    headers = {"Content-Type": JSON, "Content-Encoding": encoding}
+    return compress(body, encoding), headers
+
+
+def decode_query(body: bytes, content_encoding: Optional[str] = None) -> Dict[str, Any]:
+    return json.loads(decompress(body, content_encoding))
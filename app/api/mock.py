@@ -2,14 +2,19 @@ import json
 import os
 from typing import List, Literal, Optional
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import pandas as pd
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app import bulk_filter
+from app.api import codec
 
 app = FastAPI()
 
 
 @app.get("/items/")
 async def read_items(
+    request: Request,
     table_name: str,
     filters: Optional[List[str]] = None,
     limit: int = 5,
@@ -20,15 +25,58 @@ async def read_items(
     with open(file_path) as f:
         data = json.load(f)
     filtered_data = data[:limit]
-    return JSONResponse(content=filtered_data)
+    content_type = codec.negotiate(request.headers.get("accept", codec.JSON))
+    if content_type == codec.JSON:
+        return JSONResponse(content=filtered_data)
+    return Response(
+        content=codec.encode_frame(pd.DataFrame(filtered_data), content_type),
+        media_type=content_type,
+    )
+
+
+@app.post("/items/query/")
+async def query_items(request: Request):
+    try:
+        query = codec.decode_query(
+            await request.body(), request.headers.get("content-encoding")
+        )
+    except (ValueError, OSError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    current_directory = os.getcwd()
+    data_directory = os.path.join(current_directory, "app/api/data")
+    file_path = os.path.join(data_directory, f"{query['table_name']}.json")
+    df = pd.read_json(file_path)
+    try:
+        df = bulk_filter.semi_join(df, query["filters"], query.get("limit", 0))
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": e.args[0]})
+    if df.empty:
+        return JSONResponse(content={"error": "No items found"})
+    content_type = codec.negotiate(request.headers.get("accept", codec.JSON))
+    if content_type == codec.JSON:
+        return Response(content=df.to_json(orient="records"), media_type=codec.JSON)
+    return Response(
+        content=codec.encode_frame(df, content_type), media_type=content_type
+    )
 
 
 @app.post("/items/")
 async def edit_items(
+    request: Request,
     table_name: str,
     type: Literal["update", "delete", "append"],
     limit: int = 5,
 ):
+    body = await request.body()
+    if body:
+        try:
+            codec.decode_payload(
+                body,
+                request.headers.get("content-type", codec.JSON),
+                request.headers.get("content-encoding"),
+            )
+        except (ValueError, KeyError, OSError) as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
     current_directory = os.getcwd()
     data_directory = os.path.join(current_directory, "app/api/data")
     file_path = os.path.join(data_directory, f"{table_name}.json")
@@ -1,8 +1,13 @@
+import json
+
 import requests
 from aws_utils import api_gateway, iam
+import pandas as pd
 import streamlit as st
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
+
+from api import codec
 
 iam.get_aws_credentials(st.secrets["aws_credentials"])
 
@@ -11,9 +16,16 @@ STAGE = st.secrets["aws_credentials"]["STAGE"]
 api_gateway_handler = api_gateway.APIGatewayHandler()
 api_id = api_gateway_handler.search_api_by_name("rtg-automotive-api")
 
-BASE_URL = f"https://{api_id}.execute-api.{os.environ['AWS_REGION']}.amazonaws.com/{STAGE.lower()}/"
+# Bulk edit payload encoding: "json" sends the original list of row dicts,
+# "gzip"/"zstd"/"identity" send compact columnar payloads (see api/codec.py)
+PAYLOAD_ENCODING = os.environ.get("RTG_PAYLOAD_ENCODING", "json")
 
-# BASE_URL = "http://localhost:8000/"
+# RTG_API_BASE_URL points the app at another API, e.g. the local mock at
+# http://localhost:8000/
+BASE_URL = os.environ.get(
+    "RTG_API_BASE_URL",
+    f"https://{api_id}.execute-api.{os.environ['AWS_REGION']}.amazonaws.com/{STAGE.lower()}/",
+)
 
 
 def get_request(endpoint, params=None) -> List[Dict[str, Any]]:
@@ -23,6 +35,45 @@ def get_request(endpoint, params=None) -> List[Dict[str, Any]]:
     return response.json()
 
 
+def get_dataframe(endpoint, params=None) -> Union[pd.DataFrame, Dict[str, Any]]:
+    """GET rows as a DataFrame, preferring Arrow or Parquet over JSON.
+
+    Error bodies (e.g. ``{"error": "No items found"}``) are returned as dicts.
+    """
+    print(f"GET REQUEST - Params: {params}")
+    request_url = f"{BASE_URL}{endpoint}/"
+    response = requests.get(
+        request_url, params=params, headers={"Accept": codec.DEFAULT_ACCEPT}
+    )
+    content_type = response.headers.get("Content-Type", codec.JSON)
+    if content_type.startswith(codec.JSON):
+        body = response.json()
+        return pd.DataFrame(body) if isinstance(body, list) else body
+    return codec.decode_frame(response.content, content_type)
+
+
+def post_query(
+    endpoint, table_name, filters, limit
+) -> Union[pd.DataFrame, Dict[str, Any]]:
+    """POST a query whose filter lists are too long for the query string."""
+    print(
+        f"POST QUERY - Table: {table_name} - "
+        + ", ".join(
+            f"{column}: {len(values)} values" for column, values in filters.items()
+        )
+    )
+    request_url = f"{BASE_URL}{endpoint}/query/"
+    body, headers = codec.encode_query(table_name, filters, limit)
+    response = requests.post(
+        request_url, headers={**headers, "Accept": codec.DEFAULT_ACCEPT}, data=body
+    )
+    content_type = response.headers.get("Content-Type", codec.JSON)
+    if content_type.startswith(codec.JSON):
+        body = response.json()
+        return pd.DataFrame(body) if isinstance(body, list) else body
+    return codec.decode_frame(response.content, content_type)
+
+
 def post_request(endpoint, params=None):
     print(f"POST REQUEST - Params: {params}")
     request_url = (
@@ -34,3 +85,18 @@ def post_request(endpoint, params=None):
         json=params["payload"],
     )
     return response.json()
+
+
+def post_frame(endpoint, params, df: pd.DataFrame, key_columns=None):
+    """POST edit rows from a DataFrame using ``PAYLOAD_ENCODING``."""
+    if PAYLOAD_ENCODING == "json":
+        items = json.loads(df.to_json(orient="records"))
+        return post_request(endpoint, {**params, "payload": {"items": items}})
+
+    print(f"POST REQUEST - Params: {params} - {len(df)} rows ({PAYLOAD_ENCODING})")
+    request_url = (
+        f"{BASE_URL}{endpoint}/?table_name={params['table_name']}&type={params['type']}"
+    )
+    body, headers = codec.encode_payload(df, key_columns, PAYLOAD_ENCODING)
+    response = requests.post(request_url, headers=headers, data=body)
+    return response.json()
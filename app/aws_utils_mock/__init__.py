@@ -0,0 +1,20 @@
+"""Local stand-ins for the ``aws_utils`` package.
+
+S3 is backed by the ``RTG_MOCK_S3_DIR`` directory (``mocks/s3`` by default),
+SQS messages are read from the ``RTG_MOCK_SQS_DIR`` directory (``mocks/sqs``),
+logs and events are kept in memory, IAM only exports the configured values
+and RDS points at ``RTG_MOCK_RDS_ENDPOINT`` (``localhost``). ``install()``
+registers the stand-ins under the ``aws_utils`` name, for benchmarks and local
+runs.
+"""
+
+import importlib
+import sys
+
+MODULES = ("api_gateway", "events", "iam", "logs", "rds", "s3", "sqs")
+
+
+def install() -> None:
+    sys.modules["aws_utils"] = sys.modules[__name__]
+    for name in MODULES:
+        sys.modules[f"aws_utils.{name}"] = importlib.import_module(f"{__name__}.{name}")
@@ -0,0 +1,12 @@
+class APIGatewayHandler:
+    def search_api_by_name(self, api_name: str) -> str:
+        """
+        Returns a fixed API id.
+
+        Args:
+            api_name (str): The name of the API to search for.
+
+        Returns:
+            str: The API id.
+        """
+        return "mock-api"
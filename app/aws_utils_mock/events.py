@@ -0,0 +1,30 @@
+from typing import Any, Dict, List
+
+published_events: List[Dict[str, Any]] = []
+
+
+class EventsHandler:
+    def publish_event(
+        self,
+        event_bus_name: str,
+        source: str,
+        detail_type: str,
+        detail: Dict[str, Any],
+    ) -> None:
+        """
+        Records an event instead of publishing it to EventBridge.
+
+        Args:
+            event_bus_name (str): The name of the event bus.
+            source (str): The source of the event.
+            detail_type (str): The detail type of the event.
+            detail (Dict[str, Any]): The event detail.
+        """
+        published_events.append(
+            {
+                "event_bus_name": event_bus_name,
+                "source": source,
+                "detail_type": detail_type,
+                "detail": detail,
+            }
+        )
@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+_logs: List[Dict[str, Any]] = []
+
+
+class LogsHandler:
+    def log_action(self, bucket_name: str, log_type: str, action: str, user: str):
+        """
+        Appends a log record to the in-memory log.
+
+        Args:
+            bucket_name (str): The name of the S3 bucket holding the logs.
+            log_type (str): The type of log, e.g. "frontend".
+            action (str): The action being logged.
+            user (str): The user performing the action.
+        """
+        _logs.append(
+            {
+                "log_id": str(uuid.uuid4()),
+                "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+                "log_type": log_type,
+                "action": action,
+                "user": user,
+            }
+        )
+
+    def get_logs(self, bucket_name: str, log_type: str) -> List[Dict[str, Any]]:
+        """
+        Returns the logged records of one type.
+
+        Args:
+            bucket_name (str): The name of the S3 bucket holding the logs.
+            log_type (str): The type of log, e.g. "frontend".
+
+        Returns:
+            List[Dict[str, Any]]: The log records, oldest first.
+        """
+        return [record for record in _logs if record["log_type"] == log_type]
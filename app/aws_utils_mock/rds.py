@@ -0,0 +1,19 @@
+import os
+from typing import Any, Dict
+
+
+class RDSHandler:
+    def get_rds_instance_by_identifier(self, identifier: str) -> Dict[str, Any]:
+        """
+        Returns an instance description pointing at a local MySQL server.
+
+        Args:
+            identifier (str): The RDS instance identifier.
+
+        Returns:
+            Dict[str, Any]: The instance description, with its ``Endpoint``.
+        """
+        return {
+            "DBInstanceIdentifier": identifier,
+            "Endpoint": os.environ.get("RTG_MOCK_RDS_ENDPOINT", "localhost"),
+        }
@@ -1,7 +1,13 @@
+import hashlib
+import io
+import json
 import os
+from typing import Any, Dict, Iterator, Optional
 
-import boto3
-import pandas as pd
+from botocore.exceptions import ClientError
+
+MOCK_S3_DIR = os.environ.get("RTG_MOCK_S3_DIR", "mocks/s3")
+PAGE_SIZE = 1000
 
 
 class S3Utils:
@@ -37,15 +43,133 @@ class S3Utils:
         return partition_values, paths, file_name
 
 
+class NoSuchKey(ClientError):
+    pass
+
+
+class LocalS3Exceptions:
+    ClientError = ClientError
+    NoSuchKey = NoSuchKey
+
+
+class LocalS3Paginator:
+    def __init__(self, client: "LocalS3Client") -> None:
+        self.client = client
+
+    def paginate(
+        self, Bucket: str, Prefix: str = "", StartAfter: str = ""
+    ) -> Iterator[Dict[str, Any]]:
+        keys = sorted(
+            key
+            for key in self.client.list_keys()
+            if key.startswith(Prefix) and key > StartAfter
+        )
+        for start in range(0, max(len(keys), 1), PAGE_SIZE):
+            page = keys[start : start + PAGE_SIZE]
+            yield {
+                "Contents": [
+                    {"Key": key, "Size": os.path.getsize(self.client.path(key))}
+                    for key in page
+                ]
+            }
+
+
+class LocalS3Client:
+    """
+    The subset of the boto3 S3 client the app uses, backed by a local directory.
+
+    Object keys map to files under ``root``; buckets are ignored. Object
+    metadata is kept in memory.
+    """
+
+    exceptions = LocalS3Exceptions
+
+    def __init__(self, root: str = MOCK_S3_DIR) -> None:
+        self.root = root
+        self.metadata: Dict[str, Dict[str, str]] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def list_keys(self) -> Iterator[str]:
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                yield os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def etag(self, key: str) -> str:
+        with open(self.path(key), "rb") as f:
+            return f'"{hashlib.md5(f.read()).hexdigest()}"'
+
+    def error(self, code: str, status: int, operation: str) -> ClientError:
+        error_class = NoSuchKey if code == "NoSuchKey" else ClientError
+        return error_class(
+            {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+            operation,
+        )
+
+    def get_paginator(self, operation_name: str) -> LocalS3Paginator:
+        return LocalS3Paginator(self)
+
+    def get_object(
+        self,
+        Bucket: str,
+        Key: str,
+        IfNoneMatch: Optional[str] = None,
+        Range: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if not os.path.isfile(self.path(Key)):
+            raise self.error("NoSuchKey", 404, "GetObject")
+        etag = self.etag(Key)
+        if IfNoneMatch == etag:
+            raise self.error("304", 304, "GetObject")
+        with open(self.path(Key), "rb") as f:
+            if Range is None:
+                return {"Body": io.BytesIO(f.read()), "ETag": etag}
+            # Only the "bytes=<first>-<last>" form the app sends
+            first, last = (int(n) for n in Range.removeprefix("bytes=").split("-"))
+            f.seek(first)
+            return {"Body": io.BytesIO(f.read(last - first + 1)), "ETag": etag}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        if not os.path.isfile(self.path(Key)):
+            raise self.error("404", 404, "HeadObject")
+        return {
+            "ContentLength": os.path.getsize(self.path(Key)),
+            "ETag": self.etag(Key),
+            "Metadata": self.metadata.get(Key, {}),
+        }
+
+    def put_object(
+        self,
+        Bucket: str,
+        Key: str,
+        Body: bytes,
+        IfMatch: Optional[str] = None,
+        IfNoneMatch: Optional[str] = None,
+        Metadata: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        exists = os.path.isfile(self.path(Key))
+        if (IfMatch and (not exists or self.etag(Key) != IfMatch)) or (
+            IfNoneMatch == "*" and exists
+        ):
+            raise self.error("PreconditionFailed", 412, "PutObject")
+        os.makedirs(os.path.dirname(self.path(Key)), exist_ok=True)
+        with open(self.path(Key), "wb") as f:
+            f.write(Body if isinstance(Body, bytes) else Body.read())
+        self.metadata[Key] = dict(Metadata or {})
+        return {"ETag": self.etag(Key)}
+
+    def generate_presigned_url(
+        self, ClientMethod: str, Params: Dict[str, Any], ExpiresIn: int = 3600
+    ) -> str:
+        return "file://" + os.path.abspath(self.path(Params["Key"]))
+
+
 class S3Handler:
     def __init__(self) -> None:
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-            aws_session_token=os.environ.get("AWS_SESSION_TOKEN"),
-            region_name=os.environ.get("AWS_REGION"),
-        )
+        self.s3_client = LocalS3Client()
 
     def load_csv_from_s3(self, bucket_name: str, csv_key: str) -> list:
         """
@@ -72,7 +196,10 @@ class S3Handler:
         Returns:
             dict: The JSON data as a dictionary.
         """
-        return {}
+        if not os.path.isfile(self.s3_client.path(json_key)):
+            return {}
+        with open(self.s3_client.path(json_key)) as f:
+            return json.load(f)
 
     def load_parquet_from_s3(self, bucket_name: str, parquet_key: str) -> bytes:
         """
@@ -85,9 +212,8 @@ class S3Handler:
         Returns:
             bytes: The raw Parquet data.
         """
-        file_path = f"mocks/s3/{parquet_key}"
-        df = pd.read_parquet(file_path)
-        return df.to_parquet()
+        with open(self.s3_client.path(parquet_key), "rb") as f:
+            return f.read()
 
     def load_excel_from_s3(self, bucket_name: str, object_key: str) -> bytes:
         """
@@ -113,7 +239,9 @@ class S3Handler:
             parquet_key (str): The key for the Parquet file in S3.
             parquet_data (bytes): The raw Parquet data to upload.
         """
-        pass
+        self.s3_client.put_object(
+            Bucket=bucket_name, Key=parquet_key, Body=parquet_data
+        )
 
     def upload_excel_to_s3(
         self, bucket_name: str, excel_key: str, excel_data: bytes
@@ -126,7 +254,7 @@ class S3Handler:
             excel_key (str): The key for the Excel file in S3.
             excel_data (bytes): The raw Excel data to upload.
         """
-        pass
+        self.s3_client.put_object(Bucket=bucket_name, Key=excel_key, Body=excel_data)
 
     def upload_json_to_s3(self, bucket_name: str, json_key: str, json_data: dict):
         """
@@ -137,7 +265,9 @@ class S3Handler:
             json_key (str): The key for the JSON file in S3.
             json_data (dict): The JSON data to upload.
         """
-        pass
+        self.s3_client.put_object(
+            Bucket=bucket_name, Key=json_key, Body=json.dumps(json_data).encode("utf-8")
+        )
 
     def list_objects(self, bucket_name: str, prefix: str) -> list:
         """
@@ -150,4 +280,9 @@ class S3Handler:
         Returns:
             list: A list of objects in the specified bucket with the given prefix.
         """
-        return []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        return [
+            obj
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+            for obj in page["Contents"]
+        ]
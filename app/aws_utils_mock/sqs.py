@@ -1,6 +1,9 @@
 import json
+import os
 from typing import Dict, List, Optional
 
+MOCK_SQS_DIR = os.environ.get("RTG_MOCK_SQS_DIR", "mocks/sqs")
+
 
 class SQSHandler:
     def __init__(self) -> None:
@@ -30,7 +33,7 @@ class SQSHandler:
             List[Dict[str, Optional[str]]]: A list of dictionaries containing message Id and message Body
         """
         queue_name = queue_url.split("/")[-1]
-        file_path = f"mocks/sqs/{queue_name}/sqsmessage.json"
+        file_path = os.path.join(MOCK_SQS_DIR, queue_name, "sqsmessage.json")
         with open(file_path) as f:
             messages = json.load(f)
         return messages
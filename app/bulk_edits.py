@@ -5,10 +5,12 @@ import api.utils as api_utils
 import pandas as pd
 import streamlit as st
 from aws_utils import iam, logs
-import json
 from typing import Tuple
 
+import profiler
+import telemetry
 from database import run_query
+from query_cache import query_cache
 
 
 def get_table_columns() -> Dict[str, Dict[str, Any]]:
@@ -183,20 +185,26 @@ def handle_file_upload(
 def edit_table(df: pd.DataFrame, table_name: str, edit_type: str) -> None:
     if st.button("Edit Table"):
         try:
-            with st.spinner("Editing table..."):
-                json_data = json.loads(df.to_json(orient="records"))
-                params = {
-                    "table_name": table_name,
-                    "type": edit_type,
-                    "payload": {"items": json_data},
-                }
-                api_utils.post_request("items", params)
+            with st.spinner("Editing table..."), telemetry.trace() as edit_trace:
+                params = {"table_name": table_name, "type": edit_type}
+                # Deletes only need the key, so the other columns are not sent
+                key_columns = (
+                    get_table_columns()[table_name]["necessary_columns"]
+                    if edit_type == "delete"
+                    else None
+                )
+                with telemetry.span(telemetry.API_CALL, rows=len(df)):
+                    api_utils.post_frame("items", params, df, key_columns)
+                query_cache.invalidate(table_name)
 
                 logs_handler = logs.LogsHandler()
                 logs_handler.log_action(
                     f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}",
                     "frontend",
-                    f"{edit_type.upper()} | table={table_name} | number_of_edits={len(df)}",
+                    telemetry.format_action(
+                        f"{edit_type.upper()} | table={table_name} | number_of_edits={len(df)}",
+                        edit_trace,
+                    ),
                     "admin",
                 )
                 st.success("Changes saved to the database.")
@@ -206,7 +214,8 @@ def edit_table(df: pd.DataFrame, table_name: str, edit_type: str) -> None:
 
 def main() -> None:
     display_title()
-    iam.get_aws_credentials(st.secrets["aws_credentials"])
+    with profiler.section("iam.get_aws_credentials"):
+        iam.get_aws_credentials(st.secrets["aws_credentials"])
 
     table_columns = get_table_columns()
     table_name = select_table_name(table_columns)
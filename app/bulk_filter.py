@@ -0,0 +1,86 @@
+"""Filters with large value lists, e.g. thousands of item ids from a CSV.
+
+Long lists do not fit in the ``filters`` query string of a GET, so once a
+column has more than ``BULK_FILTER_THRESHOLD`` values the query is sent as a
+POST body in batches of ``BATCH_SIZE`` keys instead. When the table's snapshot
+is already loaded the filters are applied locally with a hash semi-join
+(``Series.isin``) and the API is not called at all.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+import pandas as pd
+
+BULK_FILTER_THRESHOLD = 1000
+BATCH_SIZE = 10000
+
+Filters = Dict[str, List[Any]]
+QueryResult = Union[pd.DataFrame, Dict[str, Any]]
+
+
+def parse_filters(filters: Union[str, Filters, None]) -> Filters:
+    if isinstance(filters, str):
+        return json.loads(filters)
+    return filters or {}
+
+
+def is_bulk(filters: Filters) -> bool:
+    return any(len(values) > BULK_FILTER_THRESHOLD for values in filters.values())
+
+
+def match_values(column: pd.Series, values: List[Any]) -> pd.Series:
+    """Boolean mask of ``column`` values in ``values``.
+
+    Values read from a CSV may not have the column's type (ids as numbers for
+    a text column, or the other way round), so they are coerced to it first.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        keys = pd.to_numeric(pd.Series(values), errors="coerce").dropna()
+        return column.isin(keys)
+    return column.astype(str).isin({str(value) for value in values})
+
+
+def semi_join(df: pd.DataFrame, filters: Filters, limit: int = 0) -> pd.DataFrame:
+    """Rows of ``df`` matching every filter; ``limit`` 0 means all of them."""
+    mask = pd.Series(True, index=df.index)
+    for column, values in filters.items():
+        if column not in df.columns:
+            raise KeyError(f"Filter column '{column}' not found in the table.")
+        mask &= match_values(df[column], values)
+    result = df[mask].reset_index(drop=True)
+    return result.head(limit) if limit else result
+
+
+def iterate_batches(
+    filters: Filters, batch_size: int = BATCH_SIZE
+) -> Iterator[Filters]:
+    """Split the longest filter list into batches, keeping the other filters."""
+    batch_column = max(filters, key=lambda column: len(filters[column]))
+    values = filters[batch_column]
+    for start in range(0, len(values), batch_size):
+        yield {**filters, batch_column: values[start : start + batch_size]}
+
+
+def fetch_in_batches(
+    fetch: Callable[[Filters], QueryResult], filters: Filters, limit: int = 0
+) -> QueryResult:
+    """Run ``fetch`` per batch and combine the DataFrames it returns.
+
+    Error bodies are passed through, except "No items found" for a single
+    batch, which only means none of that batch's keys matched.
+    """
+    frames = []
+    for batch in iterate_batches(filters):
+        result = fetch(batch)
+        if isinstance(result, dict):
+            if result.get("error") == "No items found":
+                continue
+            return result
+        frames.append(result)
+        if limit and sum(len(frame) for frame in frames) >= limit:
+            break
+    if not frames:
+        return {"error": "No items found"}
+    df = pd.concat(frames, ignore_index=True)
+    return df.head(limit) if limit else df
@@ -0,0 +1,247 @@
+"""Command line entry points for the pipelines behind the app pages.
+
+Runs the same code as the app without a browser session, e.g. from cron.
+Progress and results are written to stdout as JSON lines::
+
+    {"event": "progress", "command": "generate-ebay", "progress": 0.8, ...}
+    {"event": "result", "command": "generate-ebay", "elapsed_s": 612.4,
+     "timings": {"queue_wait_ms": 598000, ...}, ...}
+
+Failures are written as an ``error`` event and exit with status 1.
+Credentials are read from ``.streamlit/secrets.toml`` like the app.
+
+Usage:
+    python app/cli.py generate-ebay [--output ebay_upload_files.zip]
+    python app/cli.py export-table store --filters '{"supplier": ["APE"]}'
+        [--filter-file item_id=test_files/item_ids.csv] [--limit 0]
+        [--split-by ebay_store] [--format csv] [--output store.zip]
+    python app/cli.py upload-stock-feeds APE.xlsx BET.xlsx [--date 2024-06-01]
+        [--format xlsx] [--duplicates skip]
+    python app/cli.py compact-snapshot store [--timestamp 2024-06-01T06:00:00]
+        [--rows-per-file 2000000] [--row-group-rows 32768]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+import ebay_pipeline
+import exports
+import frame_store
+import pandas as pd
+import snapshot_compaction
+import stock_feed_dedupe
+import stock_feed_pipeline
+import streamlit as st
+import telemetry
+from aws_utils import iam, logs, s3
+
+
+class Reporter:
+    """Writes JSON-lines progress events, skipping unchanged repeats."""
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.start = time.perf_counter()
+        self.last_event: Tuple[float, str] = (-1.0, "")
+
+    def elapsed(self) -> float:
+        return round(time.perf_counter() - self.start, 3)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {
+            "event": event,
+            "command": self.command,
+            "elapsed_s": self.elapsed(),
+            **fields,
+        }
+        print(json.dumps(record, default=str), flush=True)
+
+    def progress(self, fraction: float, message: str) -> None:
+        # The pipelines report every second while waiting; only log changes
+        rounded = round(fraction, 2)
+        if (rounded, message) != self.last_event:
+            self.last_event = (rounded, message)
+            self.emit("progress", progress=rounded, message=message)
+
+
+def load_credentials() -> str:
+    iam.get_aws_credentials(st.secrets["aws_credentials"])
+    return f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}"
+
+
+def generate_ebay(args: argparse.Namespace, reporter: Reporter) -> Dict[str, Any]:
+    bucket_name = load_credentials()
+    result = ebay_pipeline.generate_ebay_upload_files(
+        logs.LogsHandler(), bucket_name, reporter.progress
+    )
+    zip_data = result.pop("zip_data")
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(zip_data)
+        result["output"] = args.output
+    return result
+
+
+def parse_filters(args: argparse.Namespace) -> Dict[str, List[Any]]:
+    filters = json.loads(args.filters) if args.filters else {}
+    for filter_file in args.filter_file:
+        column, path = filter_file.split("=", 1)
+        # Same as the Table Viewer's CSV upload: the column of the same name
+        values = pd.read_csv(path)[column].dropna().unique().tolist()
+        filters[column] = filters.get(column, []) + values
+    return filters
+
+
+def export_table(args: argparse.Namespace, reporter: Reporter) -> Dict[str, Any]:
+    load_credentials()
+    # Imported here because api.utils reads the credentials when imported
+    import table_query
+
+    filters = parse_filters(args)
+    params = table_query.build_params(args.table, filters, args.limit)
+    reporter.progress(0.0, f"Querying {args.table}")
+    results = table_query.fetch_results(params, args.table, frame_store.FrameStore())
+    if not isinstance(results, pd.DataFrame):
+        raise RuntimeError(f"Query failed: {results}")
+    if results.empty:
+        return {"rows": 0}
+    if args.split_by and args.split_by not in results.columns:
+        raise ValueError(f"Column '{args.split_by}' not found in results.")
+
+    reporter.progress(0.5, f"Building the {args.format} export of {len(results)} rows")
+    with telemetry.span(telemetry.EXPORT, rows=len(results)) as export_span:
+        zip_data = exports.build_export(results, args.table, args.format, args.split_by)
+        export_span["bytes"] = len(zip_data)
+    output = args.output or f"{args.table}_{args.format.replace('.', '_')}_files.zip"
+    with open(output, "wb") as f:
+        f.write(zip_data)
+    return {"rows": len(results), "bytes": len(zip_data), "output": output}
+
+
+def upload_stock_feeds(args: argparse.Namespace, reporter: Reporter) -> Dict[str, Any]:
+    bucket_name = load_credentials()
+    files = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    return stock_feed_pipeline.process_stock_feeds(
+        files,
+        bucket_name,
+        args.date,
+        logs.LogsHandler(),
+        reporter.progress,
+        args.format,
+        args.duplicates,
+    )
+
+
+def compact_snapshot(args: argparse.Namespace, reporter: Reporter) -> Dict[str, Any]:
+    bucket_name = load_credentials()
+    reporter.progress(0.0, f"Compacting the {args.dataset} snapshot")
+    manifest = snapshot_compaction.compact_dataset(
+        s3.S3Handler(),
+        bucket_name,
+        args.dataset,
+        args.timestamp,
+        rows_per_file=args.rows_per_file,
+        row_group_rows=args.row_group_rows,
+    )
+    return {
+        "snapshot": manifest["prefix"] + manifest["timestamp"],
+        "rows": manifest["rows"],
+        "files": len(manifest["files"]),
+        "source_files": len(manifest["source_keys"]),
+        "bytes": manifest["size"],
+        "source_bytes": manifest["source_size"],
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_ebay = subparsers.add_parser(
+        "generate-ebay", help="generate the eBay store upload files"
+    )
+    parser_ebay.add_argument("--output", help="also save the zip locally")
+    parser_ebay.set_defaults(func=generate_ebay)
+
+    parser_export = subparsers.add_parser(
+        "export-table", help="query a table and export it like the Table Viewer"
+    )
+    parser_export.add_argument("table", choices=["store", "supplier_stock"])
+    parser_export.add_argument(
+        "--filters", help='JSON object of column to values, e.g. {"supplier": ["APE"]}'
+    )
+    parser_export.add_argument(
+        "--filter-file",
+        action="append",
+        default=[],
+        metavar="COLUMN=CSV",
+        help="filter COLUMN on the values of the same column in CSV (repeatable)",
+    )
+    parser_export.add_argument(
+        "--limit", type=int, default=0, help="0 exports the whole table (default)"
+    )
+    parser_export.add_argument("--split-by", help="one file per value of a column")
+    parser_export.add_argument(
+        "--format", default=exports.CSV, choices=list(exports.EXPORT_FORMATS)
+    )
+    parser_export.add_argument("--output", help="zip file to write")
+    parser_export.set_defaults(func=export_table)
+
+    parser_upload = subparsers.add_parser(
+        "upload-stock-feeds", help="upload supplier stock feeds for processing"
+    )
+    parser_upload.add_argument("files", nargs="+", help="supplier workbooks")
+    parser_upload.add_argument("--date", default=date.today().isoformat())
+    parser_upload.add_argument(
+        "--format",
+        default=stock_feed_pipeline.XLSX,
+        choices=stock_feed_pipeline.UPLOAD_FORMATS,
+    )
+    parser_upload.add_argument(
+        "--duplicates",
+        default=stock_feed_dedupe.SKIP,
+        choices=stock_feed_dedupe.DUPLICATE_ACTIONS,
+        help="skip files identical to an earlier upload, or upload them with a "
+        "warning",
+    )
+    parser_upload.set_defaults(func=upload_stock_feeds)
+
+    parser_compact = subparsers.add_parser(
+        "compact-snapshot", help="rewrite a snapshot into large sorted parquet files"
+    )
+    parser_compact.add_argument("dataset", choices=list(snapshot_compaction.DATASETS))
+    parser_compact.add_argument("--timestamp", help="snapshot to compact (latest)")
+    parser_compact.add_argument(
+        "--rows-per-file", type=int, default=snapshot_compaction.ROWS_PER_FILE
+    )
+    parser_compact.add_argument(
+        "--row-group-rows", type=int, default=snapshot_compaction.ROW_GROUP_ROWS
+    )
+    parser_compact.set_defaults(func=compact_snapshot)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    reporter = Reporter(args.command)
+    try:
+        with telemetry.trace() as command_trace:
+            result = args.func(args, reporter)
+    except Exception as e:
+        reporter.emit("error", message=str(e), error_type=type(e).__name__)
+        sys.exit(1)
+    reporter.emit("result", timings=command_trace.fields(), **result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""ETag-cached JSON config documents in S3 with optimistic concurrency.
+
+A loaded document is kept in a process-wide cache together with its ETag.
+Reads within ``REVALIDATE_SECONDS`` are served from the cache without touching
+S3; after that the document is revalidated with a conditional ``GET``
+(``IfNoneMatch``), which only transfers the body when it has changed. Saves are
+conditional on the ETag the editor started from (``IfMatch``), so a config
+changed by someone else in the meantime is reported instead of overwritten.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+REVALIDATE_SECONDS = int(os.environ.get("RTG_CONFIG_REVALIDATE_SECONDS", "60"))
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+_lock = threading.Lock()
+_cache: Dict[Tuple[str, str], Tuple[float, "ConfigDocument"]] = {}
+
+
+class ConcurrentEditError(Exception):
+    """The config was changed in S3 after the editor loaded it."""
+
+
+@dataclass(frozen=True)
+class ConfigDocument:
+    data: Dict[str, Any]
+    etag: Optional[str]
+
+
+def get_error_status(error: ClientError) -> int:
+    return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+
+
+def fetch_config(
+    s3_client, bucket_name: str, key: str, cached: Optional[ConfigDocument]
+) -> ConfigDocument:
+    kwargs = {"Bucket": bucket_name, "Key": key}
+    if cached is not None and cached.etag:
+        kwargs["IfNoneMatch"] = cached.etag
+    try:
+        response = s3_client.get_object(**kwargs)
+    except ClientError as e:
+        if cached is not None and get_error_status(e) == 304:
+            return cached
+        raise
+    return ConfigDocument(json.loads(response["Body"].read()), response.get("ETag"))
+
+
+def load_config(
+    s3_handler, bucket_name: str, key: str, force: bool = False
+) -> ConfigDocument:
+    """The cached document, revalidated when stale or when ``force`` is set."""
+    cache_key = (bucket_name, key)
+    with _lock:
+        cached = _cache.get(cache_key)
+    if (
+        cached is not None
+        and not force
+        and time.time() - cached[0] < REVALIDATE_SECONDS
+    ):
+        return cached[1]
+
+    document = fetch_config(
+        s3_handler.s3_client, bucket_name, key, cached[1] if cached else None
+    )
+    with _lock:
+        _cache[cache_key] = (time.time(), document)
+    return document
+
+
+def save_config(
+    s3_handler,
+    bucket_name: str,
+    key: str,
+    data: Dict[str, Any],
+    base_etag: Optional[str],
+) -> ConfigDocument:
+    """Write ``data`` only if the object still has ``base_etag``.
+
+    Raises ``ConcurrentEditError`` when the object has changed (or been
+    created) since the base version was loaded.
+    """
+    condition = {"IfMatch": base_etag} if base_etag else {"IfNoneMatch": "*"}
+    try:
+        response = s3_handler.s3_client.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=json.dumps(data, indent=4).encode("utf-8"),
+            ContentType="application/json",
+            **condition,
+        )
+    except ClientError as e:
+        # 409 is returned when a concurrent conditional write is in flight
+        if get_error_status(e) in (409, 412):
+            invalidate(bucket_name, key)
+            raise ConcurrentEditError(
+                f"{key} was changed by someone else since it was loaded."
+            ) from e
+        raise
+
+    document = ConfigDocument(data, response.get("ETag"))
+    with _lock:
+        _cache[(bucket_name, key)] = (time.time(), document)
+    return document
+
+
+def invalidate(bucket_name: str, key: str) -> None:
+    with _lock:
+        _cache.pop((bucket_name, key), None)
+
+
+def diff_config(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Added, removed and changed values between two JSON documents, by path."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for name in sorted(set(old) | set(new), key=str):
+            child_path = f"{path}.{name}" if path else str(name)
+            if name not in old:
+                changes.append(
+                    {"path": child_path, "change": ADDED, "old": None, "new": new[name]}
+                )
+            elif name not in new:
+                changes.append(
+                    {
+                        "path": child_path,
+                        "change": REMOVED,
+                        "old": old[name],
+                        "new": None,
+                    }
+                )
+            else:
+                changes.extend(diff_config(old[name], new[name], child_path))
+        return changes
+    if old != new:
+        return [{"path": path or "(root)", "change": CHANGED, "old": old, "new": new}]
+    return []
@@ -0,0 +1,205 @@
+"""eBay upload file generation, independent of the Streamlit UI.
+
+``generate_ebay_upload_files`` triggers the eBay table Lambda, waits for it on
+the SQS queue, builds one CSV per store from the latest ``ebay/table``
+snapshot, uploads the zip to ``ebay/zip_folders/<timestamp>/`` and logs the
+action. Progress is reported through a ``progress(fraction, message)``
+callback.
+"""
+
+import io
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+import profiler
+import snapshot_catalog
+import telemetry
+from aws_utils import events, s3, sqs
+
+SQS_QUEUE_URL = "rtg-automotive-lambda-queue"
+EBAY_TABLE_PREFIX = "ebay/table/"
+ZIP_FOLDERS_PREFIX = "ebay/zip_folders/"
+POLL_INTERVAL_SECONDS = 10
+EXPECTED_GENERATION_SECONDS = 600
+MAX_WAIT_SECONDS = 1800
+
+ProgressCallback = Callable[[float, str], None]
+
+
+def no_progress(fraction: float, message: str) -> None:
+    pass
+
+
+def trigger_ebay_table_generation(sqs_handler, sqs_queue_url: str) -> None:
+    sqs_handler.delete_all_sqs_messages(sqs_queue_url)
+
+    events_handler = events.EventsHandler()
+
+    events_handler.publish_event(
+        "rtg-automotive-generate-ebay-table-lambda-event-bus",
+        "com.oxforddataprocesses",
+        "RtgAutomotiveGenerateEbayTable",
+        {
+            "event_type": "RtgAutomotiveGenerateEbayTable",
+            "user": "admin",
+            "trigger_id": str(uuid.uuid4()),
+            "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+    )
+
+
+def wait_for_ebay_table(
+    sqs_handler, sqs_queue_url: str, progress: ProgressCallback = no_progress
+) -> float:
+    """Poll the queue until the eBay table is generated; returns seconds waited.
+
+    Raises ``TimeoutError`` if it is not generated within ``MAX_WAIT_SECONDS``.
+    """
+    start_time = time.time()
+    with telemetry.span(telemetry.QUEUE_WAIT):
+        while True:
+            messages = sqs_handler.get_all_sqs_messages(sqs_queue_url)
+            if any("Ebay table generated" in message["Body"] for message in messages):
+                return time.time() - start_time
+            elapsed = time.time() - start_time
+            if elapsed > MAX_WAIT_SECONDS:
+                raise TimeoutError(
+                    f"The eBay table was not generated within "
+                    f"{MAX_WAIT_SECONDS // 60} minutes"
+                )
+            progress(
+                0.8 * min(elapsed / EXPECTED_GENERATION_SECONDS, 0.95),
+                f"Waiting for the eBay table ({int(elapsed // 60)} min elapsed)",
+            )
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+@profiler.timed("load_ebay_table")
+def load_ebay_table(s3_handler, bucket_name: str) -> pd.DataFrame:
+    snapshot = snapshot_catalog.resolve_latest_snapshot(
+        s3_handler, bucket_name, EBAY_TABLE_PREFIX, timestamp_length=19
+    )
+
+    if snapshot is None:
+        raise ValueError("No parquet files found in the specified S3 path.")
+
+    return snapshot_catalog.load_snapshot(s3_handler, bucket_name, snapshot)
+
+
+@profiler.timed("create_ebay_dataframe")
+def create_ebay_dataframe(ebay_df: pd.DataFrame) -> pd.DataFrame:
+    ebay_df = ebay_df[ebay_df["quantity_delta"] != 0]
+    ebay_df = ebay_df.dropna(subset=["item_id"])
+
+    ebay_df = ebay_df.rename(
+        columns={
+            "custom_label": "CustomLabel",
+            "item_id": "ItemID",
+            "ebay_store": "Store",
+            "quantity": "Quantity",
+        }
+    )
+    ebay_df["Action"] = "Revise"
+    ebay_df["SiteID"] = "UK"
+    ebay_df["Currency"] = "GBP"
+    ebay_df = ebay_df[
+        [
+            "Action",
+            "ItemID",
+            "SiteID",
+            "Currency",
+            "Quantity",
+            "Store",
+        ]
+    ]
+    ebay_df["Quantity"] = ebay_df["Quantity"].astype(int)
+    ebay_df["ItemID"] = ebay_df["ItemID"].apply(lambda x: int(x) if x != "" else None)
+    return ebay_df
+
+
+def split_by_store(ebay_df: pd.DataFrame) -> List[Tuple[pd.DataFrame, str]]:
+    stores = list(ebay_df["Store"].unique())
+    return [
+        (ebay_df[ebay_df["Store"] == store].drop(columns=["Store"]), store)
+        for store in stores
+    ]
+
+
+@profiler.timed("zip_dataframes")
+def zip_dataframes(dataframes: List[Tuple[pd.DataFrame, str]]) -> io.BytesIO:
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for df, name in dataframes:
+            csv_buffer = io.StringIO()
+            df.to_csv(csv_buffer, index=False)
+            zip_file.writestr(f"{name}.csv", csv_buffer.getvalue())
+    return zip_buffer
+
+
+def build_upload_files(
+    s3_handler, bucket_name: str, progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
+    """Build and upload the zip from the latest eBay table snapshot."""
+    progress(0.8, "Loading the eBay table")
+    df = load_ebay_table(s3_handler, bucket_name)
+
+    progress(0.85, "Building the store upload files")
+    with telemetry.span(telemetry.TRANSFORM) as transform_span:
+        ebay_df = create_ebay_dataframe(df)
+        ebay_dfs = split_by_store(ebay_df)
+        transform_span["rows"] = len(ebay_df)
+
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    with telemetry.span(telemetry.EXPORT) as export_span:
+        zip_data = zip_dataframes(ebay_dfs).getvalue()
+        export_span["bytes"] = len(zip_data)
+
+    progress(0.95, "Uploading the zip archive")
+    # The store count is kept in the object metadata so the file store can
+    # list archives without downloading them
+    zip_key = f"{ZIP_FOLDERS_PREFIX}{timestamp}/ebay_upload_files.zip"
+    with telemetry.span(telemetry.S3_UPLOAD) as upload_span:
+        s3_handler.s3_client.put_object(
+            Bucket=bucket_name,
+            Key=zip_key,
+            Body=zip_data,
+            ContentType="application/zip",
+            Metadata={"store-count": str(len(ebay_dfs))},
+        )
+        upload_span["bytes"] = len(zip_data)
+    snapshot_catalog.record_snapshot(
+        s3_handler, bucket_name, ZIP_FOLDERS_PREFIX, timestamp, [zip_key], len(zip_data)
+    )
+    return {
+        "zip_key": zip_key,
+        "zip_data": zip_data,
+        "stores": len(ebay_dfs),
+        "rows": len(ebay_df),
+    }
+
+
+def generate_ebay_upload_files(
+    logs_handler, bucket_name: str, progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
+    with telemetry.trace() as generation_trace:
+        sqs_handler = sqs.SQSHandler()
+        progress(0.0, "Triggering eBay table generation")
+        trigger_ebay_table_generation(sqs_handler, SQS_QUEUE_URL)
+        wait_seconds = wait_for_ebay_table(sqs_handler, SQS_QUEUE_URL, progress)
+        # The snapshot resolved before the generation may still be cached
+        snapshot_catalog.invalidate(bucket_name, EBAY_TABLE_PREFIX)
+
+        upload_files = build_upload_files(s3.S3Handler(), bucket_name, progress)
+
+    logs_handler.log_action(
+        bucket_name,
+        "frontend",
+        telemetry.format_action("EBAY_UPLOAD_FILES_GENERATED", generation_trace),
+        "admin",
+    )
+    progress(1.0, "eBay upload files generated")
+    return {**upload_files, "wait_seconds": wait_seconds}
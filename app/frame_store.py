@@ -0,0 +1,224 @@
+"""Memory-aware storage of snapshot DataFrames.
+
+``optimize_dtypes`` shrinks a freshly loaded table: repetitive string columns
+(supplier, store and profile names, ...) become categoricals and numeric
+columns are downcast where no precision is lost; ``encode_categories`` makes
+the same choice on an Arrow table before conversion. A ``FrameStore`` holds one
+session's frames within ``SESSION_MEMORY_BUDGET_MB``; once the budget is
+exceeded the least recently used frames are spilled to Arrow IPC files and
+memory-mapped back when they are next read.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get("RTG_SESSION_MEMORY_MB", "512"))
+SPILL_DIR = os.environ.get(
+    "RTG_SPILL_DIR", os.path.join(tempfile.gettempdir(), "rtg-automotive-spill")
+)
+
+CATEGORY_COLUMNS = (
+    "custom_label",
+    "supplier",
+    "ebay_store",
+    "payment_profile_name",
+    "shipping_profile_name",
+    "return_profile_name",
+)
+# Above this share of distinct values a categorical is bigger than the strings
+MAX_CATEGORY_RATIO = 0.5
+# Distinct values are counted on this many leading rows first, so mostly
+# unique columns such as custom_label are rejected without hashing them whole
+CATEGORY_SAMPLE_ROWS = 100_000
+
+
+def frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def downcast_integers(values: pd.Series) -> pd.Series:
+    # Never below int32, so quantity arithmetic downstream cannot overflow
+    if values.empty:
+        return values
+    int32 = np.iinfo(np.int32)
+    if int32.min <= values.min() and values.max() <= int32.max:
+        return values.astype(np.int32)
+    return values
+
+
+def downcast_floats(values: pd.Series) -> pd.Series:
+    downcast = values.astype(np.float32)
+    if np.array_equal(
+        downcast.astype(values.dtype).to_numpy(), values.to_numpy(), equal_nan=True
+    ):
+        return downcast
+    return values
+
+
+def should_categorize(values: pd.Series) -> bool:
+    if values.name not in CATEGORY_COLUMNS or len(values) == 0:
+        return False
+    sample = values.iloc[:CATEGORY_SAMPLE_ROWS]
+    if sample.nunique() > MAX_CATEGORY_RATIO * len(sample):
+        return False
+    return values.nunique() <= MAX_CATEGORY_RATIO * len(values)
+
+
+def encode_categories(table: pa.Table) -> pa.Table:
+    """Dictionary-encode the Arrow columns ``optimize_dtypes`` would categorize.
+
+    They then convert straight to categoricals, without a string per row.
+    """
+    for index, name in enumerate(table.column_names):
+        column = table.column(index)
+        if name not in CATEGORY_COLUMNS or table.num_rows == 0:
+            continue
+        if not (
+            pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+        ):
+            continue
+        sample = column.slice(0, CATEGORY_SAMPLE_ROWS)
+        if pc.count_distinct(sample).as_py() > MAX_CATEGORY_RATIO * len(sample):
+            continue
+        if pc.count_distinct(column).as_py() <= MAX_CATEGORY_RATIO * table.num_rows:
+            table = table.set_column(index, name, pc.dictionary_encode(column))
+    return table
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    optimized = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Arrow dictionaries keep first-seen order, astype("category") sorts
+            categories = values.cat.categories
+            if not values.cat.ordered and not categories.is_monotonic_increasing:
+                optimized[column] = values.cat.reorder_categories(
+                    categories.sort_values()
+                )
+            continue
+        if pd.api.types.is_integer_dtype(values) and values.dtype == np.int64:
+            optimized[column] = downcast_integers(values)
+        elif pd.api.types.is_float_dtype(values) and values.dtype == np.float64:
+            optimized[column] = downcast_floats(values)
+        elif (
+            pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+        ) and should_categorize(values):
+            optimized[column] = values.astype("category")
+    return df.assign(**optimized) if optimized else df
+
+
+def write_spill_file(path: str, df: pd.DataFrame) -> None:
+    table = pa.Table.from_pandas(df)
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_spill_file(path: str) -> pd.DataFrame:
+    # Numeric columns without nulls stay read-only views of the mapped file;
+    # strings and categoricals are copied to the heap. self_destruct frees
+    # each Arrow buffer as soon as its column is converted.
+    table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+class FrameStore:
+    """A session's DataFrames, kept within a memory budget by spilling to disk."""
+
+    def __init__(
+        self,
+        budget_bytes: int = SESSION_MEMORY_BUDGET_MB * 1024**2,
+        spill_dir: str = SPILL_DIR,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._spilled: Dict[str, str] = {}
+        self._directory: Optional[str] = None
+        self._spill_count = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._frames or name in self._spilled
+
+    def put(self, name: str, df: pd.DataFrame) -> None:
+        """Store ``df``, spilling the least recently used other frames.
+
+        The new frame itself is not spilled, even if it alone exceeds the
+        budget: the caller still holds it, so spilling would free nothing.
+        It is spilled by a later ``put`` once it is no longer the newest.
+        """
+        with self._lock:
+            self._discard(name)
+            self._frames[name] = df
+            self._sizes[name] = frame_size(df)
+            while len(self._frames) > 1 and self.memory_bytes > self.budget_bytes:
+                self._spill(next(iter(self._frames)))
+
+    def find(self, df: pd.DataFrame) -> Optional[str]:
+        """The name ``df`` itself is held under in memory, if any."""
+        with self._lock:
+            return next(
+                (name for name, frame in self._frames.items() if frame is df), None
+            )
+
+    def get(self, name: str) -> Optional[pd.DataFrame]:
+        """The frame, read back from its spill file if it was spilled.
+
+        Spilled frames are not brought back under the budget; the caller holds
+        the copy only for as long as it needs it. Stored frames are shared, so
+        callers must not modify them in place; columns read back from a spill
+        file are read-only.
+        """
+        with self._lock:
+            if name in self._frames:
+                self._frames.move_to_end(name)
+                return self._frames[name]
+            path = self._spilled.get(name)
+        return read_spill_file(path) if path else None
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._discard(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in list(self._frames) + list(self._spilled):
+                self._discard(name)
+
+    def _spill(self, name: str) -> None:
+        if self._directory is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._directory = tempfile.mkdtemp(prefix="session-", dir=self.spill_dir)
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+        self._spill_count += 1
+        path = os.path.join(self._directory, f"{self._spill_count}.arrow")
+        write_spill_file(path, self._frames.pop(name))
+        del self._sizes[name]
+        self._spilled[name] = path
+
+    def _discard(self, name: str) -> None:
+        self._frames.pop(name, None)
+        self._sizes.pop(name, None)
+        path = self._spilled.pop(name, None)
+        if path:
+            os.remove(path)
@@ -0,0 +1,70 @@
+from typing import Optional
+
+import jobs
+import pandas as pd
+import streamlit as st
+
+REFRESH_SECONDS = 5
+
+
+def display_job(job: jobs.Job) -> None:
+    if job.status in (jobs.QUEUED, jobs.RUNNING):
+        st.progress(job.progress, text=job.message or job.status.capitalize())
+    elif job.status == jobs.SUCCEEDED:
+        st.success(f"{job.description} finished at {job.finished_at}")
+    elif job.status == jobs.FAILED:
+        st.error(f"{job.description} failed: {(job.error or '').splitlines()[0]}")
+        with st.expander("Error details"):
+            st.code(job.error)
+    else:
+        st.warning(f"{job.description} was interrupted: {job.message}")
+
+
+def get_session_job(session_key: str, kind: str) -> Optional[jobs.Job]:
+    """The job this session submitted, or the latest job of ``kind``.
+
+    Falling back to the latest job means a browser refresh (a new session)
+    picks the running job up again instead of losing it.
+    """
+    job_id = st.session_state.get(session_key)
+    if job_id is not None:
+        return jobs.get_job(job_id)
+    kind_jobs = jobs.list_jobs(kind)
+    return kind_jobs[0] if kind_jobs else None
+
+
+def jobs_dataframe() -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "created": job.created_at,
+                "job": job.description,
+                "status": job.status,
+                "progress": job.progress,
+                "message": job.message,
+                "finished": job.finished_at,
+            }
+            for job in jobs.list_jobs()
+        ]
+    )
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def display_jobs() -> None:
+    active_jobs = [job for job in jobs.list_jobs() if not job.finished]
+    st.subheader(f"Running jobs ({len(active_jobs)})")
+    for job in active_jobs:
+        st.write(f"**{job.description}** (started {job.started_at or 'queued'})")
+        display_job(job)
+
+    st.subheader("History")
+    st.dataframe(
+        jobs_dataframe(),
+        use_container_width=True,
+        column_config={"progress": st.column_config.ProgressColumn("progress")},
+    )
+
+
+def main() -> None:
+    st.title("Job Status")
+    display_jobs()
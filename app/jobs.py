@@ -0,0 +1,255 @@
+"""In-process background jobs for long-running operations.
+
+Jobs run on a shared worker pool, so they keep going across Streamlit reruns
+and browser refreshes, and several can run at once. Each job's state is
+written to ``<JOB_STATE_DIR>/<job_id>/job.json`` together with any files it
+produces, so the Job Status page (and any session) can poll it by id. Each
+job records the host and pid of the process running it; ``start``, called
+once when the app starts, marks the unfinished jobs of processes on this host
+that are no longer alive as ``interrupted``. Finished jobs beyond the newest
+``MAX_JOBS_KEPT``, or older than ``MAX_JOB_AGE_HOURS``, are deleted with their
+files whenever a job finishes, so result files do not pile up between
+restarts.
+"""
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JOB_STATE_DIR = os.environ.get(
+    "RTG_JOB_STATE_DIR", os.path.join(tempfile.gettempdir(), "rtg-automotive-jobs")
+)
+MAX_WORKERS = int(os.environ.get("RTG_JOB_WORKERS", "4"))
+MAX_JOBS_KEPT = 200
+MAX_JOB_AGE_HOURS = float(os.environ.get("RTG_JOB_MAX_AGE_HOURS", "24"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, INTERRUPTED)
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    description: str
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    created_at: str = ""
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # The process running the job; jobs saved before these were recorded
+    # have neither
+    host: Optional[str] = None
+    pid: Optional[int] = None
+    # A shared resource, such as an SQS queue, only one job may use at a time
+    resource: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+
+class JobContext:
+    """Handed to a job function to report progress and store output files."""
+
+    def __init__(self, job: Job) -> None:
+        self.job = job
+
+    def update(
+        self, progress: Optional[float] = None, message: Optional[str] = None
+    ) -> None:
+        if progress is not None:
+            self.job.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.job.message = message
+        save_job(self.job)
+
+    def save_file(self, file_name: str, data: bytes) -> str:
+        path = os.path.join(job_directory(self.job.job_id), file_name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+_lock = threading.Lock()
+_submit_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="rtg-job")
+
+
+def now() -> str:
+    return datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def job_directory(job_id: str) -> str:
+    return os.path.join(JOB_STATE_DIR, job_id)
+
+
+def save_job(job: Job) -> None:
+    directory = job_directory(job.job_id)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = os.path.join(directory, "job.json.tmp")
+    with _lock:
+        with open(temporary_path, "w") as f:
+            json.dump(asdict(job), f)
+        os.replace(temporary_path, os.path.join(directory, "job.json"))
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    try:
+        with open(os.path.join(job_directory(job_id), "job.json")) as f:
+            return Job(**json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def list_jobs(kind: Optional[str] = None) -> List[Job]:
+    if not os.path.isdir(JOB_STATE_DIR):
+        return []
+    jobs = [get_job(job_id) for job_id in os.listdir(JOB_STATE_DIR)]
+    return sorted(
+        (job for job in jobs if job is not None and kind in (None, job.kind)),
+        key=lambda job: job.created_at,
+        reverse=True,
+    )
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def run_job(job: Job, func: Callable[..., Dict[str, Any]], args, kwargs) -> None:
+    context = JobContext(job)
+    job.status = RUNNING
+    job.started_at = now()
+    save_job(job)
+    try:
+        job.result = func(context, *args, **kwargs) or {}
+        job.status = SUCCEEDED
+        job.progress = 1.0
+    except Exception as e:
+        job.status = FAILED
+        job.error = f"{e}\n{traceback.format_exc()}"
+    job.finished_at = now()
+    save_job(job)
+    prune_jobs()
+
+
+def submit(
+    kind: str, description: str, func: Callable[..., Dict[str, Any]], *args, **kwargs
+) -> str:
+    """Queue ``func(context, *args, **kwargs)`` and return the new job id.
+
+    The function reports progress through ``context.update`` and returns a
+    JSON-serializable result dict (file paths rather than raw bytes).
+    """
+    return queue_job(new_job(kind, description), func, args, kwargs)
+
+
+def submit_single(
+    resource: str,
+    kind: str,
+    description: str,
+    func: Callable[..., Dict[str, Any]],
+    *args,
+    **kwargs,
+) -> Tuple[str, bool]:
+    """Like ``submit``, unless an unfinished job holds ``resource``.
+
+    Returns the job id and whether the job is new; the running job holding
+    ``resource`` may be of another kind. For jobs that must not run at the
+    same time, e.g. because they clear and read a shared queue.
+    """
+    with _submit_lock:
+        for job in list_jobs():
+            if job.resource == resource and not job.finished and not is_orphaned(job):
+                return job.job_id, False
+        job = new_job(kind, description)
+        job.resource = resource
+        return queue_job(job, func, args, kwargs), True
+
+
+def new_job(kind: str, description: str) -> Job:
+    return Job(
+        job_id=uuid.uuid4().hex,
+        kind=kind,
+        description=description,
+        created_at=now(),
+        host=socket.gethostname(),
+        pid=os.getpid(),
+    )
+
+
+def queue_job(job: Job, func: Callable[..., Dict[str, Any]], args, kwargs) -> str:
+    save_job(job)
+    _executor.submit(run_job, job, func, args, kwargs)
+    return job.job_id
+
+
+def prune_jobs(
+    keep: int = MAX_JOBS_KEPT, max_age_hours: float = MAX_JOB_AGE_HOURS
+) -> None:
+    """Delete finished jobs, with their files, beyond the newest ``keep`` or
+    finished more than ``max_age_hours`` ago."""
+    cutoff = (datetime.now() - timedelta(hours=max_age_hours)).strftime(
+        "%Y-%m-%dT%H:%M:%S"
+    )
+    finished_jobs = [job for job in list_jobs() if job.finished]
+    for number, job in enumerate(finished_jobs):
+        if number >= keep or (job.finished_at or "") < cutoff:
+            shutil.rmtree(job_directory(job.job_id), ignore_errors=True)
+
+
+def is_orphaned(job: Job) -> bool:
+    """Whether the process that ran an unfinished job is known to be gone."""
+    if job.pid is None:
+        return True
+    if job.host != socket.gethostname() or job.pid == os.getpid():
+        return False
+    try:
+        os.kill(job.pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # Alive, under another user
+        return False
+    return False
+
+
+def mark_interrupted_jobs() -> None:
+    for job in list_jobs():
+        if not job.finished and is_orphaned(job):
+            job.status = INTERRUPTED
+            job.finished_at = now()
+            job.message = "The app restarted before the job finished"
+            save_job(job)
+
+
+_started = False
+
+
+def start() -> None:
+    """Clean up after earlier app processes; only the first call does anything."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    mark_interrupted_jobs()
+    prune_jobs()
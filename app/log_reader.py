@@ -0,0 +1,108 @@
+"""Incremental reader for the frontend audit log.
+
+The reader keeps every record it has already decoded together with a cursor
+(the newest timestamp seen), so a refresh only decodes, sorts and merges the
+records written since the last read, plus those of the cursor's own second.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import telemetry
+
+LOG_TYPE = "frontend"
+
+
+def get_action_type(action: str) -> str:
+    # Actions are written as "TYPE | key=value | key=value"
+    return action.split("|")[0].strip()
+
+
+def create_reader_state() -> Dict[str, Any]:
+    return {"records": pd.DataFrame(), "cursor": None, "last_read": None}
+
+
+def fetch_logs_since(
+    logs_handler, bucket_name: str, cursor: Optional[str]
+) -> List[Dict[str, Any]]:
+    # aws_utils only exposes a full read of the log, so the cursor is applied
+    # here; this is the single place to push it down to the log store.
+    log_messages = logs_handler.get_logs(bucket_name, LOG_TYPE) or []
+    if cursor is None:
+        return list(log_messages)
+    # Timestamps have second resolution, so records from the cursor's second
+    # are read again; the merge drops the ones already held
+    return [message for message in log_messages if message["timestamp"] >= cursor]
+
+
+def read_new_logs(
+    state: Dict[str, Any], logs_handler, bucket_name: str
+) -> Dict[str, Any]:
+    """Merge records from the cursor on into ``state`` and advance it."""
+    new_messages = fetch_logs_since(logs_handler, bucket_name, state["cursor"])
+    state["last_read"] = datetime.now()
+    if not new_messages:
+        return state
+
+    new_df = pd.DataFrame(new_messages)
+    new_df["action_type"] = new_df["action"].astype(str).map(get_action_type)
+    records = pd.concat([new_df, state["records"]], ignore_index=True)
+    if "log_id" in records.columns:
+        records = records.drop_duplicates(subset=["log_id"])
+    else:
+        records = records.drop_duplicates(
+            subset=[c for c in new_df.columns if c != "action_type"]
+        )
+
+    state["records"] = records.sort_values(
+        by="timestamp", ascending=False, ignore_index=True
+    )
+    state["cursor"] = state["records"]["timestamp"].iloc[0]
+    return state
+
+
+def filter_logs(
+    records: pd.DataFrame,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    action_types: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Filter to ``start_time <= timestamp < end_time`` and the given action types."""
+    if records.empty:
+        return records
+    mask = pd.Series(True, index=records.index)
+    if start_time:
+        mask &= records["timestamp"] >= start_time
+    if end_time:
+        mask &= records["timestamp"] < end_time
+    if action_types:
+        mask &= records["action_type"].isin(action_types)
+    return records[mask]
+
+
+def get_timings(records: pd.DataFrame) -> pd.DataFrame:
+    """One row per ``<phase>_ms`` field found in the records' actions."""
+    timings = []
+    for action_type, action in zip(records["action_type"], records["action"]):
+        for key, value in telemetry.parse_action_fields(str(action)).items():
+            if key.endswith("_ms"):
+                timings.append(
+                    {
+                        "operation": action_type,
+                        "phase": key[: -len("_ms")],
+                        "duration_ms": float(value),
+                    }
+                )
+    return pd.DataFrame(timings, columns=["operation", "phase", "duration_ms"])
+
+
+def summarize_timings(timings: pd.DataFrame) -> pd.DataFrame:
+    grouped = timings.groupby(["operation", "phase"])["duration_ms"]
+    return pd.DataFrame(
+        {
+            "count": grouped.count(),
+            "p50_ms": grouped.quantile(0.5),
+            "p95_ms": grouped.quantile(0.95),
+        }
+    ).reset_index()
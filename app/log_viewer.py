@@ -1,18 +1,62 @@
 import os
-from typing import Any
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
+import log_reader
 import pandas as pd
+import profiler
 import streamlit as st
 from aws_utils import iam, logs
 
+PAGE_SIZE = 500
+
+
+def get_reader_state() -> Dict[str, Any]:
+    if "log_reader" not in st.session_state:
+        st.session_state.log_reader = log_reader.create_reader_state()
+    return st.session_state.log_reader
+
 
 def load_logs(logs_handler: logs.LogsHandler, bucket_name: str) -> None:
-    iam.get_aws_credentials(st.secrets["aws_credentials"])
-    log_messages: Any = logs_handler.get_logs(bucket_name, "frontend")
-    log_df: pd.DataFrame = pd.DataFrame(log_messages).sort_values(
-        by="timestamp", ascending=False
+    with profiler.section("iam.get_aws_credentials"):
+        iam.get_aws_credentials(st.secrets["aws_credentials"])
+    log_reader.read_new_logs(get_reader_state(), logs_handler, bucket_name)
+
+
+def select_time_range() -> Tuple[Optional[str], Optional[str]]:
+    date_range = st.date_input("Time range", value=())
+    if len(date_range) != 2:
+        return None, None
+    start_date, end_date = date_range
+    return start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()
+
+
+def select_action_types(records: pd.DataFrame) -> List[str]:
+    options = sorted(records["action_type"].unique()) if not records.empty else []
+    return st.multiselect("Actions", options=options)
+
+
+def display_logs(records: pd.DataFrame) -> None:
+    st.write(f"{len(records)} log entries")
+    st.dataframe(
+        records.drop(columns=["log_id", "action_type"], errors="ignore").head(
+            PAGE_SIZE
+        ),
+        use_container_width=True,
+    )
+
+
+def display_timings(records: pd.DataFrame) -> None:
+    timings = log_reader.get_timings(records) if not records.empty else pd.DataFrame()
+    if timings.empty:
+        st.write("No timing data in the selected logs")
+        return
+    summary = log_reader.summarize_timings(timings)
+    summary["operation_phase"] = summary["operation"] + " / " + summary["phase"]
+    st.bar_chart(
+        summary.set_index("operation_phase")[["p50_ms", "p95_ms"]], stack=False
     )
-    st.dataframe(log_df.drop(columns=["log_id"]), use_container_width=True)
+    st.dataframe(summary.drop(columns=["operation_phase"]), use_container_width=True)
 
 
 def main() -> None:
@@ -21,11 +65,23 @@ def main() -> None:
     st.title("Logs")
     logs_handler: logs.LogsHandler = logs.LogsHandler()
 
-    load_logs(logs_handler, bucket_name)
-
+    state = get_reader_state()
     refresh_button: bool = st.button("Refresh Logs")
-    if refresh_button:
+    if state["last_read"] is None or refresh_button:
         load_logs(logs_handler, bucket_name)
+    st.caption(f"Last refreshed: {state['last_read']:%Y-%m-%d %H:%M:%S}")
+
+    start_time, end_time = select_time_range()
+    action_types = select_action_types(state["records"])
+    filtered_logs = log_reader.filter_logs(
+        state["records"], start_time, end_time, action_types
+    )
+
+    tab_logs, tab_timings = st.tabs(["Logs", "Timings"])
+    with tab_logs:
+        display_logs(filtered_logs)
+    with tab_timings:
+        display_timings(filtered_logs)
 
 
 if __name__ == "__main__":
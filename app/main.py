@@ -1,12 +1,17 @@
 import bulk_edits
 import ebay_upload_generator
+import job_status
+import jobs
 import log_viewer
+import profiler
+import snapshot_prefetch
 import stock_manager
 import stock_manager_config
 import stock_manager_file_store
-import table_viewer
-
 import streamlit as st
+import table_query
+import table_viewer
+from aws_utils import iam
 
 STAGE = st.secrets["aws_credentials"]["STAGE"]
 
@@ -33,8 +38,35 @@ def login() -> bool:
     return st.session_state.logged_in
 
 
+def start_prefetch() -> None:
+    if "prefetch" not in st.session_state:
+        iam.get_aws_credentials(st.secrets["aws_credentials"])
+        st.session_state.prefetch = snapshot_prefetch.start(
+            table_query.get_bucket_name(), table_viewer.get_session_frame_store()
+        )
+
+
+@st.fragment(run_every=job_status.REFRESH_SECONDS)
+def display_prefetch_status() -> None:
+    prefetch = st.session_state.get("prefetch")
+    if prefetch is None:
+        return
+    if prefetch.finished:
+        states = {status.state for status in prefetch.statuses.values()}
+        if states <= {snapshot_prefetch.WARM, snapshot_prefetch.MISSING}:
+            st.caption("Tables warmed up")
+            return
+    with st.expander("Table warm-up", expanded=not prefetch.finished):
+        for dataset, status in prefetch.statuses.items():
+            st.caption(f"{dataset}: {status.describe()}")
+        if not prefetch.finished and st.button("Cancel warm-up"):
+            prefetch.cancel()
+
+
 if __name__ == "__main__":
+    jobs.start()
     if login():
+        start_prefetch()
         st.sidebar.title("Navigation")
         app_mode = st.sidebar.selectbox(
             "Choose the app",
@@ -46,20 +78,31 @@ if __name__ == "__main__":
                 "Table Viewer",
                 "Bulk Edits",
                 "Log Viewer",
+                "Job Status",
             ),
         )
 
-        if app_mode == "Ebay Upload Generator":
-            ebay_upload_generator.main()
-        elif app_mode == "Stock Manager":
-            stock_manager.main()
-        elif app_mode == "Stock Manager Configuration":
-            stock_manager_config.main()
-        elif app_mode == "Stock Manager File Store":
-            stock_manager_file_store.main()
-        elif app_mode == "Table Viewer":
-            table_viewer.main()
-        elif app_mode == "Bulk Edits":
-            bulk_edits.main()
-        elif app_mode == "Log Viewer":
-            log_viewer.main()
+        with st.sidebar:
+            display_prefetch_status()
+
+        profiling = profiler.profiling_enabled()
+        with profiler.profile_rerun(app_mode, profiling) as rerun_profile:
+            if app_mode == "Ebay Upload Generator":
+                ebay_upload_generator.main()
+            elif app_mode == "Stock Manager":
+                stock_manager.main()
+            elif app_mode == "Stock Manager Configuration":
+                stock_manager_config.main()
+            elif app_mode == "Stock Manager File Store":
+                stock_manager_file_store.main()
+            elif app_mode == "Table Viewer":
+                table_viewer.main()
+            elif app_mode == "Bulk Edits":
+                bulk_edits.main()
+            elif app_mode == "Log Viewer":
+                log_viewer.main()
+            elif app_mode == "Job Status":
+                job_status.main()
+
+        if rerun_profile is not None:
+            profiler.render_panel(rerun_profile)
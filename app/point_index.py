@@ -0,0 +1,398 @@
+"""Sidecar point-lookup index of a compacted snapshot.
+
+For each key column (``item_id``, ``custom_label``, ``part_number``) present
+in the table, compaction writes two objects under
+``compacted/<prefix><timestamp>/_index/``:
+
+- ``<column>.parquet``: the distinct keys, sorted, with the data file and row
+  group holding each one, in row groups of ``INDEX_ROW_GROUP_ROWS`` keys;
+- ``<column>.bloom``: a bloom filter of the keys with a
+  ``BLOOM_FALSE_POSITIVE_RATE`` false positive rate.
+
+A lookup checks the keys against the bloom filter, reads only the index row
+groups whose key range covers a remaining key and then only the data row
+groups named by the index, each with a ranged GET. Manifests, bloom filters
+and parquet footers are immutable and cached in the process, so a repeated
+lookup costs one index and one data read.
+"""
+
+import io
+import json
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bulk_filter
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import snapshot_catalog
+import telemetry
+
+INDEX_COLUMNS = ("item_id", "custom_label", "part_number")
+INDEX_DIR = "_index/"
+INDEX_ROW_GROUP_ROWS = 8 * 1024
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+# Larger key lists are cheaper as a full read or a bulk filter
+MAX_LOOKUP_KEYS = bulk_filter.BULK_FILTER_THRESHOLD
+MAX_CACHED_OBJECTS = 64
+
+# pandas' SipHash keys; two independent hashes drive the double hashing
+HASH_KEYS = ("rtg-automotive-1", "rtg-automotive-2")
+
+_cache_lock = threading.Lock()
+_object_cache: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+
+
+class RangeReader(io.RawIOBase):
+    """Read-only file over an S3 object that fetches bytes with ranged GETs.
+
+    Ranges passed to ``prefetch`` are fetched in one request each and served
+    from memory, so pyarrow's many small column chunk reads of a row group do
+    not each become a request.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, key: str, size: int) -> None:
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = size
+        self.position = 0
+        self.buffers: List[Tuple[int, bytes]] = []
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}
+        self.position = base[whence] + offset
+        return self.position
+
+    def fetch(self, start: int, length: int) -> bytes:
+        with telemetry.span(telemetry.S3_FETCH, bytes=length):
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                Range=f"bytes={start}-{start + length - 1}",
+            )
+            return response["Body"].read()
+
+    def prefetch(self, ranges: Iterable[Tuple[int, int]]) -> None:
+        for start, length in ranges:
+            self.buffers.append((start, self.fetch(start, length)))
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+        start = self.position
+        data = next(
+            (
+                data[start - offset : start - offset + length]
+                for offset, data in self.buffers
+                if offset <= start and start + length <= offset + len(data)
+            ),
+            None,
+        )
+        if data is None:
+            data = self.fetch(start, length)
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def get_index_prefix(prefix: str, timestamp: str) -> str:
+    return snapshot_catalog.get_compacted_prefix(prefix, timestamp) + INDEX_DIR
+
+
+def get_row_group_range(metadata: pq.FileMetaData, index: int) -> Tuple[int, int]:
+    """Byte offset and length of one row group's column chunks."""
+    row_group = metadata.row_group(index)
+    start, end = None, 0
+    for column_index in range(row_group.num_columns):
+        column = row_group.column(column_index)
+        column_start = (
+            column.dictionary_page_offset
+            if column.has_dictionary_page
+            else column.data_page_offset
+        )
+        start = column_start if start is None else min(start, column_start)
+        end = max(end, column_start + column.total_compressed_size)
+    return start or 0, end - (start or 0)
+
+
+def normalize_keys(values: Iterable[Any], numeric: bool) -> np.ndarray:
+    """Keys as the strings stored in the index, e.g. ``200000000001`` for an
+    item id read as ``2.00000000001e11`` or ``"200000000001"``."""
+    values = pd.Series(list(values), dtype=object)
+    if numeric:
+        values = pd.to_numeric(values, errors="coerce").dropna().astype("int64")
+    else:
+        values = values.dropna()
+    return np.unique(values.astype(str).to_numpy(dtype=object))
+
+
+def hash_keys(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return tuple(
+        pd.util.hash_array(keys.astype(object), hash_key=hash_key)
+        for hash_key in HASH_KEYS
+    )
+
+
+def get_bloom_size(key_count: int) -> Tuple[int, int]:
+    """Bit and hash function counts for ``BLOOM_FALSE_POSITIVE_RATE``."""
+    bits = math.ceil(
+        -max(key_count, 1) * math.log(BLOOM_FALSE_POSITIVE_RATE) / math.log(2) ** 2
+    )
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / max(key_count, 1) * math.log(2)))
+    return bits, hashes
+
+
+def get_bit_positions(keys: np.ndarray, bits: int, hashes: int) -> List[np.ndarray]:
+    first, second = hash_keys(keys)
+    # uint64 arithmetic wraps, which is fine for hashing
+    with np.errstate(over="ignore"):
+        return [
+            (first + np.uint64(i) * second) % np.uint64(bits) for i in range(hashes)
+        ]
+
+
+def build_bloom(keys: np.ndarray, bits: int, hashes: int) -> bytes:
+    bitmap = np.zeros(bits, dtype=bool)
+    for positions in get_bit_positions(keys, bits, hashes):
+        bitmap[positions] = True
+    return np.packbits(bitmap).tobytes()
+
+
+def bloom_contains(
+    bloom: bytes, keys: np.ndarray, bits: int, hashes: int
+) -> np.ndarray:
+    bitmap = np.frombuffer(bloom, dtype=np.uint8)
+    found = np.ones(len(keys), dtype=bool)
+    for positions in get_bit_positions(keys, bits, hashes):
+        bytes_ = bitmap[(positions >> np.uint64(3)).astype(np.int64)]
+        shift = (np.uint64(7) - (positions & np.uint64(7))).astype(np.uint8)
+        found &= ((bytes_ >> shift) & 1).astype(bool)
+    return found
+
+
+def build_index(
+    s3_handler,
+    bucket_name: str,
+    prefix: str,
+    timestamp: str,
+    table: pa.Table,
+    files: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Write the index and bloom filter of each key column of ``table``.
+
+    ``table`` holds the rows of the compacted ``files`` in file order; the
+    returned entries go in the compaction manifest under ``index``.
+    """
+    file_numbers = np.repeat(np.arange(len(files)), [f["rows"] for f in files])
+    row_groups = np.concatenate(
+        [np.zeros(0, dtype=np.int64)]
+        + [
+            np.repeat(
+                np.arange(len(f["row_groups"])), [rg["rows"] for rg in f["row_groups"]]
+            )
+            for f in files
+        ]
+    )
+    index_prefix = get_index_prefix(prefix, timestamp)
+    index = {}
+    for column in INDEX_COLUMNS:
+        if column not in table.column_names:
+            continue
+        with telemetry.span(telemetry.TRANSFORM, rows=table.num_rows):
+            values = table[column].to_pandas()
+            numeric = pd.api.types.is_numeric_dtype(values)
+            locations = pd.DataFrame(
+                {"key": values, "file": file_numbers, "row_group": row_groups}
+            ).dropna(subset=["key"])
+            if numeric:
+                locations["key"] = locations["key"].astype("int64")
+            locations["key"] = locations["key"].astype(str)
+            locations = (
+                locations.drop_duplicates().sort_values("key").reset_index(drop=True)
+            )
+            keys = locations["key"].unique().astype(object)
+            bits, hashes = get_bloom_size(len(keys))
+            bloom = build_bloom(keys, bits, hashes)
+
+        sink = io.BytesIO()
+        pq.write_table(
+            pa.Table.from_pandas(
+                locations.astype({"file": "int32", "row_group": "int32"}),
+                preserve_index=False,
+            ),
+            sink,
+            row_group_size=INDEX_ROW_GROUP_ROWS,
+            compression="zstd",
+            write_statistics=["key"],
+        )
+        entry = {
+            "index_key": f"{index_prefix}{column}.parquet",
+            "index_size": len(sink.getvalue()),
+            "bloom_key": f"{index_prefix}{column}.bloom",
+            "bloom_bits": bits,
+            "bloom_hashes": hashes,
+            "numeric": numeric,
+            "keys": len(keys),
+        }
+        with telemetry.span(
+            telemetry.S3_UPLOAD, bytes=entry["index_size"] + len(bloom)
+        ):
+            s3_handler.s3_client.put_object(
+                Bucket=bucket_name, Key=entry["index_key"], Body=sink.getvalue()
+            )
+            s3_handler.s3_client.put_object(
+                Bucket=bucket_name, Key=entry["bloom_key"], Body=bloom
+            )
+        index[column] = entry
+    return index
+
+
+def get_cached(cache_key: Tuple[str, str], load) -> Any:
+    with _cache_lock:
+        if cache_key in _object_cache:
+            _object_cache.move_to_end(cache_key)
+            return _object_cache[cache_key]
+    value = load()
+    with _cache_lock:
+        _object_cache[cache_key] = value
+        while len(_object_cache) > MAX_CACHED_OBJECTS:
+            _object_cache.popitem(last=False)
+    return value
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _object_cache.clear()
+
+
+def read_object(s3_handler, bucket_name: str, key: str) -> bytes:
+    with telemetry.span(telemetry.S3_FETCH) as fetch_span:
+        response = s3_handler.s3_client.get_object(Bucket=bucket_name, Key=key)
+        data = response["Body"].read()
+        fetch_span["bytes"] = len(data)
+    return data
+
+
+def get_manifest(
+    s3_handler, bucket_name: str, snapshot: snapshot_catalog.Snapshot
+) -> Dict[str, Any]:
+    key = snapshot_catalog.get_manifest_key(snapshot.prefix, snapshot.timestamp)
+    return get_cached(
+        (bucket_name, key),
+        lambda: json.loads(read_object(s3_handler, bucket_name, key)),
+    )
+
+
+def open_parquet(
+    s3_handler, bucket_name: str, key: str, size: int
+) -> Tuple[RangeReader, pq.FileMetaData]:
+    reader = RangeReader(s3_handler.s3_client, bucket_name, key, size)
+    metadata = get_cached((bucket_name, key), lambda: pq.ParquetFile(reader).metadata)
+    return reader, metadata
+
+
+def read_row_groups(
+    reader: RangeReader,
+    metadata: pq.FileMetaData,
+    row_groups: List[int],
+    ranges: List[Tuple[int, int]],
+    **kwargs: Any,
+) -> pa.Table:
+    reader.prefetch(ranges)
+    with telemetry.span(telemetry.DECODE) as decode_span:
+        table = pq.ParquetFile(reader, metadata=metadata).read_row_groups(
+            row_groups, **kwargs
+        )
+        decode_span["rows"] = table.num_rows
+    return table
+
+
+def find_locations(
+    s3_handler, bucket_name: str, entry: Dict[str, Any], keys: np.ndarray
+) -> List[Tuple[int, int]]:
+    """(file, row group) pairs of the data holding any of ``keys``."""
+    reader, metadata = open_parquet(
+        s3_handler, bucket_name, entry["index_key"], entry["index_size"]
+    )
+    keys = np.sort(keys)
+    row_groups = []
+    for index in range(metadata.num_row_groups):
+        statistics = metadata.row_group(index).column(0).statistics
+        first = np.searchsorted(keys, statistics.min, side="left")
+        if first < len(keys) and keys[first] <= statistics.max:
+            row_groups.append(index)
+    if not row_groups:
+        return []
+    ranges = [get_row_group_range(metadata, index) for index in row_groups]
+    locations = read_row_groups(reader, metadata, row_groups, ranges).to_pandas()
+    matches = locations[locations["key"].isin(set(keys))]
+    return sorted(set(zip(matches["file"], matches["row_group"])))
+
+
+def lookup(
+    s3_handler,
+    bucket_name: str,
+    snapshot: snapshot_catalog.Snapshot,
+    filters: bulk_filter.Filters,
+) -> Optional[pd.DataFrame]:
+    """Rows of a compacted snapshot matching ``filters``, read through the index.
+
+    Returns None when the index cannot serve the query: the snapshot is not
+    compacted or has no index, or no filter on an indexed column has at most
+    ``MAX_LOOKUP_KEYS`` values.
+    """
+    if not any(snapshot_catalog.is_compacted_key(key) for key in snapshot.keys):
+        return None
+    manifest = get_manifest(s3_handler, bucket_name, snapshot)
+    index = manifest.get("index", {})
+    columns = [
+        column
+        for column, values in filters.items()
+        if column in index and len(values) <= MAX_LOOKUP_KEYS
+    ]
+    if not columns:
+        return None
+    column = min(columns, key=lambda c: len(filters[c]))
+    entry = index[column]
+
+    keys = normalize_keys(filters[column], entry["numeric"])
+    bloom = get_cached(
+        (bucket_name, entry["bloom_key"]),
+        lambda: read_object(s3_handler, bucket_name, entry["bloom_key"]),
+    )
+    keys = keys[bloom_contains(bloom, keys, entry["bloom_bits"], entry["bloom_hashes"])]
+    locations = (
+        find_locations(s3_handler, bucket_name, entry, keys) if len(keys) else []
+    )
+    if not locations:
+        return pd.DataFrame(columns=manifest["columns"])
+
+    tables = []
+    for file_number in sorted({file_number for file_number, _ in locations}):
+        file = manifest["files"][file_number]
+        row_groups = [rg for number, rg in locations if number == file_number]
+        reader, metadata = open_parquet(
+            s3_handler, bucket_name, file["key"], file["size"]
+        )
+        ranges = [
+            (file["row_groups"][rg]["offset"], file["row_groups"][rg]["length"])
+            for rg in row_groups
+        ]
+        tables.append(read_row_groups(reader, metadata, row_groups, ranges))
+    df = pa.concat_tables(tables).to_pandas()
+    return bulk_filter.semi_join(df, filters)
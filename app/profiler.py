@@ -0,0 +1,153 @@
+"""Opt-in per-rerun render profiler.
+
+Enable it from the sidebar or by setting ``RTG_PROFILE=1``. While a rerun is
+being profiled every ``timed`` function and ``section`` block is recorded and
+the whole rerun runs under cProfile. The panel shows the breakdown and offers
+the cProfile stats for download (``.prof`` for snakeviz/pstats, or text).
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import pandas as pd
+import streamlit as st
+
+PROFILE_ENV_VAR = "RTG_PROFILE"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class RerunProfile:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.sections: List[Dict[str, Any]] = []
+        self.depth = 0
+        self.total_ms = 0.0
+        self.profile = cProfile.Profile()
+        self.profile_active = False
+
+    def to_dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.sections, columns=["section", "depth", "duration_ms"])
+        df["section"] = [
+            "  " * depth + name for name, depth in zip(df["section"], df["depth"])
+        ]
+        df["share"] = df["duration_ms"] / self.total_ms if self.total_ms else 0.0
+        return df.drop(columns=["depth"])
+
+    def stats_text(self, limit: int = 50) -> str:
+        if not self.profile_active:
+            return (
+                "cProfile was unavailable for this rerun (another profiler is active)."
+            )
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return stream.getvalue()
+
+    def stats_bytes(self) -> bytes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rerun.prof")
+            self.profile.dump_stats(path)
+            with open(path, "rb") as f:
+                return f.read()
+
+
+_current_profile: ContextVar[Optional[RerunProfile]] = ContextVar(
+    "rerun_profile", default=None
+)
+
+
+def env_enabled() -> bool:
+    return os.environ.get(PROFILE_ENV_VAR, "").lower() in ("1", "true", "yes")
+
+
+def profiling_enabled() -> bool:
+    return st.sidebar.checkbox("Profile reruns", value=env_enabled())
+
+
+@contextmanager
+def section(name: str) -> Iterator[None]:
+    rerun_profile = _current_profile.get()
+    if rerun_profile is None:
+        yield
+        return
+
+    record: Dict[str, Any] = {"section": name, "depth": rerun_profile.depth}
+    rerun_profile.sections.append(record)
+    rerun_profile.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["duration_ms"] = (time.perf_counter() - start) * 1000
+        rerun_profile.depth -= 1
+
+
+def timed(name: str) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+@contextmanager
+def profile_rerun(name: str, enabled: bool) -> Iterator[Optional[RerunProfile]]:
+    if not enabled:
+        yield None
+        return
+
+    rerun_profile = RerunProfile(name)
+    token = _current_profile.set(rerun_profile)
+    start = time.perf_counter()
+    try:
+        rerun_profile.profile.enable()
+        rerun_profile.profile_active = True
+    except ValueError:
+        # Only one cProfile can run at a time on Python 3.12+, so a concurrent
+        # profiled session still gets the section breakdown
+        pass
+    try:
+        with section(f"{name} main()"):
+            yield rerun_profile
+    finally:
+        if rerun_profile.profile_active:
+            rerun_profile.profile.disable()
+        rerun_profile.total_ms = (time.perf_counter() - start) * 1000
+        _current_profile.reset(token)
+
+
+def render_panel(rerun_profile: RerunProfile) -> None:
+    with st.expander(
+        f"Render profile: {rerun_profile.name} ({rerun_profile.total_ms:.0f} ms)"
+    ):
+        st.dataframe(rerun_profile.to_dataframe(), use_container_width=True)
+        stats_text = rerun_profile.stats_text()
+        st.code(stats_text)
+        if not rerun_profile.profile_active:
+            return
+        file_stem = f"profile_{time.strftime('%Y%m%dT%H%M%S')}"
+        st.download_button(
+            label="Download cProfile stats (.prof)",
+            data=rerun_profile.stats_bytes(),
+            file_name=f"{file_stem}.prof",
+            mime="application/octet-stream",
+        )
+        st.download_button(
+            label="Download text report",
+            data=stats_text,
+            file_name=f"{file_stem}.txt",
+            mime="text/plain",
+        )
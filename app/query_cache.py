@@ -0,0 +1,135 @@
+"""Process-wide cache of Table Viewer query results.
+
+Results are keyed by the normalized query (table, filters, limit), expire after
+``ttl_seconds`` and are evicted least-recently-used once the estimated size
+of all entries exceeds ``max_bytes``. Identical queries running at the same
+time from different sessions share one backend fetch. ``invalidate`` drops a
+table's entries and discards any fetch for it that is still in flight.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+import pandas as pd
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_BYTES = 256 * 1024**2
+
+QueryKey = Tuple[str, str, int]
+
+
+def normalize_query(params: Dict[str, Any]) -> QueryKey:
+    filters = params.get("filters") or {}
+    if isinstance(filters, str):
+        filters = json.loads(filters)
+    normalized_filters = {
+        column: sorted({str(value) for value in values})
+        for column, values in filters.items()
+    }
+    return (
+        params["table_name"],
+        json.dumps(normalized_filters, sort_keys=True),
+        int(params.get("limit", 0)),
+    )
+
+
+def estimate_size(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        row_size = sys.getsizeof(value[0]) + sum(
+            sys.getsizeof(item) for item in value[0].values()
+        )
+        return sys.getsizeof(value) + row_size * len(value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    def __init__(
+        self,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[QueryKey, Tuple[float, int, Any]]" = OrderedDict()
+        self._size = 0
+        self._in_flight: Dict[QueryKey, Future] = {}
+        self._generations: Dict[str, int] = {}
+
+    def get_or_fetch(
+        self,
+        params: Dict[str, Any],
+        fetch: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        key = normalize_query(params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                return entry[2]
+            if entry is not None:
+                self._remove(key)
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                owner = False
+            else:
+                owner = True
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generations.get(key[0], 0)
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            if cacheable(value) and self._generations.get(key[0], 0) == generation:
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, table_name: str) -> None:
+        with self._lock:
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+            for key in [key for key in self._entries if key[0] == table_name]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _store(self, key: QueryKey, value: Any) -> None:
+        if key in self._entries:
+            self._remove(key)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (time.time() + self.ttl_seconds, size, value)
+        self._size += size
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: QueryKey) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+query_cache = QueryCache()
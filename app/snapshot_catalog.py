@@ -0,0 +1,456 @@
+"""Catalog of timestamped snapshots stored under ``<prefix><timestamp>/`` in S3.
+
+Each dataset keeps a small pointer object (``<prefix>_latest.json``) naming its
+latest snapshot. Resolving the latest snapshot reads the pointer and lists the
+pointed-to snapshot and anything newer with a single ``StartAfter`` listing,
+so the cost does not grow with the amount of history. The pointer holds only
+the timestamp: parts written after an earlier resolve are still picked up.
+Without a pointer the catalog falls back to a cached, paginated listing of the
+prefix and writes the pointer for next time.
+
+A snapshot that has been compacted (see ``snapshot_compaction``) has its
+compacted files and a manifest under ``compacted/<prefix><timestamp>/``,
+outside the snapshot folder, so other readers of the folder are unaffected.
+Once the manifest exists ``resolve_latest_snapshot`` returns the files it
+lists in place of the original parts.
+
+``load_snapshot`` reads the parts in ``LOAD_MODE``: ``"mmap"`` streams each
+object to a temporary file and decodes it through a memory map, so the raw
+parquet bytes never sit on the heap next to the decoded columns; ``"memory"``
+reads each object into ``bytes`` first. In ``"mmap"`` mode parts already in
+the local part cache (``PART_CACHE_DIR``, filled by ``snapshot_prefetch``)
+are read from there instead of S3. Snapshot parts are never rewritten in
+place, so a cached part is valid for as long as it is kept.
+"""
+
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import frame_store
+import pandas as pd
+import profiler
+import pyarrow as pa
+import pyarrow.parquet as pq
+import telemetry
+
+POINTER_NAME = "_latest.json"
+COMPACTED_ROOT = "compacted/"
+MANIFEST_NAME = "_manifest.json"
+LISTING_TTL_SECONDS = 300
+RESOLVE_TTL_SECONDS = 60
+
+MEMORY = "memory"
+MMAP = "mmap"
+LOAD_MODE = os.environ.get("RTG_SNAPSHOT_LOAD_MODE", MMAP)
+DOWNLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+PART_CACHE_DIR = os.path.join(frame_store.SPILL_DIR, "parts")
+PART_CACHE_MAX_BYTES = int(os.environ.get("RTG_PART_CACHE_MB", "2048")) * 1024**2
+
+_cache_lock = threading.Lock()
+_listing_cache: Dict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]] = {}
+_resolve_cache: Dict[Tuple[str, str, str], Tuple[float, "Snapshot"]] = {}
+_part_locks: Dict[str, threading.Lock] = {}
+
+
+@dataclass
+class Snapshot:
+    prefix: str
+    timestamp: str
+    keys: List[str] = field(default_factory=list)
+    size: int = 0
+
+
+def get_snapshot_timestamp(prefix: str, key: str) -> str:
+    return key[len(prefix) :].split("/")[0]
+
+
+def is_snapshot_key(
+    prefix: str, key: str, suffix: str, timestamp_length: Optional[int] = None
+) -> bool:
+    relative_key = key[len(prefix) :]
+    if not key.startswith(prefix) or "/" not in relative_key:
+        return False
+    if not key.endswith(suffix):
+        return False
+    timestamp = get_snapshot_timestamp(prefix, key)
+    return timestamp_length is None or len(timestamp) == timestamp_length
+
+
+def get_compacted_prefix(prefix: str, timestamp: str) -> str:
+    return f"{COMPACTED_ROOT}{prefix}{timestamp}/"
+
+
+def get_manifest_key(prefix: str, timestamp: str) -> str:
+    return get_compacted_prefix(prefix, timestamp) + MANIFEST_NAME
+
+
+def is_compacted_key(key: str) -> bool:
+    return key.startswith(COMPACTED_ROOT)
+
+
+def is_hidden_key(prefix: str, key: str) -> bool:
+    """Manifests and indexes (``_`` names) below the timestamp folder."""
+    return any(part.startswith("_") for part in key[len(prefix) :].split("/")[1:])
+
+
+def iterate_objects(
+    s3_client, bucket_name: str, prefix: str, start_after: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    kwargs = {"Bucket": bucket_name, "Prefix": prefix}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(**kwargs):
+        yield from page.get("Contents", [])
+
+
+def list_objects(s3_handler, bucket_name: str, prefix: str) -> List[Dict[str, Any]]:
+    """Full paginated listing of a prefix, cached for ``LISTING_TTL_SECONDS``."""
+    cache_key = (bucket_name, prefix)
+    with _cache_lock:
+        cached = _listing_cache.get(cache_key)
+    if cached and time.time() - cached[0] < LISTING_TTL_SECONDS:
+        return cached[1]
+
+    objects = [
+        {"Key": obj["Key"], "Size": obj.get("Size", 0)}
+        for obj in iterate_objects(s3_handler.s3_client, bucket_name, prefix)
+    ]
+    with _cache_lock:
+        _listing_cache[cache_key] = (time.time(), objects)
+    return objects
+
+
+def clear_caches() -> None:
+    with _cache_lock:
+        _listing_cache.clear()
+        _resolve_cache.clear()
+
+
+def group_snapshots(
+    prefix: str,
+    objects: List[Dict[str, Any]],
+    suffix: str,
+    timestamp_length: Optional[int] = None,
+) -> List[Snapshot]:
+    """Group objects by their timestamp folder, newest snapshot first."""
+    snapshots: Dict[str, Snapshot] = {}
+    for obj in objects:
+        if not is_snapshot_key(
+            prefix, obj["Key"], suffix, timestamp_length
+        ) or is_hidden_key(prefix, obj["Key"]):
+            continue
+        timestamp = get_snapshot_timestamp(prefix, obj["Key"])
+        snapshot = snapshots.setdefault(timestamp, Snapshot(prefix, timestamp))
+        snapshot.keys.append(obj["Key"])
+        snapshot.size += obj.get("Size", 0)
+    return sorted(snapshots.values(), key=lambda s: s.timestamp, reverse=True)
+
+
+def list_snapshots(
+    s3_handler,
+    bucket_name: str,
+    prefix: str,
+    suffix: str = ".parquet",
+    timestamp_length: Optional[int] = None,
+) -> List[Snapshot]:
+    objects = list_objects(s3_handler, bucket_name, prefix)
+    return group_snapshots(prefix, objects, suffix, timestamp_length)
+
+
+def read_pointer(s3_handler, bucket_name: str, prefix: str) -> Optional[Snapshot]:
+    s3_client = s3_handler.s3_client
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=prefix + POINTER_NAME)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    pointer = json.loads(response["Body"].read())
+    # Only the timestamp is trusted; older pointers also carry a key list
+    return Snapshot(pointer["prefix"], pointer["timestamp"])
+
+
+def read_manifest(
+    s3_handler, bucket_name: str, prefix: str, timestamp: str
+) -> Optional[Dict[str, Any]]:
+    s3_client = s3_handler.s3_client
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=get_manifest_key(prefix, timestamp)
+        )
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response["Body"].read())
+
+
+def apply_compaction(s3_handler, bucket_name: str, snapshot: Snapshot) -> Snapshot:
+    """The snapshot made of its compacted files, if it has been compacted."""
+    manifest = read_manifest(
+        s3_handler, bucket_name, snapshot.prefix, snapshot.timestamp
+    )
+    if manifest is None:
+        return snapshot
+    return Snapshot(
+        snapshot.prefix,
+        snapshot.timestamp,
+        [file["key"] for file in manifest["files"]],
+        manifest["size"],
+    )
+
+
+def write_pointer(s3_handler, bucket_name: str, snapshot: Snapshot) -> None:
+    # The keys are not saved: the snapshot may still have been written to
+    # when it was resolved, so they are listed again on every resolve
+    s3_handler.s3_client.put_object(
+        Bucket=bucket_name,
+        Key=snapshot.prefix + POINTER_NAME,
+        Body=json.dumps(
+            {"prefix": snapshot.prefix, "timestamp": snapshot.timestamp}
+        ).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def record_snapshot(
+    s3_handler,
+    bucket_name: str,
+    prefix: str,
+    timestamp: str,
+    keys: List[str],
+    size: int = 0,
+) -> Snapshot:
+    """Point the dataset at a snapshot that has just been written."""
+    snapshot = Snapshot(prefix, timestamp, list(keys), size)
+    write_pointer(s3_handler, bucket_name, snapshot)
+    invalidate(bucket_name, prefix)
+    return snapshot
+
+
+def invalidate(bucket_name: str, prefix: str) -> None:
+    """Forget the cached listing and latest snapshot of one dataset."""
+    with _cache_lock:
+        _listing_cache.pop((bucket_name, prefix), None)
+        for cache_key in [k for k in _resolve_cache if k[:2] == (bucket_name, prefix)]:
+            del _resolve_cache[cache_key]
+
+
+def find_current_snapshot(
+    s3_handler,
+    bucket_name: str,
+    pointer: Snapshot,
+    suffix: str,
+    timestamp_length: Optional[int] = None,
+) -> Optional[Snapshot]:
+    """The pointed-to snapshot or a newer one, with its keys listed afresh."""
+    # Every key of the pointed-to snapshot sorts after "<prefix><timestamp>",
+    # so the listing covers it and newer history but none of the older
+    objects = iterate_objects(
+        s3_handler.s3_client,
+        bucket_name,
+        pointer.prefix,
+        start_after=f"{pointer.prefix}{pointer.timestamp}",
+    )
+    snapshots = group_snapshots(pointer.prefix, list(objects), suffix, timestamp_length)
+    return snapshots[0] if snapshots else None
+
+
+@profiler.timed("resolve_latest_snapshot")
+def resolve_latest_snapshot(
+    s3_handler,
+    bucket_name: str,
+    prefix: str,
+    suffix: str = ".parquet",
+    timestamp_length: Optional[int] = None,
+) -> Optional[Snapshot]:
+    cache_key = (bucket_name, prefix, suffix)
+    with _cache_lock:
+        cached = _resolve_cache.get(cache_key)
+    if cached and time.time() - cached[0] < RESOLVE_TTL_SECONDS:
+        return cached[1]
+
+    pointer = read_pointer(s3_handler, bucket_name, prefix)
+    snapshot = (
+        find_current_snapshot(
+            s3_handler, bucket_name, pointer, suffix, timestamp_length
+        )
+        if pointer is not None
+        else None
+    )
+    if snapshot is None:
+        # No pointer, or the pointed-to snapshot is gone
+        snapshots = list_snapshots(
+            s3_handler, bucket_name, prefix, suffix, timestamp_length
+        )
+        if not snapshots:
+            return None
+        snapshot = snapshots[0]
+
+    if pointer is None or snapshot.timestamp != pointer.timestamp:
+        write_pointer(s3_handler, bucket_name, snapshot)
+    if suffix == ".parquet":
+        snapshot = apply_compaction(s3_handler, bucket_name, snapshot)
+    with _cache_lock:
+        _resolve_cache[cache_key] = (time.time(), snapshot)
+    return snapshot
+
+
+def download_object(
+    s3_handler,
+    bucket_name: str,
+    key: str,
+    directory: str,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> str:
+    """Stream an object to a new temporary file in ``directory``; returns its path.
+
+    ``on_chunk(size)`` is called after each chunk and may raise to abandon
+    the download.
+    """
+    os.makedirs(directory, exist_ok=True)
+    response = s3_handler.s3_client.get_object(Bucket=bucket_name, Key=key)
+    with tempfile.NamedTemporaryFile(
+        dir=directory, suffix=".parquet", delete=False
+    ) as f:
+        try:
+            while chunk := response["Body"].read(DOWNLOAD_CHUNK_BYTES):
+                f.write(chunk)
+                if on_chunk is not None:
+                    on_chunk(len(chunk))
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    return f.name
+
+
+def get_cached_part_path(bucket_name: str, key: str) -> str:
+    return os.path.join(PART_CACHE_DIR, bucket_name, *key.split("/"))
+
+
+def get_cached_part(bucket_name: str, key: str) -> Optional[str]:
+    """The part's path in the local part cache, or None if it is not there."""
+    path = get_cached_part_path(bucket_name, key)
+    try:
+        # The modification time orders parts for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def prune_part_cache(max_bytes: int = PART_CACHE_MAX_BYTES) -> None:
+    """Delete the least recently used cached parts beyond ``max_bytes``."""
+    files = []
+    for directory, _, names in os.walk(PART_CACHE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cache_part(
+    s3_handler,
+    bucket_name: str,
+    key: str,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Download a part into the local part cache unless it is there already.
+
+    Returns the number of bytes downloaded. Sessions asking for the same part
+    at the same time share one download.
+    """
+    path = get_cached_part_path(bucket_name, key)
+    with _cache_lock:
+        part_lock = _part_locks.setdefault(path, threading.Lock())
+    try:
+        with part_lock:
+            if get_cached_part(bucket_name, key) is not None:
+                return 0
+            # Downloaded next to the cache and moved in once complete, so
+            # readers and pruning never see a partial file
+            temp_path = download_object(
+                s3_handler, bucket_name, key, frame_store.SPILL_DIR, on_chunk
+            )
+            size = os.path.getsize(temp_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    finally:
+        with _cache_lock:
+            _part_locks.pop(path, None)
+    prune_part_cache()
+    return size
+
+
+def read_mapped_part(s3_handler, bucket_name: str, key: str) -> pa.Table:
+    path = get_cached_part(bucket_name, key)
+    temporary = path is None
+    if temporary:
+        with telemetry.span(telemetry.S3_FETCH) as fetch_span:
+            path = download_object(s3_handler, bucket_name, key, frame_store.SPILL_DIR)
+            fetch_span["bytes"] = os.path.getsize(path)
+    try:
+        with telemetry.span(telemetry.DECODE) as decode_span:
+            table = pq.read_table(path, memory_map=True)
+            decode_span["rows"] = table.num_rows
+    finally:
+        if temporary:
+            os.remove(path)
+    return table
+
+
+def load_mapped_snapshot(
+    s3_handler, bucket_name: str, snapshot: Snapshot
+) -> pd.DataFrame:
+    tables = [read_mapped_part(s3_handler, bucket_name, key) for key in snapshot.keys]
+    table = frame_store.encode_categories(
+        pa.concat_tables(tables, promote_options="permissive")
+    )
+    # The table must hold the only reference for self_destruct to free each
+    # column's Arrow buffers as soon as it is converted
+    del tables
+    with telemetry.span(telemetry.DECODE, rows=table.num_rows):
+        # split_blocks leaves numeric columns as views of the Arrow buffers
+        # instead of copying them into consolidated blocks
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def load_memory_snapshot(
+    s3_handler, bucket_name: str, snapshot: Snapshot
+) -> pd.DataFrame:
+    dfs = []
+    for key in snapshot.keys:
+        with telemetry.span(telemetry.S3_FETCH) as fetch_span:
+            parquet_data = s3_handler.load_parquet_from_s3(bucket_name, key)
+            fetch_span["bytes"] = len(parquet_data)
+        with telemetry.span(telemetry.DECODE) as decode_span:
+            dfs.append(pd.read_parquet(io.BytesIO(parquet_data)))
+            decode_span["rows"] = len(dfs[-1])
+    return pd.concat(dfs, ignore_index=True)
+
+
+@profiler.timed("load_snapshot")
+def load_snapshot(s3_handler, bucket_name: str, snapshot: Snapshot) -> pd.DataFrame:
+    if not snapshot.keys:
+        return pd.DataFrame()
+    if LOAD_MODE == MEMORY:
+        df = load_memory_snapshot(s3_handler, bucket_name, snapshot)
+    else:
+        df = load_mapped_snapshot(s3_handler, bucket_name, snapshot)
+    return frame_store.optimize_dtypes(df)
@@ -0,0 +1,263 @@
+"""Rewrite a snapshot's small parquet parts into a few large, sorted files.
+
+The parts of ``<prefix><timestamp>/`` are read, sorted by supplier, store and
+the table's key and written to ``compacted/<prefix><timestamp>/`` as files of
+up to ``ROWS_PER_FILE`` rows, in row groups of ``ROW_GROUP_ROWS`` rows with
+dictionary encoding for repetitive columns, column statistics and a page
+index. Sorting keeps each supplier's rows in a handful of row groups, so the
+min/max statistics let filtered readers skip the rest.
+
+A point-lookup index of the key columns is written alongside (see
+``point_index``). A manifest (``_manifest.json``) describing every file, row
+group and index is written last; the catalog only switches to the compacted
+files once it exists. Nothing is written inside the snapshot folder, so readers
+that list it, such as the backend Lambdas, still see only the original parts,
+which are left in place.
+"""
+
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import point_index
+import profiler
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import snapshot_catalog
+import telemetry
+
+ROWS_PER_FILE = 2_000_000
+# Small enough that a point lookup decodes little more than it needs, large
+# enough that full reads are not slowed down by per-row-group overhead
+ROW_GROUP_ROWS = 32 * 1024
+DATA_PAGE_BYTES = 1024 * 1024
+COMPRESSION = "zstd"
+# Columns with more than this share of distinct values are written plain
+MAX_DICTIONARY_RATIO = 0.5
+
+SORT_COLUMNS = ("supplier", "ebay_store")
+KEY_COLUMNS = ("item_id", "custom_label", "part_number")
+
+# Table prefix and snapshot timestamp length of each compactable dataset
+DATASETS = {
+    "store": ("store/", None),
+    "supplier_stock": ("supplier_stock/", None),
+    "ebay/table": ("ebay/table/", 19),
+}
+
+
+class AlreadyCompactedError(Exception):
+    pass
+
+
+def get_source_keys(
+    s3_handler, bucket_name: str, prefix: str, timestamp: str
+) -> List[Dict[str, Any]]:
+    """The snapshot's original parquet parts, bypassing the listing cache."""
+    return [
+        obj
+        for obj in snapshot_catalog.iterate_objects(
+            s3_handler.s3_client, bucket_name, f"{prefix}{timestamp}/"
+        )
+        if obj["Key"].endswith(".parquet")
+        and not snapshot_catalog.is_hidden_key(prefix, obj["Key"])
+    ]
+
+
+def get_sort_keys(table: pa.Table) -> List[tuple]:
+    key_column = next((c for c in KEY_COLUMNS if c in table.column_names), None)
+    columns = [c for c in SORT_COLUMNS if c in table.column_names]
+    if key_column is not None:
+        columns.append(key_column)
+    return [(column, "ascending") for column in columns]
+
+
+def get_dictionary_columns(table: pa.Table) -> List[str]:
+    columns = []
+    for name in table.column_names:
+        column = table[name]
+        if not (
+            pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+        ):
+            continue
+        distinct = pc.count_distinct(column).as_py()
+        if distinct <= MAX_DICTIONARY_RATIO * len(column):
+            columns.append(name)
+    return columns
+
+
+def to_json_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def describe_row_groups(metadata: pq.FileMetaData) -> List[Dict[str, Any]]:
+    """Byte range and min/max of the sort and key columns of each row group."""
+    row_groups = []
+    for index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(index)
+        statistics = {}
+        for column_index in range(row_group.num_columns):
+            column = row_group.column(column_index)
+            stats = column.statistics
+            if column.path_in_schema in SORT_COLUMNS + KEY_COLUMNS and (
+                stats and stats.has_min_max
+            ):
+                statistics[column.path_in_schema] = {
+                    "min": to_json_value(stats.min),
+                    "max": to_json_value(stats.max),
+                }
+        offset, length = point_index.get_row_group_range(metadata, index)
+        row_groups.append(
+            {
+                "rows": row_group.num_rows,
+                "offset": offset,
+                "length": length,
+                "statistics": statistics,
+            }
+        )
+    return row_groups
+
+
+def write_parquet_file(
+    table: pa.Table, dictionary_columns: List[str], row_group_rows: int
+) -> bytes:
+    sink = io.BytesIO()
+    with pq.ParquetWriter(
+        sink,
+        table.schema,
+        compression=COMPRESSION,
+        use_dictionary=dictionary_columns,
+        write_statistics=True,
+        write_page_index=True,
+        data_page_size=DATA_PAGE_BYTES,
+    ) as writer:
+        writer.write_table(table, row_group_size=row_group_rows)
+    return sink.getvalue()
+
+
+@profiler.timed("compact_snapshot")
+def compact_snapshot(
+    s3_handler,
+    bucket_name: str,
+    prefix: str,
+    timestamp: str,
+    rows_per_file: int = ROWS_PER_FILE,
+    row_group_rows: int = ROW_GROUP_ROWS,
+) -> Dict[str, Any]:
+    """Compact one snapshot and return its manifest.
+
+    Raises ``AlreadyCompactedError`` if the snapshot has a manifest already
+    and ``ValueError`` if it has no parquet parts.
+    """
+    if (
+        snapshot_catalog.read_manifest(s3_handler, bucket_name, prefix, timestamp)
+        is not None
+    ):
+        raise AlreadyCompactedError(f"{prefix}{timestamp} is already compacted.")
+    sources = get_source_keys(s3_handler, bucket_name, prefix, timestamp)
+    if not sources:
+        raise ValueError(f"No parquet files found under {prefix}{timestamp}/.")
+
+    tables = [
+        snapshot_catalog.read_mapped_part(s3_handler, bucket_name, source["Key"])
+        for source in sources
+    ]
+
+    with telemetry.span(telemetry.TRANSFORM) as transform_span:
+        table = pa.concat_tables(tables, promote_options="permissive")
+        sort_keys = get_sort_keys(table)
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+        dictionary_columns = get_dictionary_columns(table)
+        transform_span["rows"] = table.num_rows
+
+    compacted_prefix = snapshot_catalog.get_compacted_prefix(prefix, timestamp)
+    files = []
+    for part, start in enumerate(range(0, max(table.num_rows, 1), rows_per_file)):
+        chunk = table.slice(start, rows_per_file)
+        with telemetry.span(telemetry.EXPORT, rows=chunk.num_rows) as export_span:
+            parquet_data = write_parquet_file(chunk, dictionary_columns, row_group_rows)
+            export_span["bytes"] = len(parquet_data)
+        key = f"{compacted_prefix}part-{part:05d}.parquet"
+        with telemetry.span(telemetry.S3_UPLOAD, bytes=len(parquet_data)):
+            s3_handler.s3_client.put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=parquet_data,
+                ContentType="application/vnd.apache.parquet",
+            )
+        metadata = pq.ParquetFile(io.BytesIO(parquet_data)).metadata
+        files.append(
+            {
+                "key": key,
+                "rows": chunk.num_rows,
+                "size": len(parquet_data),
+                "row_groups": describe_row_groups(metadata),
+            }
+        )
+
+    # Written before the manifest, which makes the compaction visible
+    index = point_index.build_index(
+        s3_handler, bucket_name, prefix, timestamp, table, files
+    )
+
+    manifest = {
+        "prefix": prefix,
+        "timestamp": timestamp,
+        "compacted_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": table.num_rows,
+        "columns": table.column_names,
+        "sort_by": [column for column, _ in sort_keys],
+        "dictionary_columns": dictionary_columns,
+        "source_keys": [source["Key"] for source in sources],
+        "source_size": sum(source.get("Size", 0) for source in sources),
+        "size": sum(file["size"] for file in files),
+        "files": files,
+        "index": index,
+    }
+    s3_handler.s3_client.put_object(
+        Bucket=bucket_name,
+        Key=snapshot_catalog.get_manifest_key(prefix, timestamp),
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+    # Only move the pointer if it names this snapshot; a newer one may exist
+    pointer = snapshot_catalog.read_pointer(s3_handler, bucket_name, prefix)
+    if pointer is None or pointer.timestamp == timestamp:
+        snapshot_catalog.record_snapshot(
+            s3_handler,
+            bucket_name,
+            prefix,
+            timestamp,
+            [file["key"] for file in files],
+            manifest["size"],
+        )
+    else:
+        snapshot_catalog.invalidate(bucket_name, prefix)
+    return manifest
+
+
+def compact_dataset(
+    s3_handler,
+    bucket_name: str,
+    dataset: str,
+    timestamp: Optional[str] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """Compact ``timestamp`` of a dataset in ``DATASETS``, by default its latest."""
+    prefix, timestamp_length = DATASETS[dataset]
+    if timestamp is None:
+        snapshot = snapshot_catalog.resolve_latest_snapshot(
+            s3_handler, bucket_name, prefix, timestamp_length=timestamp_length
+        )
+        if snapshot is None:
+            raise ValueError(f"No snapshots found under {prefix}.")
+        timestamp = snapshot.timestamp
+    return compact_snapshot(s3_handler, bucket_name, prefix, timestamp, **kwargs)
@@ -0,0 +1,179 @@
+"""Background warm-up of the hot snapshots after login.
+
+A ``Prefetch`` resolves the latest ``store``, ``supplier_stock`` and
+``ebay/table`` snapshots and downloads their parts into the local part cache
+(``snapshot_catalog.PART_CACHE_DIR``), so the first "ALL" query or export
+reads them from disk instead of S3. The Table Viewer tables are also decoded
+into the session's ``FrameStore``, as a first query would. Downloads from
+every session share ``MAX_CONCURRENT_DOWNLOADS`` slots and a
+``MAX_BYTES_PER_SECOND`` budget, so a burst of logins cannot crowd out the
+requests users are waiting for. A prefetch can be cancelled at any point
+between chunks.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+import frame_store
+import snapshot_catalog
+import snapshot_compaction
+import table_query
+from aws_utils import s3
+
+ENABLED = os.environ.get("RTG_PREFETCH", "1").lower() not in ("0", "false", "no")
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("RTG_PREFETCH_CONCURRENCY", "2"))
+# 0 leaves the bandwidth uncapped
+MAX_BYTES_PER_SECOND = int(float(os.environ.get("RTG_PREFETCH_MBPS", "0")) * 1024**2)
+SLOT_POLL_SECONDS = 0.5
+
+DATASETS = ("store", "supplier_stock", "ebay/table")
+# Loaded into the session's FrameStore as well as the part cache
+TABLE_VIEWER_TABLES = ("store", "supplier_stock")
+
+PENDING = "pending"
+DOWNLOADING = "downloading"
+LOADING = "loading"
+WARM = "warm"
+MISSING = "missing"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (WARM, MISSING, FAILED, CANCELLED)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Throttle:
+    """Download slots and a byte budget shared by every session's prefetch."""
+
+    def __init__(self, slots: int, bytes_per_second: int) -> None:
+        self.bytes_per_second = bytes_per_second
+        self._slots = threading.Semaphore(slots)
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    @contextmanager
+    def slot(self, cancelled: threading.Event) -> Iterator[None]:
+        while not self._slots.acquire(timeout=SLOT_POLL_SECONDS):
+            if cancelled.is_set():
+                raise Cancelled()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def consume(self, size: int) -> None:
+        """Wait until ``size`` more bytes fit within the budget."""
+        if not self.bytes_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next_time = max(now, self._next_time) + size / self.bytes_per_second
+            wait = self._next_time - now
+        time.sleep(wait)
+
+
+throttle = Throttle(MAX_CONCURRENT_DOWNLOADS, MAX_BYTES_PER_SECOND)
+
+
+@dataclass
+class DatasetStatus:
+    state: str = PENDING
+    parts: int = 0
+    parts_done: int = 0
+    bytes: int = 0
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.state == DOWNLOADING:
+            return f"downloading part {self.parts_done + 1} of {self.parts}"
+        if self.state == FAILED:
+            return f"failed: {self.error}"
+        return self.state
+
+
+class Prefetch:
+    def __init__(
+        self, bucket_name: str, frames: Optional[frame_store.FrameStore] = None
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.frames = frames
+        self.statuses: Dict[str, DatasetStatus] = {
+            dataset: DatasetStatus() for dataset in DATASETS
+        }
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self.run, name="rtg-prefetch", daemon=True
+        )
+
+    @property
+    def finished(self) -> bool:
+        return all(status.state in FINISHED_STATES for status in self.statuses.values())
+
+    def start(self) -> "Prefetch":
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check_cancelled(self, size: int = 0) -> None:
+        if self._cancelled.is_set():
+            raise Cancelled()
+        throttle.consume(size)
+
+    def run(self) -> None:
+        s3_handler = s3.S3Handler()
+        for dataset, status in self.statuses.items():
+            try:
+                self.check_cancelled()
+                self.warm(s3_handler, dataset, status)
+            except Cancelled:
+                status.state = CANCELLED
+            except Exception as e:
+                status.state, status.error = FAILED, str(e)
+
+    def warm(self, s3_handler, dataset: str, status: DatasetStatus) -> None:
+        prefix, timestamp_length = snapshot_compaction.DATASETS[dataset]
+        snapshot = snapshot_catalog.resolve_latest_snapshot(
+            s3_handler, self.bucket_name, prefix, timestamp_length=timestamp_length
+        )
+        if snapshot is None:
+            status.state = MISSING
+            return
+
+        status.state, status.parts = DOWNLOADING, len(snapshot.keys)
+        for key in snapshot.keys:
+            with throttle.slot(self._cancelled):
+                status.bytes += snapshot_catalog.cache_part(
+                    s3_handler, self.bucket_name, key, self.check_cancelled
+                )
+            status.parts_done += 1
+
+        frame_name = table_query.get_frame_name(snapshot)
+        if (
+            dataset in TABLE_VIEWER_TABLES
+            and self.frames is not None
+            and frame_name not in self.frames
+        ):
+            self.check_cancelled()
+            status.state = LOADING
+            self.frames.put(
+                frame_name,
+                snapshot_catalog.load_snapshot(s3_handler, self.bucket_name, snapshot),
+            )
+        status.state = WARM
+
+
+def start(
+    bucket_name: str, frames: Optional[frame_store.FrameStore] = None
+) -> Optional[Prefetch]:
+    """Start warming the hot snapshots, or return None if prefetch is disabled."""
+    if not ENABLED:
+        return None
+    return Prefetch(bucket_name, frames).start()
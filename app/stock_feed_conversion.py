@@ -0,0 +1,120 @@
+"""Convert supplier stock feed workbooks to compact Parquet before upload.
+
+Workbooks are read in openpyxl's streaming read-only mode. When the stock feed
+config has an entry for the supplier (matched on the file name, e.g.
+``APE_stock.xlsx`` -> ``APE``), only the columns that entry refers to are
+kept; otherwise every column is kept.
+"""
+
+import io
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import openpyxl
+import pandas as pd
+
+STOCK_FEED_CONFIG_KEY = "config/process_stock_feed_config.json"
+SHEET_COLUMN = "sheet_name"
+
+
+@dataclass
+class ConversionResult:
+    file_name: str
+    parquet_data: bytes
+    parse_seconds: float
+    original_size: int
+    rows: int
+    columns: List[str]
+
+    @property
+    def parquet_size(self) -> int:
+        return len(self.parquet_data)
+
+    @property
+    def size_reduction(self) -> float:
+        return 1 - self.parquet_size / self.original_size if self.original_size else 0
+
+
+def read_workbook(data: bytes) -> Dict[str, pd.DataFrame]:
+    """Read every sheet, taking the first non-empty row as the header."""
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    sheets = {}
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(
+                (row for row in rows if any(value is not None for value in row)), None
+            )
+            if header is None:
+                continue
+            columns = [
+                str(value).strip() if value is not None else f"column_{index}"
+                for index, value in enumerate(header)
+            ]
+            sheets[worksheet.title] = pd.DataFrame(
+                [row for row in rows if any(value is not None for value in row)],
+                columns=columns,
+            )
+    finally:
+        workbook.close()
+    return sheets
+
+
+def get_supplier_code(file_name: str, config: Dict[str, Any]) -> Optional[str]:
+    tokens = re.split(r"[^A-Za-z0-9]+", file_name.rsplit(".", 1)[0].upper())
+    return next((token for token in tokens if token in config), None)
+
+
+def get_config_strings(entry: Any) -> Set[str]:
+    if isinstance(entry, str):
+        return {entry.strip()}
+    if isinstance(entry, dict):
+        entry = list(entry.values())
+    if isinstance(entry, list):
+        return set().union(*(get_config_strings(item) for item in entry))
+    return set()
+
+
+def normalize_sheets(
+    sheets: Dict[str, pd.DataFrame], config_entry: Optional[Any]
+) -> pd.DataFrame:
+    config_columns = get_config_strings(config_entry) if config_entry else set()
+    frames = []
+    for sheet_name, df in sheets.items():
+        needed_columns = [column for column in df.columns if column in config_columns]
+        if needed_columns:
+            df = df[needed_columns]
+        frames.append(df.assign(**{SHEET_COLUMN: sheet_name}))
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    # Cells of one column can mix numbers and text, which Parquet cannot store
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].map(lambda value: None if value is None else str(value))
+    return df
+
+
+def convert_to_parquet(
+    file_name: str, data: bytes, config: Dict[str, Any]
+) -> ConversionResult:
+    start = time.perf_counter()
+    supplier_code = get_supplier_code(file_name, config)
+    df = normalize_sheets(
+        read_workbook(data), config.get(supplier_code) if supplier_code else None
+    )
+    parquet_data = df.to_parquet(index=False, compression="zstd")
+    return ConversionResult(
+        file_name=file_name,
+        parquet_data=parquet_data,
+        parse_seconds=time.perf_counter() - start,
+        original_size=len(data),
+        rows=len(df),
+        columns=list(df.columns),
+    )
+
+
+def get_parquet_file_name(file_name: str) -> str:
+    return file_name.rsplit(".", 1)[0] + ".parquet"
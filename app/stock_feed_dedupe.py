@@ -0,0 +1,194 @@
+"""Content-hash index of uploaded stock feeds.
+
+Every workbook the backend has processed is recorded under its SHA-256 in
+``INDEX_KEY`` together with a hash of each sheet's cell values; workbooks are
+recorded only once their result message has arrived, so a failed upload can
+be retried. Before an upload the workbook is checked against the index:
+
+- the same bytes were processed before: an exact duplicate, which may be
+  skipped;
+- the bytes differ but every sheet's values were seen before (the workbook was
+  re-saved, or the supplier sent the same stock for a new date): a content
+  duplicate, which is only warned about;
+- otherwise the upload goes ahead, noting any sheets that are unchanged since
+  an earlier upload.
+
+The index is a JSON document saved through ``config_store``, so concurrent
+uploads merge their entries instead of overwriting each other. Entries older
+than ``RETENTION_DAYS`` are dropped when it is saved.
+"""
+
+import hashlib
+import io
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import config_store
+import openpyxl
+from botocore.exceptions import ClientError
+
+INDEX_KEY = "config/stock_feed_index.json"
+RETENTION_DAYS = 90
+SAVE_ATTEMPTS = 3
+
+SKIP = "skip"
+WARN = "warn"
+DUPLICATE_ACTIONS = [SKIP, WARN]
+
+EXACT = "exact"
+CONTENT = "content"
+
+
+@dataclass
+class FeedCheck:
+    file_name: str
+    file_hash: str
+    sheet_hashes: Dict[str, str] = field(default_factory=dict)
+    # "exact" or "content" when the workbook was uploaded before
+    duplicate: Optional[str] = None
+    previous: Optional[Dict[str, Any]] = None
+    # Sheet name to the earlier upload holding the same values
+    unchanged_sheets: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        previous = self.previous or {}
+        if self.duplicate == EXACT:
+            reason = "is identical to"
+        elif self.duplicate == CONTENT:
+            reason = "has the same sheets as"
+        else:
+            return (
+                f"{self.file_name}: {len(self.unchanged_sheets)} of "
+                f"{len(self.sheet_hashes)} sheets unchanged since an earlier upload"
+            )
+        return (
+            f"{self.file_name} {reason} {previous.get('file_name')} uploaded "
+            f"for {previous.get('date')} at {previous.get('uploaded_at')}"
+        )
+
+
+def hash_file(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_sheets(data: bytes) -> Dict[str, str]:
+    """SHA-256 of each sheet's cell values, independent of workbook metadata."""
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    hashes = {}
+    try:
+        for worksheet in workbook.worksheets:
+            digest = hashlib.sha256()
+            for row in worksheet.iter_rows(values_only=True):
+                # Trailing empty cells depend on the sheet's recorded dimensions
+                values = list(row)
+                while values and values[-1] is None:
+                    values.pop()
+                if values:
+                    digest.update(repr(values).encode("utf-8"))
+                    digest.update(b"\n")
+            hashes[worksheet.title] = digest.hexdigest()
+    finally:
+        workbook.close()
+    return hashes
+
+
+def empty_index() -> Dict[str, Any]:
+    return {"files": {}, "sheets": {}}
+
+
+def load_index(s3_handler, bucket_name: str) -> config_store.ConfigDocument:
+    try:
+        return config_store.load_config(s3_handler, bucket_name, INDEX_KEY, force=True)
+    except ClientError as e:
+        if config_store.get_error_status(e) != 404:
+            raise
+        return config_store.ConfigDocument(empty_index(), None)
+
+
+def check_feed(index: Dict[str, Any], file_name: str, data: bytes) -> FeedCheck:
+    check = FeedCheck(file_name, hash_file(data))
+    previous = index["files"].get(check.file_hash)
+    if previous is not None:
+        check.duplicate, check.previous = EXACT, previous
+        check.sheet_hashes = previous["sheets"]
+        return check
+
+    try:
+        check.sheet_hashes = hash_sheets(data)
+    except Exception:
+        # Left to the backend to report; the file hash is still recorded
+        return check
+    for sheet_name, sheet_hash in check.sheet_hashes.items():
+        if sheet_hash in index["sheets"]:
+            check.unchanged_sheets[sheet_name] = index["sheets"][sheet_hash]
+    if check.sheet_hashes and len(check.unchanged_sheets) == len(check.sheet_hashes):
+        # Re-saved workbooks have new bytes but the same sheets
+        file_hashes = {entry["file_hash"] for entry in check.unchanged_sheets.values()}
+        if len(file_hashes) == 1:
+            check.duplicate = CONTENT
+            check.previous = index["files"].get(file_hashes.pop())
+    return check
+
+
+def add_feed(
+    index: Dict[str, Any], check: FeedCheck, date: str, key: Optional[str]
+) -> None:
+    entry = {
+        "file_name": check.file_name,
+        "date": date,
+        "key": key,
+        "uploaded_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        "sheets": check.sheet_hashes,
+    }
+    index["files"][check.file_hash] = entry
+    for sheet_name, sheet_hash in check.sheet_hashes.items():
+        index["sheets"][sheet_hash] = {
+            "file_hash": check.file_hash,
+            "file_name": check.file_name,
+            "sheet": sheet_name,
+            "date": date,
+        }
+
+
+def prune_index(index: Dict[str, Any]) -> Dict[str, Any]:
+    cutoff = (datetime.now() - timedelta(days=RETENTION_DAYS)).strftime(
+        "%Y-%m-%dT%H:%M:%S"
+    )
+    files = {
+        file_hash: entry
+        for file_hash, entry in index["files"].items()
+        if entry["uploaded_at"] >= cutoff
+    }
+    sheets = {
+        sheet_hash: entry
+        for sheet_hash, entry in index["sheets"].items()
+        if entry["file_hash"] in files
+    }
+    return {"files": files, "sheets": sheets}
+
+
+def record_feeds(s3_handler, bucket_name: str, entries: List[Dict[str, Any]]) -> None:
+    """Add ``{"check", "date", "key"}`` entries to the index in S3.
+
+    The entries are reapplied to the latest index if someone else saved it in
+    the meantime.
+    """
+    if not entries:
+        return
+    for attempt in range(SAVE_ATTEMPTS):
+        document = load_index(s3_handler, bucket_name)
+        index = {
+            "files": dict(document.data.get("files", {})),
+            "sheets": dict(document.data.get("sheets", {})),
+        }
+        for entry in entries:
+            add_feed(index, entry["check"], entry["date"], entry["key"])
+        try:
+            config_store.save_config(
+                s3_handler, bucket_name, INDEX_KEY, prune_index(index), document.etag
+            )
+            return
+        except config_store.ConcurrentEditError:
+            if attempt == SAVE_ATTEMPTS - 1:
+                raise
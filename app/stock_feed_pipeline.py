@@ -0,0 +1,238 @@
+"""Stock feed upload and processing, independent of the Streamlit UI.
+
+Supplier workbooks are uploaded under ``stock_feed/year=/month=/day=/``; the
+backend Lambda processes each one (about a minute per file) and reports the
+outcome on the SQS queue. Progress is reported through a
+``progress(fraction, message)`` callback. Workbooks processed before (see
+``stock_feed_dedupe``) are skipped or uploaded with a warning.
+"""
+
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import config_store
+import stock_feed_conversion
+import stock_feed_dedupe
+import telemetry
+from aws_utils import s3, sqs
+
+SQS_QUEUE_URL = "rtg-automotive-lambda-queue"
+SECONDS_PER_FILE = 60
+FAILURE_WORDS = ("error", "failed", "exception")
+
+XLSX = "xlsx"
+XLSX_AND_PARQUET = "xlsx+parquet"
+PARQUET = "parquet"
+UPLOAD_FORMATS = [XLSX, XLSX_AND_PARQUET, PARQUET]
+
+ProgressCallback = Callable[[float, str], None]
+
+
+def no_progress(fraction: float, message: str) -> None:
+    pass
+
+
+def get_stock_feed_key(date: str, file_name: str) -> str:
+    year, month, day = date.split("-")
+    return (
+        f"stock_feed/year={year}/month={month}/day={day}/{file_name.replace(' ','_')}"
+    )
+
+
+def upload_stock_feed(
+    s3_handler, bucket_name: str, date: str, file_name: str, data: bytes
+) -> str:
+    file_path = get_stock_feed_key(date, file_name)
+    with telemetry.span(telemetry.S3_UPLOAD, bytes=len(data)):
+        s3_handler.upload_excel_to_s3(bucket_name, file_path, data)
+    return file_path
+
+
+def convert_stock_feed(
+    file_name: str, data: bytes, config: Dict[str, Any]
+) -> stock_feed_conversion.ConversionResult:
+    with telemetry.span(telemetry.TRANSFORM) as transform_span:
+        result = stock_feed_conversion.convert_to_parquet(file_name, data, config)
+        transform_span["rows"] = result.rows
+    return result
+
+
+def upload_converted_stock_feed(
+    s3_handler,
+    bucket_name: str,
+    date: str,
+    result: stock_feed_conversion.ConversionResult,
+) -> str:
+    file_path = get_stock_feed_key(
+        date, stock_feed_conversion.get_parquet_file_name(result.file_name)
+    )
+    with telemetry.span(telemetry.S3_UPLOAD, bytes=result.parquet_size):
+        s3_handler.upload_parquet_to_s3(bucket_name, file_path, result.parquet_data)
+    return file_path
+
+
+def upload_file(
+    s3_handler,
+    bucket_name: str,
+    date: str,
+    file_name: str,
+    data: bytes,
+    upload_format: str,
+    config: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Upload one workbook in ``upload_format``; returns the keys and conversion stats."""
+    upload: Dict[str, Any] = {"file_name": file_name, "keys": []}
+    if upload_format in (XLSX, XLSX_AND_PARQUET):
+        upload["keys"].append(
+            upload_stock_feed(s3_handler, bucket_name, date, file_name, data)
+        )
+    if upload_format in (XLSX_AND_PARQUET, PARQUET):
+        result = convert_stock_feed(file_name, data, config)
+        upload["keys"].append(
+            upload_converted_stock_feed(s3_handler, bucket_name, date, result)
+        )
+        upload["conversion"] = {
+            "parse_seconds": round(result.parse_seconds, 2),
+            "original_size": result.original_size,
+            "parquet_size": result.parquet_size,
+            "size_reduction": round(result.size_reduction, 3),
+            "rows": result.rows,
+        }
+    return upload
+
+
+def wait_for_processing(
+    sqs_handler,
+    sqs_queue_url: str,
+    number_of_files: int,
+    progress: ProgressCallback = no_progress,
+) -> List[str]:
+    wait_seconds = number_of_files * SECONDS_PER_FILE
+    with telemetry.span(telemetry.QUEUE_WAIT):
+        for elapsed in range(wait_seconds):
+            progress(
+                0.1 + 0.85 * elapsed / wait_seconds,
+                f"Waiting for {number_of_files} files to be processed, "
+                "about 1 minute per file",
+            )
+            time.sleep(1)
+        messages = sqs_handler.get_all_sqs_messages(sqs_queue_url)[-number_of_files:]
+    return [message["Body"] for message in messages]
+
+
+def is_processed(file_name: str, messages: List[str]) -> bool:
+    """Whether a result message names the workbook without reporting a failure."""
+    stem = os.path.splitext(file_name)[0].replace(" ", "_").lower()
+    supplier = re.split(r"[^a-z0-9]+", stem)[0]
+    for message in messages:
+        body = message.lower()
+        tokens = re.split(r"[^a-z0-9_]+", body)
+        if (stem in body or supplier in tokens) and not any(
+            word in body for word in FAILURE_WORDS
+        ):
+            return True
+    return False
+
+
+def process_stock_feeds(
+    files: List[Tuple[str, bytes]],
+    bucket_name: str,
+    date: str,
+    logs_handler,
+    progress: ProgressCallback = no_progress,
+    upload_format: str = XLSX,
+    duplicates: str = stock_feed_dedupe.SKIP,
+) -> Dict[str, Any]:
+    """Upload ``(file_name, data)`` workbooks and wait for their results.
+
+    ``duplicates`` is ``stock_feed_dedupe.SKIP`` or ``WARN`` for workbooks
+    identical to one processed before; workbooks with only the same sheet
+    contents are always uploaded with a warning. Workbooks are added to the
+    index once a result message confirms they were processed.
+    """
+    uploaded, errors, skipped, warnings, pending = [], [], [], [], []
+    with telemetry.trace() as upload_trace:
+        s3_handler = s3.S3Handler()
+        sqs_handler = sqs.SQSHandler()
+        sqs_handler.delete_all_sqs_messages(SQS_QUEUE_URL)
+        config = (
+            config_store.load_config(
+                s3_handler, bucket_name, stock_feed_conversion.STOCK_FEED_CONFIG_KEY
+            ).data
+            if upload_format != XLSX
+            else {}
+        )
+        index = stock_feed_dedupe.load_index(s3_handler, bucket_name).data
+        for index_number, (file_name, data) in enumerate(files):
+            progress(0.1 * index_number / len(files), f"Checking {file_name}")
+            try:
+                with telemetry.span(telemetry.TRANSFORM):
+                    check = stock_feed_dedupe.check_feed(index, file_name, data)
+                if (
+                    check.duplicate == stock_feed_dedupe.EXACT
+                    and duplicates == stock_feed_dedupe.SKIP
+                ):
+                    skipped.append(f"Skipped: {check.describe()}")
+                    continue
+                if check.duplicate or check.unchanged_sheets:
+                    warnings.append(check.describe())
+
+                progress(0.1 * index_number / len(files), f"Uploading {file_name}")
+                upload = upload_file(
+                    s3_handler,
+                    bucket_name,
+                    date,
+                    file_name,
+                    data,
+                    upload_format,
+                    config,
+                )
+                uploaded.append(upload)
+                # Catches the same workbook twice in one batch; the index
+                # in S3 is only updated once it has been processed
+                stock_feed_dedupe.add_feed(index, check, date, upload["keys"][0])
+                pending.append({"check": check, "date": date, "key": upload["keys"][0]})
+            except Exception as e:
+                errors.append(f"Error uploading file {file_name}: {str(e)}")
+
+        # Every uploaded object is processed and reported on separately, so
+        # "xlsx+parquet" waits for two results per workbook
+        number_of_keys = sum(len(upload["keys"]) for upload in uploaded)
+        messages = (
+            wait_for_processing(sqs_handler, SQS_QUEUE_URL, number_of_keys, progress)
+            if uploaded
+            else []
+        )
+
+        try:
+            stock_feed_dedupe.record_feeds(
+                s3_handler,
+                bucket_name,
+                [
+                    entry
+                    for entry in pending
+                    if is_processed(entry["check"].file_name, messages)
+                ],
+            )
+        except Exception as e:
+            errors.append(f"Error updating the stock feed index: {str(e)}")
+
+    logs_handler.log_action(
+        bucket_name,
+        "frontend",
+        telemetry.format_action(
+            f"STOCK_FEEDS_UPLOADED | number_of_files={len(uploaded)} "
+            f"| skipped_duplicates={len(skipped)}",
+            upload_trace,
+        ),
+        "admin",
+    )
+    return {
+        "uploaded": uploaded,
+        "errors": errors,
+        "skipped": skipped,
+        "warnings": warnings,
+        "messages": messages,
+    }
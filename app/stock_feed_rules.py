@@ -0,0 +1,116 @@
+"""Vectorized versions of the stock feed config rule functions.
+
+Used to dry-run a stock feed config locally: the configured rule for a
+supplier is applied to a sample file so the resulting quantities can be
+checked without uploading a feed and waiting for the processing Lambda.
+"""
+
+import io
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import stock_feed_conversion
+
+RULE_DESCRIPTIONS: Dict[str, str] = {
+    "set_value_to_10_if_labelled_yes": "Returns 10 if 'yes' is found in the input string, otherwise returns 0.",
+    "get_value_if_less_than_10_else_0": "Returns the input value if it's less than or equal to 10, otherwise returns 0.",
+    "set_value_to_10_if_labelled_in_stock": "Returns 10 if the input is 'in stock', otherwise returns 0.",
+    "set_value_to_10_if_product_in_list": "Always returns 10 regardless of input.",
+}
+
+
+def set_value_to_10_if_labelled_yes(values: pd.Series) -> pd.Series:
+    labelled_yes = values.astype(str).str.contains("yes", case=False, regex=False)
+    return labelled_yes.astype(int) * 10
+
+
+def get_value_if_less_than_10_else_0(values: pd.Series) -> pd.Series:
+    numbers = pd.to_numeric(values, errors="coerce").fillna(0)
+    return numbers.where(numbers <= 10, 0).astype(int)
+
+
+def set_value_to_10_if_labelled_in_stock(values: pd.Series) -> pd.Series:
+    in_stock = values.astype(str).str.strip().str.lower() == "in stock"
+    return in_stock.astype(int) * 10
+
+
+def set_value_to_10_if_product_in_list(values: pd.Series) -> pd.Series:
+    return pd.Series(10, index=values.index)
+
+
+RULES: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "set_value_to_10_if_labelled_yes": set_value_to_10_if_labelled_yes,
+    "get_value_if_less_than_10_else_0": get_value_if_less_than_10_else_0,
+    "set_value_to_10_if_labelled_in_stock": set_value_to_10_if_labelled_in_stock,
+    "set_value_to_10_if_product_in_list": set_value_to_10_if_product_in_list,
+}
+
+
+def get_configured_rules(config_entry: Any) -> List[str]:
+    config_strings = stock_feed_conversion.get_config_strings(config_entry)
+    return [rule for rule in RULES if rule in config_strings]
+
+
+def guess_columns(
+    config_entry: Any, columns: List[str]
+) -> Tuple[Optional[str], Optional[str]]:
+    """Guess the (code column, stock column) a config entry refers to.
+
+    Entry keys mentioning stock/quantity or code/part point at the stock and
+    code columns; otherwise the first two referenced columns are used.
+    """
+    code_column, stock_column = None, None
+    if isinstance(config_entry, dict):
+        for key, value in config_entry.items():
+            if not isinstance(value, str) or value not in columns:
+                continue
+            if stock_column is None and any(
+                word in key.lower() for word in ("stock", "quantity", "qty")
+            ):
+                stock_column = value
+            elif code_column is None and any(
+                word in key.lower() for word in ("code", "part", "sku")
+            ):
+                code_column = value
+    referenced_columns = [
+        column
+        for column in columns
+        if column in stock_feed_conversion.get_config_strings(config_entry)
+    ]
+    remaining_columns = [
+        column
+        for column in referenced_columns
+        if column not in (code_column, stock_column)
+    ]
+    if code_column is None and remaining_columns:
+        code_column = remaining_columns.pop(0)
+    if stock_column is None and remaining_columns:
+        stock_column = remaining_columns.pop(0)
+    return code_column, stock_column
+
+
+def preview_rules(
+    df: pd.DataFrame, code_column: str, stock_column: str, rules: List[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Apply each rule to the stock column; returns (results, timings)."""
+    results = pd.DataFrame({"code": df[code_column], "stock_value": df[stock_column]})
+    timings = []
+    for rule in rules:
+        start = time.perf_counter()
+        results[rule] = RULES[rule](df[stock_column])
+        timings.append(
+            {
+                "rule": rule,
+                "rows": len(df),
+                "duration_ms": (time.perf_counter() - start) * 1000,
+            }
+        )
+    return results, pd.DataFrame(timings, columns=["rule", "rows", "duration_ms"])
+
+
+def read_sample_file(file_name: str, data: bytes) -> pd.DataFrame:
+    if file_name.lower().endswith(".csv"):
+        return pd.read_csv(io.BytesIO(data))
+    sheets = stock_feed_conversion.read_workbook(data)
+    return stock_feed_conversion.normalize_sheets(sheets, None)
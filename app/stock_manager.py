@@ -1,81 +1,148 @@
-import io
-import time
-import zipfile
-from datetime import datetime
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
+import job_status
+import jobs
 import pandas as pd
+import profiler
+import stock_feed_dedupe
+import stock_feed_pipeline
 import streamlit as st
-from aws_utils import iam, s3, sqs
+from aws_utils import iam, logs
 from utils import PROJECT_BUCKET_NAME
 
+JOB_KIND = "stock_feed_processing"
 
-def upload_file_to_s3(
-    file: io.BytesIO, bucket_name: str, date: str, s3_handler: s3.S3Handler
-) -> None:
-    year = date.split("-")[0]
-    month = date.split("-")[1]
-    day = date.split("-")[2]
-    file_path = (
-        f"stock_feed/year={year}/month={month}/day={day}/{file.name.replace(' ','_')}"
+
+UPLOAD_FORMAT_LABELS = {
+    stock_feed_pipeline.XLSX: "Excel only",
+    stock_feed_pipeline.XLSX_AND_PARQUET: "Excel and Parquet",
+    stock_feed_pipeline.PARQUET: "Parquet only",
+}
+
+DUPLICATE_ACTION_LABELS = {
+    stock_feed_dedupe.SKIP: "Skip",
+    stock_feed_dedupe.WARN: "Upload anyway",
+}
+
+
+def run_processing_job(
+    context: jobs.JobContext,
+    files: List[Tuple[str, bytes]],
+    date: str,
+    upload_format: str,
+    duplicates: str,
+) -> Dict[str, Any]:
+    return stock_feed_pipeline.process_stock_feeds(
+        files,
+        PROJECT_BUCKET_NAME,
+        date,
+        logs.LogsHandler(),
+        context.update,
+        upload_format,
+        duplicates,
     )
-    try:
-        s3_handler.upload_excel_to_s3(bucket_name, file_path, file.getvalue())
-    except Exception as e:
-        st.error(f"Error uploading file: {str(e)}")
+
+
+def select_upload_format() -> str:
+    return st.radio(
+        "Upload format",
+        options=stock_feed_pipeline.UPLOAD_FORMATS,
+        format_func=UPLOAD_FORMAT_LABELS.get,
+        horizontal=True,
+        help="Parquet files are converted in the app and hold only the columns "
+        "the stock feed config uses for the supplier. With Excel and Parquet "
+        "both files are processed, so processing takes about a minute per "
+        "uploaded file, two per workbook.",
+    )
+
+
+def select_duplicate_action() -> str:
+    return st.radio(
+        "Previously uploaded files",
+        options=stock_feed_dedupe.DUPLICATE_ACTIONS,
+        format_func=DUPLICATE_ACTION_LABELS.get,
+        horizontal=True,
+        help="Files identical to an earlier upload are skipped unless uploaded "
+        "anyway. Files with the same sheet contents are uploaded with a warning.",
+    )
+
+
+def display_conversions(uploads: List[Dict[str, Any]]) -> None:
+    conversions = [
+        {"file": upload["file_name"], **upload["conversion"]}
+        for upload in uploads
+        if "conversion" in upload
+    ]
+    if conversions:
+        st.write("Parquet conversion:")
+        st.dataframe(pd.DataFrame(conversions), use_container_width=True)
 
 
 def handle_file_uploads(
-    uploaded_files: List[io.BytesIO],
-    bucket_name: str,
-    date: str,
-    s3_handler: s3.S3Handler,
-    sqs_queue_url: str,
+    uploaded_files: List[Any], date: str, upload_format: str, duplicates: str
 ) -> None:
     if uploaded_files:
-        sqs_handler = sqs.SQSHandler()
-        sqs_handler.delete_all_sqs_messages(sqs_queue_url)
-        for uploaded_file in uploaded_files:
-            upload_file_to_s3(uploaded_file, bucket_name, date, s3_handler)
-        st.success("Files uploaded successfully")
-        with st.spinner("Waiting for files to be processed, about 1 minute per file."):
-            start_time = time.time()
-            st.write(f"Processing {len(uploaded_files)} files...")
-            st.write(
-                f"Start time: {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S')}"
+        # Read the files now, the uploader's buffers do not outlive the rerun
+        files = [(file.name, file.getvalue()) for file in uploaded_files]
+        # Jobs that clear and read the SQS queue run one at a time
+        job_id, submitted = jobs.submit_single(
+            stock_feed_pipeline.SQS_QUEUE_URL,
+            JOB_KIND,
+            f"Process {len(files)} stock feed files for {date}",
+            run_processing_job,
+            files,
+            date,
+            upload_format,
+            duplicates,
+        )
+        if not submitted:
+            job = jobs.get_job(job_id)
+            running = job.description if job is not None else "Another job"
+            st.warning(
+                f"{running} is using the processing queue, upload the files "
+                "again once it has finished."
+            )
+        else:
+            st.session_state.stock_feed_job_id = job_id
+            st.info(
+                f"Processing {len(files)} files in the background, about 1 minute "
+                "per file. Progress is also shown on the Job Status page."
             )
-            time.sleep(len(uploaded_files) * 60)
-            messages = sqs_handler.get_all_sqs_messages(sqs_queue_url)[
-                -len(uploaded_files) :
-            ]
-            st.write("--------------------------------------------------")
-            for message in messages:
-                st.write(message["Body"])
     else:
         st.warning("Please upload at least one file first.")
 
 
-def main() -> None:
-    st.title("Stock Manager")
-    iam.get_aws_credentials(st.secrets["aws_credentials"])
+@st.fragment(run_every=job_status.REFRESH_SECONDS)
+def display_processing_status() -> None:
+    job = job_status.get_session_job("stock_feed_job_id", JOB_KIND)
+    if job is None:
+        return
 
-    s3_handler = s3.S3Handler()
+    job_status.display_job(job)
+    if job.status == jobs.SUCCEEDED:
+        for error in job.result["errors"]:
+            st.error(error)
+        for message in job.result.get("skipped", []) + job.result.get("warnings", []):
+            st.warning(message)
+        display_conversions(job.result["uploaded"])
+        st.write("--------------------------------------------------")
+        for message in job.result["messages"]:
+            st.write(message)
 
-    sqs_queue_url = "rtg-automotive-lambda-queue"
+
+def main() -> None:
+    st.title("Stock Manager")
+    with profiler.section("iam.get_aws_credentials"):
+        iam.get_aws_credentials(st.secrets["aws_credentials"])
 
     uploaded_files = st.file_uploader(
         "Upload Excel files", type=["xlsx"], accept_multiple_files=True
     )
     date = st.date_input("Select a date", value=pd.Timestamp.now().date())
     date = str(date.strftime("%Y-%m-%d"))
+    upload_format = select_upload_format()
+    duplicates = select_duplicate_action()
     if st.button("Upload Files") and date is not None:
-        if uploaded_files:
-            handle_file_uploads(
-                uploaded_files,
-                PROJECT_BUCKET_NAME,
-                date,
-                s3_handler,
-                sqs_queue_url,
-            )
-        else:
-            st.warning("Please upload at least one file first.")
+        handle_file_uploads(uploaded_files, date, upload_format, duplicates)
+
+    display_processing_status()
@@ -1,13 +1,39 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
+import config_store
+import pandas as pd
+import stock_feed_conversion
+import stock_feed_rules
 import streamlit as st
 from aws_utils import s3
 from utils import PROJECT_BUCKET_NAME
 
-
-def load_config_data(s3_handler: s3.S3Handler, json_key: str) -> Dict[str, Any]:
-    return s3_handler.load_json_from_s3(PROJECT_BUCKET_NAME, json_key)
+BASE_CONFIG_KEY = "stock_config_base"
+PENDING_SAVE_KEY = "stock_config_pending_save"
+
+
+def load_config_data(
+    s3_handler: s3.S3Handler, json_key: str, reload: bool = False
+) -> config_store.ConfigDocument:
+    """The version this session is editing, kept until it saves or reloads.
+
+    The latest version in S3 is still revalidated so a change made elsewhere
+    can be flagged, but it never replaces the text under edit.
+    """
+    latest = config_store.load_config(
+        s3_handler, PROJECT_BUCKET_NAME, json_key, force=reload
+    )
+    base = st.session_state.get(BASE_CONFIG_KEY)
+    if base is None or reload:
+        base = st.session_state[BASE_CONFIG_KEY] = latest
+        st.session_state.pop(PENDING_SAVE_KEY, None)
+    elif latest.etag != base.etag:
+        st.warning(
+            "The config has been changed in S3 since you opened it. "
+            "Reload to pick up the changes; saving will be refused until then."
+        )
+    return base
 
 
 def display_config(tab_view, config_data: Dict[str, Any]) -> None:
@@ -16,57 +42,181 @@ def display_config(tab_view, config_data: Dict[str, Any]) -> None:
 
 
 def update_config(
-    tab_update, s3_handler: s3.S3Handler, json_key: str, config_data: Dict[str, Any]
-) -> None:
+    tab_update,
+    s3_handler: s3.S3Handler,
+    json_key: str,
+    base: config_store.ConfigDocument,
+) -> str:
     with tab_update:
         st.subheader("Update Config")
+        # Keyed by ETag so the editor resets once a new version is loaded
         updated_config: str = st.text_area(
             "Edit Config JSON",
-            json.dumps(config_data, indent=4),
+            json.dumps(base.data, indent=4),
             height=400,
+            key=f"config_editor_{base.etag}",
         )
         if st.button("Save Config"):
-            save_config(s3_handler, json_key, updated_config)
+            review_changes(base, updated_config)
+        if PENDING_SAVE_KEY in st.session_state:
+            confirm_save(s3_handler, json_key, base)
+    return updated_config
 
 
-def save_config(s3_handler: s3.S3Handler, json_key: str, updated_config: str) -> None:
+def review_changes(base: config_store.ConfigDocument, updated_config: str) -> None:
     try:
         updated_data: Dict[str, Any] = json.loads(updated_config)
-        s3_handler.upload_json_to_s3(PROJECT_BUCKET_NAME, json_key, updated_data)
-        st.success("Config updated successfully!")
     except json.JSONDecodeError:
         st.error("Invalid JSON format.")
+        return
+    st.session_state[PENDING_SAVE_KEY] = updated_data
+
+
+def format_change_value(value: Any) -> str:
+    return "" if value is None else json.dumps(value)
+
+
+def confirm_save(
+    s3_handler: s3.S3Handler, json_key: str, base: config_store.ConfigDocument
+) -> None:
+    updated_data = st.session_state[PENDING_SAVE_KEY]
+    changes = config_store.diff_config(base.data, updated_data)
+    if not changes:
+        st.info("No changes to save.")
+        del st.session_state[PENDING_SAVE_KEY]
+        return
+
+    st.write(f"{len(changes)} change(s) will be saved:")
+    st.dataframe(
+        pd.DataFrame(
+            [
+                {
+                    "path": change["path"],
+                    "change": change["change"],
+                    "old": format_change_value(change["old"]),
+                    "new": format_change_value(change["new"]),
+                }
+                for change in changes
+            ]
+        ),
+        use_container_width=True,
+    )
+    col_confirm, col_cancel = st.columns(2)
+    if col_cancel.button("Cancel"):
+        del st.session_state[PENDING_SAVE_KEY]
+        st.rerun()
+    if col_confirm.button("Confirm Save", type="primary"):
+        save_config(s3_handler, json_key, base, updated_data)
+
+
+def save_config(
+    s3_handler: s3.S3Handler,
+    json_key: str,
+    base: config_store.ConfigDocument,
+    updated_data: Dict[str, Any],
+) -> None:
+    try:
+        saved = config_store.save_config(
+            s3_handler, PROJECT_BUCKET_NAME, json_key, updated_data, base.etag
+        )
+    except config_store.ConcurrentEditError:
+        st.error(
+            "Someone else has saved the config since you opened it. "
+            "Reload to see their changes, then apply yours again."
+        )
+        return
+    st.session_state[BASE_CONFIG_KEY] = saved
+    del st.session_state[PENDING_SAVE_KEY]
+    st.success("Config updated successfully!")
 
 
 def display_functions(tab_functions) -> None:
     with tab_functions:
         st.subheader("Functions")
-        functions_dictionary: Dict[str, str] = {
-            "set_value_to_10_if_labelled_yes": "Returns 10 if 'yes' is found in the input string, otherwise returns 0.",
-            "get_value_if_less_than_10_else_0": "Returns the input value if it's less than or equal to 10, otherwise returns 0.",
-            "set_value_to_10_if_labelled_in_stock": "Returns 10 if the input is 'in stock', otherwise returns 0.",
-            "set_value_to_10_if_product_in_list": "Always returns 10 regardless of input.",
-        }
+        functions_dictionary: Dict[str, str] = stock_feed_rules.RULE_DESCRIPTIONS
         for function, description in functions_dictionary.items():
             st.markdown(f"### `{function}`")
             st.markdown(f"> **Description:** {description}")
             st.markdown("---")  # Adds a horizontal line for better separation
 
 
+def get_preview_config(
+    updated_config: str, config_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    # Preview the edited (unsaved) config when it is valid JSON
+    try:
+        return json.loads(updated_config)
+    except json.JSONDecodeError:
+        st.warning("The edited config is not valid JSON, previewing the saved config.")
+        return config_data
+
+
+def select_column(label: str, columns: List[str], default: Optional[str]) -> str:
+    index = columns.index(default) if default in columns else 0
+    return st.selectbox(label, options=columns, index=index)
+
+
+def display_dry_run(tab_dry_run, config_data: Dict[str, Any]) -> None:
+    with tab_dry_run:
+        st.subheader("Dry Run")
+        suppliers = sorted(
+            key for key, value in config_data.items() if isinstance(value, dict)
+        )
+        supplier = st.selectbox("Supplier", options=suppliers)
+        sample_file = st.file_uploader(
+            "Upload a sample supplier file", type=["xlsx", "csv"], key="dry_run_file"
+        )
+        if not supplier or sample_file is None:
+            return
+
+        config_entry = config_data[supplier]
+        df = stock_feed_rules.read_sample_file(sample_file.name, sample_file.getvalue())
+        columns = [str(column) for column in df.columns]
+        guessed_code_column, guessed_stock_column = stock_feed_rules.guess_columns(
+            config_entry, columns
+        )
+        code_column = select_column("Code column", columns, guessed_code_column)
+        stock_column = select_column("Stock column", columns, guessed_stock_column)
+        rules = st.multiselect(
+            "Rules",
+            options=list(stock_feed_rules.RULES),
+            default=stock_feed_rules.get_configured_rules(config_entry),
+        )
+        if not rules:
+            st.warning(f"No rule functions found in the {supplier} config entry.")
+            return
+
+        results, timings = stock_feed_rules.preview_rules(
+            df, code_column, stock_column, rules
+        )
+        st.write(f"{len(results)} rows")
+        st.dataframe(timings, use_container_width=True)
+        for rule in rules:
+            st.write(f"Quantities from `{rule}`:")
+            st.dataframe(
+                results[rule].value_counts().rename("rows").to_frame().T,
+                use_container_width=True,
+            )
+        st.dataframe(results.head(500), use_container_width=True)
+
+
 def main() -> None:
     st.title("Stock Manager Configuration")
-    json_key: str = "config/process_stock_feed_config.json"
+    json_key: str = stock_feed_conversion.STOCK_FEED_CONFIG_KEY
 
     try:
         s3_handler = s3.S3Handler()
-        config_data: Dict[str, Any] = load_config_data(s3_handler, json_key)
+        reload = st.button("Reload Config")
+        base = load_config_data(s3_handler, json_key, reload)
+        config_data: Dict[str, Any] = base.data
 
-        tab_view, tab_update, tab_functions = st.tabs(
-            ["View Config", "Update Config", "Functions"]
+        tab_view, tab_update, tab_dry_run, tab_functions = st.tabs(
+            ["View Config", "Update Config", "Dry Run", "Functions"]
         )
 
         display_config(tab_view, config_data)
-        update_config(tab_update, s3_handler, json_key, config_data)
+        updated_config = update_config(tab_update, s3_handler, json_key, base)
+        display_dry_run(tab_dry_run, get_preview_config(updated_config, config_data))
         display_functions(tab_functions)
 
     except Exception as e:
@@ -1,40 +1,93 @@
 import os
-from typing import Any
-import io
-import zipfile
+from typing import Any, Dict, List, Optional
 
-import pandas as pd
+import snapshot_catalog
 import streamlit as st
 from aws_utils import iam, s3
 
 iam.get_aws_credentials(st.secrets["aws_credentials"])
 
+ARCHIVE_PREFIX = "ebay/zip_folders/"
+PAGE_SIZE = 20
+DOWNLOAD_URL_EXPIRY_SECONDS = 15 * 60
+
+
+def list_archives(bucket_name: str) -> List[Dict[str, Any]]:
+    snapshots = snapshot_catalog.list_snapshots(
+        s3.S3Handler(), bucket_name, ARCHIVE_PREFIX, suffix=".zip"
+    )
+    return [
+        {
+            "key": snapshot.keys[0],
+            "timestamp": snapshot.timestamp,
+            "file_name": snapshot.keys[0].split("/")[-1],
+            "size": snapshot.size,
+        }
+        for snapshot in snapshots
+    ]
+
+
+@st.cache_data
+def get_store_count(bucket_name: str, key: str) -> Optional[int]:
+    # Archives are immutable, so the metadata only ever needs to be read once
+    s3_client = s3.S3Handler().s3_client
+    metadata = s3_client.head_object(Bucket=bucket_name, Key=key).get("Metadata", {})
+    store_count = metadata.get("store-count")
+    return int(store_count) if store_count is not None else None
+
+
+def get_download_url(bucket_name: str, key: str) -> str:
+    s3_client = s3.S3Handler().s3_client
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket_name, "Key": key},
+        ExpiresIn=DOWNLOAD_URL_EXPIRY_SECONDS,
+    )
+
+
+def format_size(size: int) -> str:
+    return f"{size / 1024 ** 2:.2f} MB"
+
+
+def select_page(number_of_archives: int) -> int:
+    number_of_pages = max(1, -(-number_of_archives // PAGE_SIZE))
+    page = st.number_input(
+        f"Page (1-{number_of_pages})",
+        min_value=1,
+        max_value=number_of_pages,
+        value=1,
+        format="%d",
+    )
+    return int(page)
+
+
+def display_archive(bucket_name: str, archive: Dict[str, Any]) -> None:
+    store_count = get_store_count(bucket_name, archive["key"])
+    timestamp_column, size_column, stores_column, download_column = st.columns(
+        [3, 2, 2, 2]
+    )
+    timestamp_column.write(archive["timestamp"])
+    size_column.write(format_size(archive["size"]))
+    stores_column.write(
+        f"{store_count} stores" if store_count is not None else "Unknown stores"
+    )
+    download_column.link_button(
+        "Download", get_download_url(bucket_name, archive["key"])
+    )
+
 
 def main() -> None:
     project: str = "rtg-automotive"
     bucket_name: str = f"{project}-bucket-{os.environ['AWS_ACCOUNT_ID']}"
     st.title("Stock Manager File Store")
 
-    s3_handler = s3.S3Handler()
-    objects = s3_handler.list_objects(bucket_name, "ebay/zip_folders/")
-
-    # Sort objects by timestamp (the second last part of the key)
-    objects.sort(key=lambda obj: obj["Key"].split("/")[-2], reverse=True)
-
-    # Limit to the latest 20 items
-    for object in objects[:20]:
-        file_name = object["Key"].split("/")[-1]
-        timestamp = object["Key"].split("/")[-2]
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
-            s3_client = s3_handler.s3_client
-            response = s3_client.get_object(Bucket=bucket_name, Key=object["Key"])
-            zip_file.writestr(file_name, response["Body"].read())
-
-        zip_buffer.seek(0)
-        st.download_button(
-            label=f"Download: {timestamp}",
-            data=zip_buffer,
-            file_name=file_name,
-            mime="application/zip",
-        )
+    archives = list_archives(bucket_name)
+    if not archives:
+        st.write("No eBay upload archives found")
+        return
+
+    page = select_page(len(archives))
+    st.write(f"{len(archives)} archives")
+
+    for archive in archives[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]:
+        display_archive(bucket_name, archive)
@@ -0,0 +1,127 @@
+"""Table Viewer queries, independent of the Streamlit UI.
+
+A query with limit 0 loads the table's latest snapshot from S3 (filtered
+locally); otherwise it goes to the items API, with long filter lists sent
+through ``bulk_filter``. Loaded snapshots are kept in the given
+``FrameStore`` (the session's in the app), so a later bulk filter on the same
+table can run as a local semi-join. A limit 0 query filtering a few keys of a
+snapshot that is not loaded reads only the matching row groups through the
+snapshot's ``point_index`` instead of the whole table.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional, Union
+
+import api.utils as api_utils
+import bulk_filter
+import frame_store
+import pandas as pd
+import point_index
+import profiler
+import snapshot_catalog
+import telemetry
+from aws_utils import s3
+
+QueryResult = Union[pd.DataFrame, Dict[str, Any]]
+
+
+def get_bucket_name() -> str:
+    return f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}"
+
+
+def build_params(
+    table_name: str, filters: bulk_filter.Filters, limit: int
+) -> Dict[str, Any]:
+    return {"table_name": table_name, "filters": json.dumps(filters), "limit": limit}
+
+
+def resolve_table_snapshot(
+    s3_handler: s3.S3Handler, table_name: str
+) -> Optional[snapshot_catalog.Snapshot]:
+    return snapshot_catalog.resolve_latest_snapshot(
+        s3_handler, get_bucket_name(), f"{table_name}/"
+    )
+
+
+def get_frame_name(snapshot: snapshot_catalog.Snapshot) -> str:
+    return f"{snapshot.prefix}{snapshot.timestamp}"
+
+
+@profiler.timed("get_table_from_s3")
+def load_table(table_name: str, frames: frame_store.FrameStore) -> pd.DataFrame:
+    s3_handler = s3.S3Handler()
+    snapshot = resolve_table_snapshot(s3_handler, table_name)
+
+    if snapshot is None:
+        return pd.DataFrame()  # Return an empty frame if no snapshot is found
+
+    frame_name = get_frame_name(snapshot)
+    df = frames.get(frame_name)
+    if df is None:
+        df = snapshot_catalog.load_snapshot(s3_handler, get_bucket_name(), snapshot)
+        frames.put(frame_name, df)
+    return df
+
+
+def get_loaded_table(
+    table_name: str, frames: frame_store.FrameStore
+) -> Optional[pd.DataFrame]:
+    """The table's latest snapshot if it is already in ``frames``."""
+    snapshot = resolve_table_snapshot(s3.S3Handler(), table_name)
+    if snapshot is None:
+        return None
+    return frames.get(get_frame_name(snapshot))
+
+
+def lookup_table(
+    table_name: str, filters: bulk_filter.Filters, frames: frame_store.FrameStore
+) -> Optional[pd.DataFrame]:
+    """Rows matching ``filters`` read through the point index, or None if
+    the table is already loaded or the index cannot serve the filters."""
+    s3_handler = s3.S3Handler()
+    snapshot = resolve_table_snapshot(s3_handler, table_name)
+    if snapshot is None or get_frame_name(snapshot) in frames:
+        return None
+    return point_index.lookup(s3_handler, get_bucket_name(), snapshot, filters)
+
+
+def fetch_bulk_results(
+    params: Dict[str, Any],
+    table_name: str,
+    filters: bulk_filter.Filters,
+    frames: frame_store.FrameStore,
+) -> QueryResult:
+    df = get_loaded_table(table_name, frames)
+    if df is not None:
+        with telemetry.span(telemetry.TRANSFORM, rows=len(df)):
+            return bulk_filter.semi_join(df, filters, params["limit"])
+    with telemetry.span(telemetry.API_CALL) as api_span:
+        results = bulk_filter.fetch_in_batches(
+            lambda batch: api_utils.post_query(
+                "items", table_name, batch, params["limit"]
+            ),
+            filters,
+            params["limit"],
+        )
+        api_span["rows"] = len(results) if isinstance(results, pd.DataFrame) else 0
+    return results
+
+
+def fetch_results(
+    params: Dict[str, Any], table_name: str, frames: frame_store.FrameStore
+) -> QueryResult:
+    filters = bulk_filter.parse_filters(params["filters"])
+    if params["limit"] == 0:
+        if filters:
+            df = lookup_table(table_name, filters, frames)
+            if df is not None:
+                return df
+        df = load_table(table_name, frames)
+        return bulk_filter.semi_join(df, filters) if filters else df
+    if bulk_filter.is_bulk(filters):
+        return fetch_bulk_results(params, table_name, filters, frames)
+    with telemetry.span(telemetry.API_CALL) as api_span:
+        results = api_utils.get_dataframe("items", params)
+        api_span["rows"] = len(results) if isinstance(results, pd.DataFrame) else 0
+    return results
@@ -1,13 +1,33 @@
+import hashlib
 import json
-import zipfile
-from io import BytesIO
-from typing import Dict, List, Any, Optional
-
-import api.utils as api_utils
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import bulk_filter
+import exports
+import frame_store
+import job_status
+import jobs
 import pandas as pd
+import profiler
 import streamlit as st
-from aws_utils import iam, s3
-import os
+import table_query
+import telemetry
+from aws_utils import iam, logs
+from query_cache import query_cache
+
+EXPORT_JOB_KIND = "table_export"
+# Frame store name of the last query's result, unless it is a whole table
+RESULT_FRAME_NAME = "query_result"
+
+ExportKey = Tuple[str, str, str]
+
+# (result fingerprint, export format, split column) to the job that built it,
+# shared by every session so rerunning a query reuses its export
+_export_jobs: "OrderedDict[ExportKey, str]" = OrderedDict()
+_export_jobs_lock = threading.Lock()
 
 
 def get_table_config() -> Dict[str, Dict[str, List[Dict[str, str]]]]:
@@ -86,135 +106,235 @@ def get_filter_values(
     return []
 
 
-def convert_to_excel(data: List[Dict[str, Any]]) -> bytes:
-    df = pd.DataFrame(data)
-    df = df.sort_values(by=df.columns[0], ascending=True)
-
-    # If dataframe exceeds Excel's row limit, split it into chunks
-    max_rows = 10**6
-    if len(df) > max_rows:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            # Split dataframe into chunks and write to different sheets
-            for i, chunk_start in enumerate(range(0, len(df), max_rows)):
-                chunk = df.iloc[chunk_start : chunk_start + max_rows]
-                chunk.to_excel(writer, sheet_name=f"Sheet_{i+1}", index=False)
-    else:
-        output = BytesIO()
-        df.to_excel(output, index=False, engine="openpyxl")
-
-    output.seek(0)
-    return output.getvalue()
-
-
-def download_excels_as_zip(data_dictionary: Dict[str, bytes]) -> None:
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
-        for file_name, excel_data in data_dictionary.items():
-            zip_file.writestr(file_name, excel_data)
-
-    zip_buffer.seek(0)
+def download_export(zip_path: str, export_format: str) -> None:
+    label = exports.EXPORT_FORMATS[export_format].label
     st.download_button(
-        label="Download All Excel Files as Zip",
-        data=zip_buffer,
-        file_name="excel_files.zip",
+        label=f"Download All {label} Files as Zip",
+        data=jobs.read_file(zip_path),
+        file_name=f"{export_format.replace('.', '_')}_files.zip",
         mime="application/zip",
     )
 
 
-def get_table_from_s3(table_name: str) -> List[Dict[str, Any]]:
-    s3_handler = s3.S3Handler()
-    bucket_name = f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}"
-
-    folders = s3_handler.list_objects(bucket_name, f"{table_name}/")
-    folder_paths = [
-        (folder["Key"].split("/")[-2], folder["Key"])
-        for folder in folders
-        if folder["Key"].endswith(".parquet")
-    ]
+def get_session_frame_store() -> frame_store.FrameStore:
+    if "frame_store" not in st.session_state:
+        st.session_state.frame_store = frame_store.FrameStore()
+    return st.session_state.frame_store
 
-    if not folder_paths:
-        return []  # Return an empty list if no folders are found
 
-    latest_folder = "/".join(
-        sorted(folder_paths, key=lambda x: x[0], reverse=True)[0][1].split("/")[:-1]
-    )
+def get_table_from_s3(table_name: str) -> pd.DataFrame:
+    return table_query.load_table(table_name, get_session_frame_store())
 
-    files = s3_handler.list_objects(bucket_name, latest_folder)
 
-    table_dictionary = []
+def fetch_results(
+    params: Dict[str, Any], table_selection: str
+) -> Union[pd.DataFrame, Dict[str, Any]]:
+    return table_query.fetch_results(params, table_selection, get_session_frame_store())
 
-    for file in files:
-        if file["Key"].endswith(".parquet"):
-            latest_file = file["Key"]
 
-            table_data = s3_handler.load_parquet_from_s3(bucket_name, latest_file)
-            df = pd.read_parquet(BytesIO(table_data))
-
-            table_dictionary.extend(
-                [{col: row[col] for col in df.columns} for _, row in df.iterrows()]
+def run_query(params: Dict[str, Any], table_selection: str) -> None:
+    if st.button("Run Query"):
+        del params["split_by_column"]
+        with telemetry.trace() as query_trace:
+            results = query_cache.get_or_fetch(
+                params,
+                lambda: fetch_results(params, table_selection),
+                # Full tables are held by the session frame store instead,
+                # within the session's memory budget
+                cacheable=lambda value: isinstance(value, pd.DataFrame)
+                and params["limit"] != 0,
             )
+        # Kept for later reruns, so changing the export options or asking for
+        # a download does not run the query again
+        st.session_state.query_result = {
+            **store_results(results),
+            "table": table_selection,
+            "fingerprint": None,
+        }
+        log_query(table_selection, params, query_trace)
+
+
+def store_results(results: Union[pd.DataFrame, Dict[str, Any]]) -> Dict[str, Any]:
+    """Hold a result frame in the session's frame store rather than the session
+    state, so it is spilled with the other frames; returns how to find it."""
+    if not isinstance(results, pd.DataFrame):
+        return {"frame": None, "response": results}
+    frames = get_session_frame_store()
+    # A whole table is already held under its snapshot's name
+    frame_name = frames.find(results)
+    if frame_name is None:
+        frame_name = RESULT_FRAME_NAME
+        frames.put(frame_name, results)
+    else:
+        frames.remove(RESULT_FRAME_NAME)
+    return {"frame": frame_name}
 
-    return table_dictionary
 
+def get_query_results(
+    query_result: Dict[str, Any],
+) -> Optional[Union[pd.DataFrame, Dict[str, Any]]]:
+    if query_result["frame"] is None:
+        return query_result["response"]
+    return get_session_frame_store().get(query_result["frame"])
 
-def run_query(
-    params: Dict[str, Any], table_selection: str, split_by_column: str
+
+def log_query(
+    table_selection: str, params: Dict[str, Any], query_trace: telemetry.Trace
 ) -> None:
-    if st.button("Run Query"):
-        del params["split_by_column"]
-        if params["limit"] == 0:
-            results = get_table_from_s3(table_selection)
-        else:
-            results = api_utils.get_request("items", params)
-        if results:
-            display_results(results, table_selection, split_by_column)
-        else:
-            st.write("No results found")
+    logs_handler = logs.LogsHandler()
+    logs_handler.log_action(
+        f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}",
+        "frontend",
+        telemetry.format_action(
+            f"QUERY | table={table_selection} | limit={params['limit']}", query_trace
+        ),
+        "admin",
+    )
 
 
 def display_results(
-    results: List[Dict[str, Any]], table_selection: str, split_by_column: str
-) -> None:
+    results: Union[pd.DataFrame, Dict[str, Any]],
+) -> bool:
+    """Show the preview; returns whether there is anything to export."""
     if isinstance(results, dict) and results.get("error") == "No items found":
         st.warning("No results found")
-        return None
+        return False
     elif (
         isinstance(results, dict)
         and results.get("message") == "Endpoint request timed out"
     ):
         st.warning("Request timed out")
-        return None
+        return False
+    elif isinstance(results, pd.DataFrame) and results.empty:
+        st.write("No results found")
+        return False
     else:
-        st.dataframe(pd.DataFrame(results[:100]))
-        with st.spinner("Building the Excel export..."):
-            if split_by_column:
-                create_split_downloads(results, table_selection, split_by_column)
-            else:
-                download_single_file(results, table_selection)
+        with profiler.section("render preview"):
+            st.dataframe(results.head(100))
+        return True
+
+
+def get_result_fingerprint(query_result: Dict[str, Any], results: pd.DataFrame) -> str:
+    """Content hash of the result, computed once and only when exporting."""
+    if query_result["fingerprint"] is None:
+        digest = hashlib.sha256(query_result["table"].encode("utf-8"))
+        digest.update(json.dumps([str(c) for c in results.columns]).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(results, index=False).to_numpy())
+        query_result["fingerprint"] = digest.hexdigest()
+    return query_result["fingerprint"]
+
+
+def run_export_job(
+    context: jobs.JobContext,
+    results: pd.DataFrame,
+    table_selection: str,
+    export_format: str,
+    split_by_column: str,
+) -> Dict[str, Any]:
+    label = exports.EXPORT_FORMATS[export_format].label
+    context.update(message=f"Building the {label} export")
+    with telemetry.trace() as export_trace:
+        with telemetry.span(telemetry.EXPORT, rows=len(results)) as export_span:
+            zip_data = exports.build_export(
+                results, table_selection, export_format, split_by_column or None
+            )
+            export_span["bytes"] = len(zip_data)
+    zip_path = context.save_file("export.zip", zip_data)
+    logs.LogsHandler().log_action(
+        table_query.get_bucket_name(),
+        "frontend",
+        telemetry.format_action(
+            f"EXPORT | table={table_selection} | format={export_format}",
+            export_trace,
+        ),
+        "admin",
+    )
+    return {"zip_path": zip_path, "rows": len(results)}
 
 
-def create_split_downloads(
-    results: List[Dict[str, Any]], table_selection: str, split_by_column: str
-) -> None:
-    results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values(by=results_df.columns[0], ascending=True)
-    if split_by_column in results_df.columns:
-        unique_values = results_df[split_by_column].unique()
-        data_dictionary = {}
-        for value in unique_values:
-            filtered_results = results_df[results_df[split_by_column] == value]
-            data_dictionary[f"{table_selection}_{split_by_column}_{value}.xlsx"] = (
-                convert_to_excel(filtered_results.to_dict(orient="records"))
-            )
-        download_excels_as_zip(data_dictionary)
-    else:
-        st.write(f"Column '{split_by_column}' not found in results.")
+def get_export_job(key: ExportKey) -> Optional[jobs.Job]:
+    """The job building this export, unless it failed or its file is gone."""
+    with _export_jobs_lock:
+        job_id = _export_jobs.get(key)
+    job = jobs.get_job(job_id) if job_id is not None else None
+    if job is None or job.status in (jobs.FAILED, jobs.INTERRUPTED):
+        return None
+    if job.status == jobs.SUCCEEDED and not os.path.exists(job.result["zip_path"]):
+        return None
+    return job
 
 
-def download_single_file(results: List[Dict[str, Any]], table_selection: str) -> None:
-    data_dictionary = {f"{table_selection}.xlsx": convert_to_excel(results)}
-    download_excels_as_zip(data_dictionary)
+def submit_export(
+    key: ExportKey,
+    results: pd.DataFrame,
+    table_selection: str,
+    export_format: str,
+    split_by_column: str,
+) -> str:
+    label = exports.EXPORT_FORMATS[export_format].label
+    job_id = jobs.submit(
+        EXPORT_JOB_KIND,
+        f"Export {table_selection} as {label}",
+        run_export_job,
+        results,
+        table_selection,
+        export_format,
+        split_by_column,
+    )
+    with _export_jobs_lock:
+        _export_jobs[key] = job_id
+        while len(_export_jobs) > jobs.MAX_JOBS_KEPT:
+            _export_jobs.popitem(last=False)
+    return job_id
+
+
+@st.fragment(run_every=job_status.REFRESH_SECONDS)
+def display_export_status(job_id: str, export_format: str) -> None:
+    job = jobs.get_job(job_id)
+    if job is None:
+        return
+    job_status.display_job(job)
+    if job.status == jobs.SUCCEEDED:
+        download_export(job.result["zip_path"], export_format)
+
+
+def display_export(
+    query_result: Dict[str, Any],
+    results: pd.DataFrame,
+    split_by_column: str,
+    export_format: str,
+) -> None:
+    """Build the export in the background once asked for, then offer it.
+
+    The export of an identical result in the same format is reused, also
+    across sessions, instead of being built again.
+    """
+    if split_by_column and split_by_column not in results.columns:
+        st.write(f"Column '{split_by_column}' not found in results.")
+        return
+
+    # The fingerprint is only needed, and computed, once an export is wanted
+    exported = query_result.setdefault("exports", {})
+    job_id = exported.get((export_format, split_by_column))
+    if job_id is None:
+        label = exports.EXPORT_FORMATS[export_format].label
+        if not st.button(f"Prepare {label} Export"):
+            return
+        key = (
+            get_result_fingerprint(query_result, results),
+            export_format,
+            split_by_column,
+        )
+        job = get_export_job(key)
+        job_id = (
+            job.job_id
+            if job is not None
+            else submit_export(
+                key, results, query_result["table"], export_format, split_by_column
+            )
+        )
+        exported[(export_format, split_by_column)] = job_id
+    display_export_status(job_id, export_format)
 
 
 def select_table(config: Dict[str, Any]) -> str:
@@ -257,6 +377,22 @@ def build_query_params(table_selection: str, result_limit: int) -> Dict[str, Any
     }
 
 
+def summarize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # Long filter lists are shown as counts rather than written out in full
+    filters = bulk_filter.parse_filters(params["filters"])
+    return {
+        **params,
+        "filters": {
+            column: (
+                f"{len(values)} values"
+                if len(values) > bulk_filter.BULK_FILTER_THRESHOLD
+                else values
+            )
+            for column, values in filters.items()
+        },
+    }
+
+
 def select_split_by_column(filter_columns: List[Dict[str, Any]]) -> str:
     return st.selectbox(
         "Split by column (optional)",
@@ -266,9 +402,19 @@ def select_split_by_column(filter_columns: List[Dict[str, Any]]) -> str:
     )
 
 
+def select_export_format() -> str:
+    return st.selectbox(
+        "Export format",
+        options=list(exports.EXPORT_FORMATS),
+        format_func=lambda export_format: exports.EXPORT_FORMATS[export_format].label,
+        key="export_format",
+    )
+
+
 def main() -> None:
     st.title("Table Viewer")
-    iam.get_aws_credentials(st.secrets["aws_credentials"])
+    with profiler.section("iam.get_aws_credentials"):
+        iam.get_aws_credentials(st.secrets["aws_credentials"])
     config = get_table_config()
 
     table_selection = select_table(config)
@@ -286,6 +432,15 @@ def main() -> None:
     params["split_by_column"] = split_by_column
 
     st.write("Query Parameters:")
-    st.write(params)
+    st.write(summarize_params(params))
+
+    export_format = select_export_format()
+
+    run_query(params, table_selection)
 
-    run_query(params, table_selection, split_by_column)
+    query_result = st.session_state.get("query_result")
+    if query_result is None:
+        return
+    results = get_query_results(query_result)
+    if results is not None and display_results(results):
+        display_export(query_result, results, split_by_column, export_format)
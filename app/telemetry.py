@@ -0,0 +1,98 @@
+"""Span timers whose results are attached to audit log actions.
+
+Wrap an operation in ``trace()`` and time its phases with ``span(name)``.
+Spans opened anywhere below the trace (including inside helper modules) are
+collected on it, and ``format_action`` appends them to the action written by
+``logs_handler.log_action`` as ``<phase>_ms``, ``<phase>_rows`` and
+``<phase>_bytes`` fields. A nested trace also hands its spans to the
+enclosing one when it ends. Outside a trace ``span`` only measures.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+S3_FETCH = "s3_fetch"
+S3_UPLOAD = "s3_upload"
+DECODE = "decode"
+TRANSFORM = "transform"
+EXPORT = "export"
+API_CALL = "api_call"
+QUEUE_WAIT = "queue_wait"
+
+
+class Trace:
+    def __init__(self) -> None:
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.spans.append(record)
+
+    def fields(self) -> Dict[str, Any]:
+        """Aggregate spans by name into ``<name>_ms/_rows/_bytes`` fields."""
+        fields: Dict[str, Any] = {}
+        for record in self.spans:
+            name = record["name"]
+            fields[f"{name}_ms"] = fields.get(f"{name}_ms", 0) + record["duration_ms"]
+            for metric in ("rows", "bytes"):
+                if record.get(metric) is not None:
+                    key = f"{name}_{metric}"
+                    fields[key] = fields.get(key, 0) + int(record[metric])
+        return {
+            key: round(value) if key.endswith("_ms") else value
+            for key, value in fields.items()
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar(
+    "telemetry_trace", default=None
+)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    parent_trace = _current_trace.get()
+    new_trace = Trace()
+    token = _current_trace.set(new_trace)
+    try:
+        yield new_trace
+    finally:
+        _current_trace.reset(token)
+        if parent_trace is not None:
+            parent_trace.spans.extend(new_trace.spans)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a phase; set ``rows``/``bytes`` on the yielded record to attach counts."""
+    record: Dict[str, Any] = {"name": name, **attributes}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration_ms"] = (time.perf_counter() - start) * 1000
+        active_trace = _current_trace.get()
+        if active_trace is not None:
+            active_trace.add(record)
+
+
+def format_action(action: str, active_trace: Optional[Trace]) -> str:
+    if active_trace is None:
+        return action
+    return " | ".join(
+        [action] + [f"{key}={value}" for key, value in active_trace.fields().items()]
+    )
+
+
+def parse_action_fields(action: str) -> Dict[str, str]:
+    fields = {}
+    for part in action.split("|")[1:]:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            fields[key.strip()] = value.strip()
+    return fields
@@ -0,0 +1,43 @@
+"""Compare payload size and decode time of the items API wire formats.
+
+Usage: python benchmarks/bench_api_formats.py [--rows 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from generators import make_store_frame
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api import codec  # noqa: E402
+
+
+def time_decode(body: bytes, content_type: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        codec.decode_frame(body, content_type)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_store_frame(args.rows)
+    print(f"store results, {args.rows} rows")
+    print(f"{'format':<40}{'bytes':>14}{'decode ms':>12}")
+    for content_type in codec.SUPPORTED_FORMATS:
+        body = codec.encode_frame(df, content_type)
+        decode_seconds = time_decode(body, content_type, args.repeat)
+        print(f"{content_type:<40}{len(body):>14,}{decode_seconds * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
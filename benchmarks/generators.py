@@ -0,0 +1,97 @@
+"""Seeded synthetic tables shaped like the ``store``, ``supplier_stock`` and
+``ebay/table`` snapshots, and a writer that lays them out as snapshots in the
+local S3 stand-in directory.
+"""
+
+import os
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+STORES = ["CPO_RTG", "RTG_FPS", "RTG_UKD", "AMS", "DPW", "SJR"]
+SUPPLIERS = ["APE", "BET", "BGA", "FPS", "KLA", "RTG", "SMP", "UKC"]
+SIZES = {"10k": 10_000, "1m": 1_000_000, "5m": 5_000_000}
+
+
+def make_custom_labels(rng: np.random.Generator, rows: int) -> pd.Series:
+    suppliers = pd.Series(rng.choice(SUPPLIERS, rows))
+    return (
+        "UKD-" + suppliers + "-" + pd.Series(np.arange(rows)).astype(str).str.zfill(7)
+    )
+
+
+def make_store_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "item_id": 200000000000 + np.arange(rows, dtype=np.int64),
+            "custom_label": make_custom_labels(rng, rows),
+            "title": "Ignition coil pack set "
+            + pd.Series(rng.integers(1, 5000, rows)).astype(str),
+            "current_price": np.round(rng.uniform(5, 250, rows), 2),
+            "prefix": "",
+            "uk_rtg": "RTG",
+            "fps_wds_dir": "RTG",
+            "payment_profile_name": "eBay Payments:Immediate pay",
+            "shipping_profile_name": rng.choice(
+                ["StandardPacketNoIntl", "Courier48", "FreeStandard"], rows
+            ),
+            "return_profile_name": "Returns Accepted,Seller,30 days",
+            "supplier": rng.choice(SUPPLIERS, rows),
+            "ebay_store": rng.choice(STORES, rows),
+        }
+    )
+
+
+def make_supplier_stock_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "part_number": "P" + pd.Series(np.arange(rows)).astype(str).str.zfill(8),
+            "custom_label": make_custom_labels(rng, rows),
+            "supplier": rng.choice(SUPPLIERS, rows),
+            "quantity": rng.integers(0, 20, rows),
+            "updated_date": rng.choice(
+                pd.date_range("2024-01-01", periods=30).strftime("%Y-%m-%d"), rows
+            ),
+        }
+    )
+
+
+def make_ebay_table_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    item_ids = (200000000000 + np.arange(rows)).astype(float)
+    # Listings that have not been created on eBay yet have no item id
+    item_ids[rng.random(rows) < 0.05] = np.nan
+    quantity = rng.integers(0, 11, rows)
+    quantity_delta = np.where(rng.random(rows) < 0.7, 0, rng.integers(-10, 11, rows))
+    return pd.DataFrame(
+        {
+            "custom_label": make_custom_labels(rng, rows),
+            "item_id": item_ids,
+            "ebay_store": rng.choice(STORES, rows),
+            "supplier": rng.choice(SUPPLIERS, rows),
+            "quantity": quantity,
+            "quantity_delta": quantity_delta,
+        }
+    )
+
+
+GENERATORS: Dict[str, Callable[[int, int], pd.DataFrame]] = {
+    "store": make_store_frame,
+    "supplier_stock": make_supplier_stock_frame,
+    "ebay/table": make_ebay_table_frame,
+}
+
+
+def write_snapshot(
+    root: str, prefix: str, df: pd.DataFrame, timestamp: str, parts: int = 4
+) -> None:
+    """Write ``df`` as ``parts`` parquet files under ``<root>/<prefix><timestamp>/``."""
+    directory = os.path.join(root, prefix, timestamp)
+    os.makedirs(directory, exist_ok=True)
+    for part, chunk in enumerate(np.array_split(np.arange(len(df)), parts)):
+        df.iloc[chunk].to_parquet(
+            os.path.join(directory, f"part-{part}.parquet"), index=False
+        )
@@ -0,0 +1,517 @@
+"""Load-test ``app/main.py`` with concurrent headless sessions.
+
+Each simulated user is a ``streamlit.testing`` ``AppTest`` of ``app/main.py``
+with its own session state, logged in and driven through the pages like a
+browser would. All sessions run in this one process, as they would on the
+single Streamlit server, so they share its caches, the job worker pool and the
+CPU. The app runs against the local stand-ins: S3 and SQS from
+``app/aws_utils_mock`` (seeded snapshots from ``generators``) and the items API
+from ``app/api/mock.py`` served by uvicorn.
+
+Scenarios, assigned to sessions round-robin from ``--mix``:
+
+- ``table_all``: a Table Viewer "ALL" query (limit 0) of ``store``, then its
+  export, built in the background,
+- ``table_api``: a Table Viewer query of 10 rows through the items API,
+- ``bulk_edit``: a Bulk Edits append of ``--edit-rows`` uploaded rows,
+- ``ebay``: an eBay generation job, from the button to the finished job.
+
+For every concurrency level in ``--sessions`` each session runs its scenario
+``--iterations`` times. The report lists latency percentiles per scenario,
+throughput, CPU seconds and resident memory per session, and the level at
+which the app saturates: the first level at which a scenario's p95 latency is
+more than ``--max-p95-ratio`` times its p95 at the lowest level, or whose
+throughput is less than ``--min-gain`` times the previous level's (compared
+only between levels running the whole mix).
+
+Usage:
+    python benchmarks/load_test.py [--sessions 1,2,4,8] [--iterations 3]
+        [--mix table_all,table_api,bulk_edit,ebay] [--rows 100k] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+APP_DIR = os.path.join(REPO_DIR, "app")
+MAIN_SCRIPT = os.path.join(APP_DIR, "main.py")
+API_PORT = 8765
+SNAPSHOT_TIMESTAMP = "2024-06-01T06:00:00"
+EBAY_QUEUE = "rtg-automotive-lambda-queue"
+RUN_TIMEOUT_SECONDS = 600
+JOB_POLL_SECONDS = 0.5
+SAMPLE_SECONDS = 0.2
+ROW_SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SECRETS = {
+    "aws_credentials": {"STAGE": "dev"},
+    "login_credentials": {"username": "load-test", "password": "load-test"},
+}
+
+sys.path.insert(0, APP_DIR)
+
+
+@dataclass
+class LevelResult:
+    sessions: int
+    wall_seconds: float
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    cpu_seconds: float = 0.0
+    baseline_rss_mb: float = 0.0
+    peak_rss_mb: float = 0.0
+
+    @property
+    def operations(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.operations / self.wall_seconds if self.wall_seconds else 0.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def get_rss_mb() -> float:
+    # Current resident set size; /proc is Linux only, ru_maxrss is the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the process's resident memory until stopped."""
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.stopped = threading.Event()
+        self.peak_rss_mb = get_rss_mb()
+
+    def run(self) -> None:
+        while not self.stopped.wait(SAMPLE_SECONDS):
+            self.peak_rss_mb = max(self.peak_rss_mb, get_rss_mb())
+
+    def stop(self) -> float:
+        self.stopped.set()
+        self.join()
+        return max(self.peak_rss_mb, get_rss_mb())
+
+
+def prepare_environment(rows: int, work_dir: str) -> None:
+    """Seed the S3 and SQS stand-ins and point the app at them."""
+    import generators
+
+    s3_dir = os.path.join(work_dir, "s3")
+    for prefix, generate in generators.GENERATORS.items():
+        generators.write_snapshot(
+            s3_dir, f"{prefix}/", generate(rows, seed=0), SNAPSHOT_TIMESTAMP
+        )
+    sqs_dir = os.path.join(work_dir, "sqs", EBAY_QUEUE)
+    os.makedirs(sqs_dir)
+    with open(os.path.join(sqs_dir, "sqsmessage.json"), "w") as f:
+        json.dump([{"MessageId": "load-test", "Body": "Ebay table generated"}], f)
+
+    os.environ.update(
+        {
+            "RTG_MOCK_S3_DIR": s3_dir,
+            "RTG_MOCK_SQS_DIR": os.path.join(work_dir, "sqs"),
+            "RTG_JOB_STATE_DIR": os.path.join(work_dir, "jobs"),
+            "RTG_SPILL_DIR": os.path.join(work_dir, "spill"),
+            "RTG_API_BASE_URL": f"http://127.0.0.1:{API_PORT}/",
+        }
+    )
+    import aws_utils_mock
+
+    aws_utils_mock.install()
+
+    # Set once for every session; AppTest would otherwise swap the global
+    # secrets in and out around each run, underneath the other sessions
+    import streamlit as st
+    from streamlit.runtime.secrets import Secrets
+
+    secrets = Secrets()
+    secrets._secrets = SECRETS
+    st.secrets = secrets
+    share_test_state()
+
+
+def share_test_state() -> None:
+    """Make ``AppTest`` safe to run from several threads at once.
+
+    ``AppTest`` installs a mock ``Runtime`` and sets ``global.appTest`` for
+    each run and resets both afterwards, which would pull them from under the
+    sessions still running. It also compiles the script on every run, and
+    concurrent ``compile`` calls can fail on Python 3.11.
+    """
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    config.set_option("global.appTest", True)
+
+    compile_lock = threading.Lock()
+    bytecode = {}
+    get_bytecode = ScriptCache.get_bytecode
+
+    def get_shared_bytecode(self, script_path: str) -> Any:
+        with compile_lock:
+            if script_path not in bytecode:
+                bytecode[script_path] = get_bytecode(self, script_path)
+            return bytecode[script_path]
+
+    ScriptCache.get_bytecode = get_shared_bytecode
+
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in last
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+
+def start_api() -> None:
+    import uvicorn
+
+    # The mock reads app/api/data relative to the working directory
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+    server = uvicorn.Server(
+        uvicorn.Config(
+            "app.api.mock:app", host="127.0.0.1", port=API_PORT, log_level="warning"
+        )
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+def open_page(page: str):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(MAIN_SCRIPT, default_timeout=RUN_TIMEOUT_SECONDS)
+    app.session_state["logged_in"] = True
+    app.run()
+    app.sidebar.selectbox[0].select(page).run()
+    return app
+
+
+def click(app, label: str) -> None:
+    next(button for button in app.button if button.label == label).click().run()
+
+
+def check(app) -> None:
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    if app.error:
+        raise RuntimeError(app.error[0].value)
+
+
+def wait_for_job(job_id: str) -> None:
+    import jobs
+
+    while True:
+        job = jobs.get_job(job_id)
+        if job is not None and job.finished:
+            break
+        time.sleep(JOB_POLL_SECONDS)
+    if job.status != jobs.SUCCEEDED:
+        raise RuntimeError(job.error or job.status)
+
+
+def table_all(state: Dict[str, Any]) -> Callable[[], None]:
+    import exports
+
+    app = open_page("Table Viewer")
+    app.number_input[0].set_value(0)
+    app.selectbox(key="export_format").select(state["export_format"]).run()
+    label = exports.EXPORT_FORMATS[state["export_format"]].label
+
+    def run() -> None:
+        click(app, "Run Query")
+        check(app)
+        click(app, f"Prepare {label} Export")
+        check(app)
+        exported = app.session_state["query_result"]["exports"]
+        wait_for_job(next(iter(exported.values())))
+
+    return run
+
+
+def table_api(state: Dict[str, Any]) -> Callable[[], None]:
+    app = open_page("Table Viewer")
+
+    def run() -> None:
+        click(app, "Run Query")
+        check(app)
+
+    return run
+
+
+def bulk_edit(state: Dict[str, Any]) -> Callable[[], None]:
+    app = open_page("Bulk Edits")
+    app.file_uploader[0].upload("edits.csv", state["edit_csv"], "text/csv").run()
+
+    def run() -> None:
+        click(app, "Edit Table")
+        check(app)
+
+    return run
+
+
+def ebay(state: Dict[str, Any]) -> Callable[[], None]:
+    app = open_page("Ebay Upload Generator")
+
+    def run() -> None:
+        click(app, "Generate eBay Store Upload Files")
+        check(app)
+        wait_for_job(app.session_state["ebay_job_id"])
+
+    return run
+
+
+SCENARIOS: Dict[str, Callable[[Dict[str, Any]], Callable[[], None]]] = {
+    "table_all": table_all,
+    "table_api": table_api,
+    "bulk_edit": bulk_edit,
+    "ebay": ebay,
+}
+
+
+def run_session(
+    scenario: str,
+    state: Dict[str, Any],
+    iterations: int,
+    start: threading.Barrier,
+    result: LevelResult,
+    lock: threading.Lock,
+) -> None:
+    try:
+        run = SCENARIOS[scenario](state)
+    except Exception as e:
+        start.abort()
+        with lock:
+            result.errors.append(f"{scenario} setup: {e}")
+        return
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        return
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        try:
+            run()
+        except Exception as e:
+            with lock:
+                result.errors.append(f"{scenario}: {e}")
+            continue
+        with lock:
+            result.latencies.setdefault(scenario, []).append(
+                time.perf_counter() - begin
+            )
+
+
+def run_level(
+    sessions: int, mix: List[str], iterations: int, state: Dict[str, Any]
+) -> LevelResult:
+    result = LevelResult(sessions, 0.0)
+    lock = threading.Lock()
+    # Sessions open their page first and start the measured runs together
+    start = threading.Barrier(sessions + 1)
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(mix[i % len(mix)], state, iterations, start, result, lock),
+        )
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        return result
+
+    sampler = ResourceSampler()
+    result.baseline_rss_mb = sampler.peak_rss_mb
+    cpu_start, wall_start = get_cpu_seconds(), time.perf_counter()
+    sampler.start()
+    for thread in threads:
+        thread.join()
+    result.wall_seconds = time.perf_counter() - wall_start
+    result.cpu_seconds = get_cpu_seconds() - cpu_start
+    result.peak_rss_mb = sampler.stop()
+    return result
+
+
+def find_saturation(
+    results: List[LevelResult], mix: List[str], min_gain: float, max_p95_ratio: float
+) -> Optional[int]:
+    """The first level that gains too little throughput or is too slow.
+
+    Throughput is only compared between levels running every scenario of the
+    mix and p95 latencies against the scenario's first level, since below
+    ``len(mix)`` sessions each level adds a different scenario.
+    """
+    first_p95: Dict[str, float] = {}
+    previous: Optional[LevelResult] = None
+    for result in results:
+        if not result.operations:
+            continue
+        for scenario, values in result.latencies.items():
+            p95 = percentile(values, 95)
+            first_p95.setdefault(scenario, p95)
+            if p95 > first_p95[scenario] * max_p95_ratio:
+                return result.sessions
+        if len(result.latencies) < len(set(mix)):
+            continue
+        if previous is not None and result.throughput < previous.throughput * min_gain:
+            return result.sessions
+        previous = result
+    return None
+
+
+def summarize(result: LevelResult) -> Dict[str, Any]:
+    return {
+        "sessions": result.sessions,
+        "operations": result.operations,
+        "errors": result.errors,
+        "wall_s": round(result.wall_seconds, 2),
+        "throughput_per_s": round(result.throughput, 3),
+        "cpu_cores_used": (
+            round(result.cpu_seconds / result.wall_seconds, 2)
+            if result.wall_seconds
+            else 0.0
+        ),
+        "cpu_s_per_session": round(result.cpu_seconds / result.sessions, 2),
+        "peak_rss_mb": round(result.peak_rss_mb, 1),
+        "rss_mb_per_session": round(
+            (result.peak_rss_mb - result.baseline_rss_mb) / result.sessions, 1
+        ),
+        "latency_s": {
+            scenario: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "max": round(max(values), 3),
+            }
+            for scenario, values in sorted(result.latencies.items())
+        },
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(
+        f"\n{summary['sessions']} sessions: {summary['operations']} operations in "
+        f"{summary['wall_s']}s ({summary['throughput_per_s']}/s), "
+        f"{summary['cpu_cores_used']} cores, {summary['cpu_s_per_session']} CPU s "
+        f"and {summary['rss_mb_per_session']} MB per session, "
+        f"peak RSS {summary['peak_rss_mb']} MB"
+    )
+    print(
+        f"  {'scenario':<12}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}"
+    )
+    for scenario, latency in summary["latency_s"].items():
+        print(
+            f"  {scenario:<12}{latency['count']:>7}{latency['p50']:>9.3f}"
+            f"{latency['p95']:>9.3f}{latency['p99']:>9.3f}{latency['max']:>9.3f}"
+        )
+    for error in summary["errors"][:5]:
+        print(f"  error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", default="1,2,4,8")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--mix", default=",".join(SCENARIOS))
+    parser.add_argument("--rows", default="100k", choices=list(ROW_SIZES))
+    parser.add_argument("--edit-rows", type=int, default=1000)
+    parser.add_argument("--export-format", default="csv")
+    parser.add_argument("--min-gain", type=float, default=1.1)
+    parser.add_argument("--max-p95-ratio", type=float, default=3.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    mix = args.mix.split(",")
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="rtg-load-test-")
+    try:
+        prepare_environment(ROW_SIZES[args.rows], work_dir)
+        start_api()
+        import generators
+
+        state = {
+            "export_format": args.export_format,
+            "edit_csv": generators.make_store_frame(args.edit_rows, seed=1)
+            .to_csv(index=False)
+            .encode("utf-8"),
+        }
+        summaries = []
+        results = []
+        for sessions in (int(n) for n in args.sessions.split(",")):
+            results.append(run_level(sessions, mix, args.iterations, state))
+            summaries.append(summarize(results[-1]))
+            print_summary(summaries[-1])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    saturation = find_saturation(results, mix, args.min_gain, args.max_p95_ratio)
+    print(
+        f"\nSaturates at {saturation} concurrent sessions"
+        if saturation
+        else "\nNo saturation within the tested session counts"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "rows": ROW_SIZES[args.rows],
+                    "mix": mix,
+                    "iterations": args.iterations,
+                    "levels": summaries,
+                    "saturation_sessions": saturation,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Time and memory-profile the frontend data paths on synthetic data.
+
+Seeded ``store``, ``supplier_stock`` and ``ebay/table`` snapshots are written
+to a temporary local S3 directory and the app code runs against the
+``aws_utils`` stand-ins in ``app/aws_utils_mock``. Each case reports the best
+and median wall time over ``--repeat`` runs and the peak traced allocation of
+one extra run (tracemalloc sees numpy and pandas buffers, not Arrow's). The
+xlsx and JSON payload cases are skipped above 1m rows; xlsx alone takes
+minutes at that size.
+
+Results are written to ``benchmarks/results/<commit>.json``. ``--save-baseline``
+also stores them as the baseline, and every run is compared with the baseline
+when one exists; a case slower than ``--tolerance`` times its baseline and
+by at least ``--min-delta-ms`` is reported as a regression. Timings from
+another machine are not comparable, so the script only exits with status 1
+on a regression with ``--fail-on-regression``, which needs at least
+``MIN_REPEAT_TO_FAIL`` repeats.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 10k,1m,5m] [--cases export]
+        [--repeat 3] [--save-baseline] [--baseline PATH] [--tolerance 1.25]
+        [--min-delta-ms 20] [--fail-on-regression]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCHMARK_DIR, "..", "app")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baselines", "baseline.json")
+MIN_REPEAT_TO_FAIL = 3
+BUCKET_NAME = "rtg-automotive-bucket-000000000000"
+SNAPSHOT_TIMESTAMP = "2024-06-01T06:00:00"
+
+sys.path.insert(0, APP_DIR)
+
+
+@dataclass
+class Case:
+    name: str
+    build: Callable[[Dict[str, Any]], Callable[[], Any]]
+    max_rows: Optional[int] = None
+
+
+def load_table(prefix: str, timestamp_length: Optional[int] = None):
+    import snapshot_catalog
+    from aws_utils import s3
+
+    def run() -> Any:
+        # Cold path: nothing cached from the previous run
+        snapshot_catalog.clear_caches()
+        s3_handler = s3.S3Handler()
+        snapshot = snapshot_catalog.resolve_latest_snapshot(
+            s3_handler, BUCKET_NAME, prefix, timestamp_length=timestamp_length
+        )
+        return snapshot_catalog.load_snapshot(s3_handler, BUCKET_NAME, snapshot)
+
+    return run
+
+
+def build_cases() -> List[Case]:
+    import bulk_filter
+    import ebay_pipeline
+    import exports
+    from api import codec
+
+    def export(export_format: str, split_by_column: Optional[str] = None):
+        return lambda frames: lambda: exports.build_export(
+            frames["store"], "store", export_format, split_by_column
+        )
+
+    def zip_store_files(frames):
+        store_files = ebay_pipeline.split_by_store(
+            ebay_pipeline.create_ebay_dataframe(frames["ebay/table"])
+        )
+        return lambda: ebay_pipeline.zip_dataframes(store_files)
+
+    def bulk_edit_json(frames):
+        # The default payload: a list of row dicts serialized by requests
+        return lambda: json.dumps(
+            {"items": json.loads(frames["store"].to_json(orient="records"))}
+        ).encode("utf-8")
+
+    def semi_join(frames):
+        item_ids = frames["store"]["item_id"].sample(
+            min(50_000, len(frames["store"])), random_state=0
+        )
+        return lambda: bulk_filter.semi_join(
+            frames["store"], {"item_id": item_ids.tolist()}
+        )
+
+    return [
+        Case("get_table_from_s3[store]", lambda frames: load_table("store/")),
+        Case(
+            "get_table_from_s3[supplier_stock]",
+            lambda frames: load_table("supplier_stock/"),
+        ),
+        Case("load_ebay_table", lambda frames: load_table("ebay/table/", 19)),
+        Case(
+            "create_ebay_dataframe",
+            lambda frames: lambda: ebay_pipeline.create_ebay_dataframe(
+                frames["ebay/table"]
+            ),
+        ),
+        Case("zip_dataframes", zip_store_files),
+        Case("convert_to_excel", export(exports.XLSX), max_rows=1_000_000),
+        Case(
+            "create_split_downloads[xlsx]",
+            export(exports.XLSX, "supplier"),
+            max_rows=1_000_000,
+        ),
+        Case("export[csv]", export(exports.CSV)),
+        Case("export[csv.gz]", export(exports.CSV_GZIP)),
+        Case("export[parquet]", export(exports.PARQUET)),
+        Case("create_split_downloads[csv]", export(exports.CSV, "supplier")),
+        Case("bulk_edit_payload[json]", bulk_edit_json, max_rows=1_000_000),
+        Case(
+            "bulk_edit_payload[gzip]",
+            lambda frames: lambda: codec.encode_payload(frames["store"], None, "gzip"),
+        ),
+        Case("semi_join[50k item_ids]", semi_join),
+    ]
+
+
+def prepare_frames(rows: int, s3_dir: str) -> Dict[str, Any]:
+    import generators
+
+    frames = {}
+    for prefix, generate in generators.GENERATORS.items():
+        frames[prefix] = generate(rows, seed=0)
+        generators.write_snapshot(
+            s3_dir, f"{prefix}/", frames[prefix], SNAPSHOT_TIMESTAMP
+        )
+    return frames
+
+
+def measure(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "peak_mb": peak / 1024**2,
+    }
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=BENCHMARK_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    min_delta_ms: float,
+) -> List[str]:
+    baseline_results = {
+        (result["case"], result["rows"]): result for result in baseline["results"]
+    }
+    regressions = []
+    print(f"\nCompared with baseline {baseline['commit']} ({baseline['created']})")
+    if (
+        baseline.get("machine") != platform.machine()
+        or baseline.get("python") != platform.python_version()
+    ):
+        print(
+            f"Warning: the baseline ran on {baseline.get('machine')} with Python "
+            f"{baseline.get('python')}; the timings may not be comparable"
+        )
+    for result in results:
+        previous = baseline_results.get((result["case"], result["rows"]))
+        if previous is None:
+            continue
+        ratio = result["min_ms"] / previous["min_ms"] if previous["min_ms"] else 1.0
+        # Millisecond cases vary by more than the tolerance from run to run
+        delta_ms = result["min_ms"] - previous["min_ms"]
+        flag = "REGRESSION" if ratio > tolerance and delta_ms >= min_delta_ms else ""
+        print(f"{result['case']:<36}{result['rows']:>10,}{ratio:>9.2f}x  {flag}")
+        if flag:
+            regressions.append(f"{result['case']} ({result['rows']:,} rows)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="10k", help="any of 10k, 1m, 5m")
+    parser.add_argument("--cases", default="", help="only cases containing this")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument("--min-delta-ms", type=float, default=20)
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit with status 1 if a case regressed against the baseline",
+    )
+    args = parser.parse_args()
+    if args.fail_on_regression and args.repeat < MIN_REPEAT_TO_FAIL:
+        parser.error(
+            f"--fail-on-regression needs --repeat {MIN_REPEAT_TO_FAIL} or more"
+        )
+
+    import generators
+
+    s3_dir = tempfile.mkdtemp(prefix="rtg-benchmark-s3-")
+    os.environ["RTG_MOCK_S3_DIR"] = s3_dir
+    import aws_utils_mock
+
+    aws_utils_mock.install()
+
+    cases = [case for case in build_cases() if args.cases in case.name]
+    results = []
+    print(f"{'case':<36}{'rows':>10}{'min ms':>12}{'median ms':>12}{'peak MB':>10}")
+    for size in args.sizes.split(","):
+        rows = generators.SIZES[size]
+        frames = prepare_frames(rows, s3_dir)
+        for case in cases:
+            if case.max_rows is not None and rows > case.max_rows:
+                continue
+            result = {"case": case.name, "rows": rows}
+            result.update(measure(case.build(frames), args.repeat))
+            results.append(result)
+            print(
+                f"{case.name:<36}{rows:>10,}{result['min_ms']:>12.1f}"
+                f"{result['median_ms']:>12.1f}{result['peak_mb']:>10.1f}"
+            )
+
+    shutil.rmtree(s3_dir, ignore_errors=True)
+
+    import pandas as pd
+    import pyarrow as pa
+
+    report = {
+        "commit": get_commit(),
+        "created": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_path = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(
+                results, json.load(f), args.tolerance, args.min_delta_ms
+            )
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
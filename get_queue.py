@@ -1,10 +1,350 @@
-from aws_utils import sqs, iam
-import streamlit as st
+"""Monitor the processing-result queue of the stock feed and eBay Lambdas.
 
-iam.get_aws_credentials(st.secrets["aws_credentials"])
+Polls ``rtg-automotive-lambda-queue`` every ``--poll`` seconds and
+periodically reports:
 
-sqs_handler = sqs.SQSHandler()
-sqs_queue_url = "rtg-automotive-lambda-queue"
-messages = sqs_handler.get_all_sqs_messages(sqs_queue_url)
-for message in messages:
-    print(message["Body"])
+- backlog depth (visible, in-flight and delayed messages) and the age of the
+  oldest message seen,
+- arrival rate over the reporting window, by the time each message was sent,
+- per-supplier processing latency: from the upload of the supplier's stock
+  feed (``stock_feed/year=/month=/day=/`` for ``--date``) to the result
+  message being sent; for messages without a matching upload, from the
+  timestamp in the message body,
+- a warning when messages are waiting but nothing new has arrived for
+  ``--stuck-after`` seconds.
+
+Each poll only reads the queue attributes. The messages themselves are read
+(a "sweep") only when the visible count has grown since the last sweep,
+because every receive raises a message's receive count, which can redrive it
+to a dead-letter queue. A sweep hides each message for
+``SWEEP_VISIBILITY_SECONDS`` so successive receives reach past the first ten;
+the app, which polls the same queue, sees them again after that. Messages are
+counted once by MessageId and forgotten after ``SEEN_MAX_AGE_SECONDS`` or
+beyond ``MAX_SEEN``.
+
+Credentials come from the ``AWS_*`` environment variables or from the
+``[aws_credentials]`` section of ``.streamlit/secrets.toml``.
+
+Usage:
+    python get_queue.py [--once] [--json] [--interval 60] [--duration 3600]
+        [--poll 15] [--date 2024-06-01] [--stuck-after 900]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import tomllib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import boto3
+
+QUEUE_NAME = "rtg-automotive-lambda-queue"
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+POLL_SECONDS = 15
+SWEEP_VISIBILITY_SECONDS = 5
+MAX_SWEEP_RECEIVES = 20
+SEEN_MAX_AGE_SECONDS = 24 * 3600
+MAX_SEEN = 10000
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}")
+FAILURE_WORDS = ("error", "failed", "exception")
+
+
+@dataclass
+class ResultMessage:
+    message_id: str
+    body: str
+    supplier: str
+    sent_at: datetime
+    body_time: Optional[datetime]
+    failed: bool
+    latency_seconds: Optional[float] = None
+
+
+@dataclass
+class MonitorState:
+    seen: Dict[str, ResultMessage] = field(default_factory=dict)
+    last_arrival: Optional[datetime] = None
+    # Visible count after the last sweep; a sweep runs when it grows
+    swept_visible: int = 0
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+def load_credentials() -> None:
+    if os.environ.get("AWS_ACCESS_KEY_ID"):
+        return
+    with open(SECRETS_PATH, "rb") as f:
+        aws_credentials = tomllib.load(f)["aws_credentials"]
+    # aws_utils exports the role credentials to the environment
+    from aws_utils import iam
+
+    iam.get_aws_credentials(aws_credentials)
+
+
+def get_queue_url(sqs_client, queue: str) -> str:
+    if queue.startswith("https://"):
+        return queue
+    return sqs_client.get_queue_url(QueueName=queue)["QueueUrl"]
+
+
+def parse_timestamp(text: str) -> Optional[datetime]:
+    match = TIMESTAMP_PATTERN.search(text)
+    if match is None:
+        return None
+    return datetime.fromisoformat(match.group(0).replace(" ", "T")).replace(
+        tzinfo=timezone.utc
+    )
+
+
+def get_supplier(body: str, uploads: Dict[str, datetime]) -> str:
+    tokens = re.split(r"[^A-Za-z0-9_]+", body)
+    return next(
+        (token.upper() for token in tokens if token.upper() in uploads),
+        tokens[0] if tokens and tokens[0] else "unknown",
+    )
+
+
+def parse_message(
+    message: Dict[str, Any], uploads: Dict[str, datetime]
+) -> ResultMessage:
+    body = message["Body"]
+    sent_at = datetime.fromtimestamp(
+        int(message["Attributes"]["SentTimestamp"]) / 1000, tz=timezone.utc
+    )
+    result = ResultMessage(
+        message_id=message["MessageId"],
+        body=body,
+        supplier=get_supplier(body, uploads),
+        sent_at=sent_at,
+        body_time=parse_timestamp(body),
+        failed=any(word in body.lower() for word in FAILURE_WORDS),
+    )
+    started_at = uploads.get(result.supplier, result.body_time)
+    if started_at is not None and started_at <= sent_at:
+        result.latency_seconds = (sent_at - started_at).total_seconds()
+    return result
+
+
+def list_uploads(s3_client, bucket_name: str, feed_date: str) -> Dict[str, datetime]:
+    """Upload time of each supplier's stock feed on ``feed_date``, by code."""
+    year, month, day = feed_date.split("-")
+    prefix = f"stock_feed/year={year}/month={month}/day={day}/"
+    uploads: Dict[str, datetime] = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            file_name = obj["Key"][len(prefix) :]
+            code = re.split(r"[^A-Za-z0-9]+", file_name)[0].upper()
+            uploads[code] = max(
+                uploads.get(code, obj["LastModified"]), obj["LastModified"]
+            )
+    return uploads
+
+
+def receive_messages(sqs_client, queue_url: str) -> List[Dict[str, Any]]:
+    """Receive every visible message once, hiding each one briefly."""
+    messages: Dict[str, Dict[str, Any]] = {}
+    for _ in range(MAX_SWEEP_RECEIVES):
+        response = sqs_client.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=1,
+            VisibilityTimeout=SWEEP_VISIBILITY_SECONDS,
+            AttributeNames=["SentTimestamp"],
+        )
+        new_messages = [
+            message
+            for message in response.get("Messages", [])
+            if message["MessageId"] not in messages
+        ]
+        # Nothing left, or the first messages have become visible again
+        if not new_messages:
+            break
+        messages.update((message["MessageId"], message) for message in new_messages)
+    return list(messages.values())
+
+
+def get_backlog(sqs_client, queue_url: str) -> Dict[str, int]:
+    attributes = sqs_client.get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=[
+            "ApproximateNumberOfMessages",
+            "ApproximateNumberOfMessagesNotVisible",
+            "ApproximateNumberOfMessagesDelayed",
+        ],
+    )["Attributes"]
+    return {
+        "visible": int(attributes["ApproximateNumberOfMessages"]),
+        "in_flight": int(attributes["ApproximateNumberOfMessagesNotVisible"]),
+        "delayed": int(attributes["ApproximateNumberOfMessagesDelayed"]),
+    }
+
+
+def add_messages(
+    state: MonitorState,
+    messages: List[Dict[str, Any]],
+    uploads: Dict[str, datetime],
+) -> None:
+    for message in messages:
+        if message["MessageId"] in state.seen:
+            continue
+        result = parse_message(message, uploads)
+        state.seen[result.message_id] = result
+        state.last_arrival = max(state.last_arrival or result.sent_at, result.sent_at)
+
+
+def forget_old_messages(state: MonitorState) -> None:
+    cutoff = datetime.now(timezone.utc).timestamp() - SEEN_MAX_AGE_SECONDS
+    kept = sorted(
+        (m for m in state.seen.values() if m.sent_at.timestamp() >= cutoff),
+        key=lambda m: m.sent_at,
+    )[-MAX_SEEN:]
+    state.seen = {m.message_id: m for m in kept}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        round(fraction * 100) - 1
+    ]
+
+
+def summarize_suppliers(messages: List[ResultMessage]) -> Dict[str, Dict[str, Any]]:
+    suppliers: Dict[str, List[ResultMessage]] = {}
+    for message in messages:
+        suppliers.setdefault(message.supplier, []).append(message)
+    summary = {}
+    for supplier, supplier_messages in sorted(suppliers.items()):
+        latencies = [
+            m.latency_seconds
+            for m in supplier_messages
+            if m.latency_seconds is not None
+        ]
+        summary[supplier] = {
+            "messages": len(supplier_messages),
+            "failed": sum(m.failed for m in supplier_messages),
+            "last_sent_at": max(m.sent_at for m in supplier_messages).isoformat(),
+            "latency_p50_s": (
+                round(percentile(latencies, 0.5), 1) if latencies else None
+            ),
+            "latency_p95_s": (
+                round(percentile(latencies, 0.95), 1) if latencies else None
+            ),
+            "latency_max_s": round(max(latencies), 1) if latencies else None,
+        }
+    return summary
+
+
+def build_report(
+    state: MonitorState,
+    backlog: Dict[str, int],
+    window_start: datetime,
+    stuck_after: float,
+) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    window_seconds = (now - window_start).total_seconds()
+    seen = list(state.seen.values())
+    window = [m for m in seen if m.sent_at >= window_start]
+    oldest = min((m.sent_at for m in seen), default=None)
+    idle_seconds = (now - (state.last_arrival or state.started_at)).total_seconds()
+    return {
+        "time": now.isoformat(),
+        "backlog": backlog,
+        "oldest_message_age_s": (
+            round((now - oldest).total_seconds()) if oldest else None
+        ),
+        "arrivals": len(window),
+        "arrival_rate_per_min": (
+            round(len(window) * 60 / window_seconds, 2) if window_seconds else 0.0
+        ),
+        "messages_seen": len(seen),
+        "suppliers": summarize_suppliers(seen),
+        "stuck": backlog["visible"] + backlog["in_flight"] > 0
+        and idle_seconds > stuck_after,
+        "seconds_since_last_arrival": round(idle_seconds),
+    }
+
+
+def print_report(report: Dict[str, Any], as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(report), flush=True)
+        return
+    backlog = report["backlog"]
+    print(
+        f"[{report['time']}] backlog {backlog['visible']} visible, "
+        f"{backlog['in_flight']} in flight, {backlog['delayed']} delayed | "
+        f"{report['arrival_rate_per_min']} msg/min | "
+        f"oldest {report['oldest_message_age_s']}s"
+    )
+    for supplier, summary in report["suppliers"].items():
+        print(
+            f"  {supplier:<20}{summary['messages']:>5} msgs {summary['failed']:>3} failed"
+            f"  p50 {summary['latency_p50_s']}s  p95 {summary['latency_p95_s']}s"
+            f"  max {summary['latency_max_s']}s"
+        )
+    if report["stuck"]:
+        print(
+            f"  WARNING: messages waiting and nothing new for "
+            f"{report['seconds_since_last_arrival']}s - the pipeline may be stuck"
+        )
+    sys.stdout.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--queue", default=QUEUE_NAME, help="queue name or URL")
+    parser.add_argument("--once", action="store_true", help="report once and exit")
+    parser.add_argument("--json", action="store_true", help="JSON lines output")
+    parser.add_argument("--interval", type=float, default=60, help="report period")
+    parser.add_argument(
+        "--poll", type=float, default=POLL_SECONDS, help="queue attribute poll period"
+    )
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--date", default=date.today().isoformat(), help="feed date")
+    parser.add_argument("--stuck-after", type=float, default=900)
+    args = parser.parse_args()
+
+    load_credentials()
+    region = os.environ.get("AWS_REGION")
+    sqs_client = boto3.client("sqs", region_name=region)
+    s3_client = boto3.client("s3", region_name=region)
+    queue_url = get_queue_url(sqs_client, args.queue)
+    bucket_name = f"rtg-automotive-bucket-{os.environ['AWS_ACCOUNT_ID']}"
+    uploads = list_uploads(s3_client, bucket_name, args.date)
+
+    state = MonitorState()
+    start = report_time = time.monotonic()
+    # The first report window starts a poll back, so --once counts the
+    # messages sent in the last poll period
+    window_start = state.started_at - timedelta(seconds=args.poll)
+    while True:
+        backlog = get_backlog(sqs_client, queue_url)
+        if args.once or backlog["visible"] > state.swept_visible:
+            add_messages(state, receive_messages(sqs_client, queue_url), uploads)
+        state.swept_visible = backlog["visible"]
+        forget_old_messages(state)
+
+        if args.once or time.monotonic() - report_time >= args.interval:
+            print_report(
+                build_report(state, backlog, window_start, args.stuck_after), args.json
+            )
+            window_start = datetime.now(timezone.utc)
+            report_time = time.monotonic()
+            # New uploads may have arrived since the last report
+            uploads = list_uploads(s3_client, bucket_name, args.date)
+
+        if args.once or (args.duration and time.monotonic() - start >= args.duration):
+            break
+        time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    main()